@@ -0,0 +1,160 @@
+import traceback
+
+from collections import Counter
+from concurrent.futures import Future
+from queue import SimpleQueue
+from threading import Lock, Thread, current_thread
+
+from blockchain import Blockchain
+
+class LedgerSnapshot:
+    """
+    A view of the ledger of a node at one point, published by its LedgerActor.
+
+    A snapshot is never changed after it is published, the actor publishes
+    a new one after every event. So the requests that only read the ledger
+    (balances, blocks, the chain) take the last snapshot and never wait for
+    the actor or see a half-applied block. The rings are shared, not copied
+    (the actor replaces them, it does not change them), and the blocks of
+    the chain are only appended, so the snapshot keeps the list of blocks
+    with its height and publishing it costs the same for any chain.
+
+    Attributes:
+        blocks (list): the blocks of the chain, the first height of them are in the snapshot.
+        height (int): the number of blocks in the snapshot.
+        chain_ring (LedgerState): the ring up until the last block.
+        soft_ring (StateOverlay): the ring with the transactions of the pool applied.
+        validator (int): the id of the validator of the next block, None without a chain.
+        pool_size (int): the number of transactions in the pool.
+    """
+
+    __slots__ = ('blocks', 'height', 'chain_ring', 'soft_ring', 'validator', 'pool_size')
+
+    def __init__(self, blocks, chain_ring, soft_ring, validator=None, pool_size=0):
+        """Inits a LedgerSnapshot"""
+        self.blocks = blocks
+        self.height = len(blocks)
+        self.chain_ring = chain_ring
+        self.soft_ring = soft_ring
+        self.validator = validator
+        self.pool_size = pool_size
+
+    def __str__(self):
+        """Returns a string representation of a LedgerSnapshot object"""
+        return str(self.__class__) + ": " + str({'height': self.height, 'validator': self.validator,
+                                                 'pool_size': self.pool_size})
+
+    def last_block(self):
+        """Returns the last block of the chain, None if the chain is empty."""
+        return self.blocks[self.height - 1] if self.height > 0 else None
+
+    def block(self, index):
+        """Returns the block with the given index, None if there is no such block."""
+        return self.blocks[index] if 0 <= index < self.height else None
+
+    def chain(self):
+        """Returns the chain as a Blockchain (a copy of the list of blocks)."""
+        chain = Blockchain()
+        chain.blocks = self.blocks[:self.height]
+        return chain
+
+
+class LedgerActor:
+    """
+    The single writer of the ledger (chain, rings, pool, wallet) of a node.
+
+    The requests of the node do not change the ledger themselves, they send
+    it events (incoming transactions, a block, a chunk of a synced chain,
+    ...) and one thread applies the events one after the other, in the order
+    they arrived. So the ledger needs no locks, the requests never wait for
+    each other on them, and every event sees the changes of the events before
+    it. The work that needs no state (verifying signatures, decoding) is done
+    by the requests before they send the event, so the actor only applies it.
+
+    After every event the actor publishes a LedgerSnapshot, the requests
+    that only read the ledger use it (see LedgerSnapshot).
+
+    An event that is sent by the actor itself (e.g. the node adds the block
+    that it minted) is applied at once, a request waiting in the queue would
+    never be served.
+
+    Attributes:
+        handlers (dict): event kind (string) -> the function that applies it.
+        publish (function): returns the LedgerSnapshot of the ledger.
+        events (SimpleQueue): the (kind, args, Future) of the events waiting.
+        snapshot (LedgerSnapshot): the snapshot published last.
+        processed (Counter): event kind -> the number of events applied.
+        start_lock (Lock): the thread is started once.
+        thread (Thread): the actor, started with the first event.
+    """
+
+    def __init__(self, handlers, publish):
+        """Inits a LedgerActor"""
+        self.handlers = handlers
+        self.publish = publish
+        self.events = SimpleQueue()
+        self.snapshot = None
+        self.processed = Counter()
+        self.start_lock = Lock()
+        self.thread = None
+
+    def __str__(self):
+        """Returns a string representation of a LedgerActor object"""
+        return str(self.__class__) + ": " + str(self.stats())
+
+    def in_actor(self):
+        return self.thread is not None and current_thread() is self.thread
+
+    def post(self, kind, *args):
+        """Sends an event to the actor, returns the Future of its result."""
+        if kind not in self.handlers:
+            raise ValueError("Unknown ledger event " + str(kind))
+        future = Future()
+        self.events.put((kind, args, future))
+        if self.thread is None:
+            with self.start_lock:
+                if self.thread is None:
+                    self.thread = Thread(target=self.run, name='ledger', daemon=True)
+                    self.thread.start()
+        return future
+
+    def call(self, kind, *args):
+        """Sends an event to the actor and waits for its result."""
+        if self.in_actor():
+            return self.handlers[kind](*args)
+        return self.post(kind, *args).result()
+
+    def refresh(self):
+        """Publishes a snapshot of the ledger as it is now.
+
+        Used when the ledger is built before the actor starts (the genesis block).
+        """
+        self.snapshot = self.publish()
+
+    def run(self):
+        while True:
+            (kind, args, future) = self.events.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = self.handlers[kind](*args)
+            except Exception as e:
+                tb_str = traceback.format_exception(type(e), e, e.__traceback__)
+                print("".join(tb_str))
+                result = None
+                future.set_exception(e)
+            self.processed[kind] += 1
+            # the snapshot is published before the sender learns the result,
+            # so it reads its own change
+            try:
+                self.snapshot = self.publish()
+            except Exception as e:
+                tb_str = traceback.format_exception(type(e), e, e.__traceback__)
+                print("".join(tb_str))
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        """Returns the counters of the actor as a dict."""
+        return {'waiting': self.events.qsize(), 'processed': dict(self.processed),
+                'height': self.snapshot.height if self.snapshot is not None else 0}
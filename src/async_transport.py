@@ -0,0 +1,287 @@
+import json
+import time
+import asyncio
+
+from threading import Lock, Thread
+
+from transport import PeerStats
+
+class PeerError(ConnectionError):
+    """Raised when a peer closes the connection or answers with a malformed response."""
+
+class Response:
+    """
+    The answer of a peer to a message.
+
+    Attributes:
+        status_code (int): the HTTP status of the answer.
+        content (bytes): the body of the answer.
+    """
+
+    def __init__(self, status_code, content):
+        """Inits a Response"""
+        self.status_code = status_code
+        self.content = content
+
+    def __str__(self):
+        """Returns a string representation of a Response object"""
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    def json(self):
+        return json.loads(self.content)
+
+class PeerConnections:
+    """
+    The open connections to a peer.
+
+    Attributes:
+        semaphore (asyncio.Semaphore): bounds the messages in flight to the peer.
+        idle (list): (reader, writer) of the keep-alive connections not in use.
+        stats (PeerStats): the send counters of the peer.
+    """
+
+    def __init__(self, concurrency):
+        """Inits a PeerConnections"""
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.idle = []
+        self.stats = PeerStats()
+
+    def __str__(self):
+        """Returns a string representation of a PeerConnections object"""
+        return str(self.__class__) + ": " + str(self.stats)
+
+class AsyncTransport:
+    """
+    Sends the messages of the node to its peers from a single asyncio thread.
+
+    It has the same API as the PeerTransport, but instead of a thread per
+    message in flight, one event loop (started on first use) drives all of
+    them over a minimal HTTP/1.1 client on asyncio streams. Every peer has
+    at most `concurrency` messages in flight and keeps its connections open
+    when the peer allows it. An attempt that takes longer than `timeout`
+    or loses its connection is repeated up to `retries` times, waiting
+    backoff, 2*backoff, 4*backoff, ... seconds in between. The returned
+    futures can be cancelled, and shutdown() cancels whatever is in flight.
+
+    Attributes:
+        concurrency (int): the messages in flight per peer.
+        timeout (float): seconds to wait for a peer to answer (per attempt).
+        retries (int): how many times a failed attempt is repeated.
+        backoff (float): seconds to wait before the first retry.
+        loop (asyncio.AbstractEventLoop): the event loop, started on first use.
+        thread (Thread): the thread that runs the loop.
+        peers (dict): (ip, port) -> PeerConnections of the peer.
+        lock (Lock): provides mutual exclusion for the loop and the stats.
+    """
+
+    def __init__(self, concurrency=8, timeout=30, retries=2, backoff=0.1):
+        """Inits an AsyncTransport"""
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.loop = None
+        self.thread = None
+        self.peers = {}
+        self.lock = Lock()
+
+    def __str__(self):
+        """Returns a string representation of an AsyncTransport object"""
+        return str(self.__class__) + ": " + str(self.peer_stats())
+
+    def start(self):
+        """Returns the event loop, starting its thread on first use."""
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = Thread(target=self.loop.run_forever, name='async_transport', daemon=True)
+                self.thread.start()
+            return self.loop
+
+    def submit(self, coroutine):
+        """Runs a coroutine in the loop, returns a (cancellable) concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.start())
+
+    def peer(self, ip, port):
+        """Returns the connections of a peer, called in the loop."""
+        key = (ip, port)
+        if key not in self.peers:
+            with self.lock:
+                self.peers[key] = PeerConnections(self.concurrency)
+        return self.peers[key]
+
+    ###########################################################
+    ####################### HTTP CLIENT #######################
+    ###########################################################
+
+    async def exchange(self, peer, ip, port, endpoint, data):
+        """Sends one request and reads its response, on an idle connection if there is one."""
+        if peer.idle:
+            (reader, writer) = peer.idle.pop()
+        else:
+            (reader, writer) = await asyncio.open_connection(ip, int(port))
+        try:
+            writer.write(('POST ' + endpoint + ' HTTP/1.1\r\n'
+                          'Host: ' + ip + ':' + port + '\r\n'
+                          'Content-Type: application/octet-stream\r\n'
+                          'Content-Length: ' + str(len(data)) + '\r\n'
+                          'Connection: keep-alive\r\n\r\n').encode('latin-1'))
+            writer.write(data)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line:
+                raise PeerError("Connection closed by " + ip + ":" + port)
+            parts = status_line.decode('latin-1').split(None, 2)
+            if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+                raise PeerError("Malformed response from " + ip + ":" + port)
+            (version, status_code) = (parts[0], int(parts[1]))
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                (name, _, value) = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip().lower()
+
+            connection = headers.get('connection', '')
+            keep_alive = (connection == 'keep-alive' or
+                          (version == 'HTTP/1.1' and connection != 'close'))
+            if headers.get('transfer-encoding') == 'chunked':
+                content = await self.read_chunked(reader)
+            elif 'content-length' in headers:
+                content = await reader.readexactly(int(headers['content-length']))
+            else:
+                # the body ends with the connection
+                content = await reader.read()
+                keep_alive = False
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive:
+            peer.idle.append((reader, writer))
+        else:
+            writer.close()
+        return Response(status_code, content)
+
+    async def read_chunked(self, reader):
+        content = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # the trailer ends with an empty line
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return bytes(content)
+            content += await reader.readexactly(size)
+            await reader.readexactly(2)
+
+    async def request(self, ip, port, endpoint, data):
+        """Sends a message to a peer with retries, returns the Response.
+
+        Raises the last error if every attempt failed.
+        """
+        peer = self.peer(ip, port)
+        start = time.perf_counter()
+        async with peer.semaphore:
+            attempt = 0
+            while True:
+                try:
+                    response = await asyncio.wait_for(
+                        self.exchange(peer, ip, port, endpoint, data), self.timeout)
+                    self.record(peer, start, response.status_code >= 500)
+                    return response
+                except (OSError, EOFError, ValueError, asyncio.TimeoutError):
+                    # ConnectionError, PeerError and asyncio.IncompleteReadError are among these
+                    if attempt >= self.retries:
+                        self.record(peer, start, True)
+                        raise
+                    attempt += 1
+                    with self.lock:
+                        peer.stats.retries += 1
+                    await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+
+    def record(self, peer, start, error):
+        with self.lock:
+            peer.stats.add(time.perf_counter() - start, error)
+
+    async def request_logged(self, ip, port, endpoint, data):
+        try:
+            return await self.request(ip, port, endpoint, data)
+        except Exception as e:
+            print("Sending to " + ip + ":" + port + endpoint + " failed: " + repr(e))
+            return None
+
+    async def request_sequence(self, ip, port, messages):
+        response = None
+        for (endpoint, data) in messages:
+            response = await self.request_logged(ip, port, endpoint, data)
+            if response is None:
+                return None
+        return response
+
+    ###########################################################
+    ################ THE API OF THE TRANSPORTS ################
+    ###########################################################
+
+    def post(self, ip, port, endpoint, data):
+        """Sends a message to a peer and waits for its answer.
+
+        Returns the Response, raises the last error if the peer
+        can not be reached. It must not be called from the loop.
+        """
+        return self.submit(self.request(ip, port, endpoint, data)).result()
+
+    def send(self, ip, port, endpoint, data):
+        """Sends a message to a peer in the background.
+
+        Returns a Future of the Response (None if the peer could not be reached).
+        """
+        return self.submit(self.request_logged(ip, port, endpoint, data))
+
+    def send_sequence(self, ip, port, messages):
+        """Sends messages (endpoint, data) to a peer in the background, one after the other.
+
+        Returns a Future of the last Response (None if a message could not be sent).
+        """
+        return self.submit(self.request_sequence(ip, port, messages))
+
+    def broadcast(self, peers, endpoint, data):
+        """Sends the same (already serialized) message to all the peers.
+
+        peers are the ring nodes (dicts with ip and port).
+        Returns the list of the Futures of the Responses.
+        """
+        return [self.send(peer['ip'], peer['port'], endpoint, data) for peer in peers]
+
+    def peer_stats(self):
+        """Returns the send counters of every peer, keyed by 'ip:port'."""
+        with self.lock:
+            return {ip + ':' + port: peer.stats.to_dict() for ((ip, port), peer) in self.peers.items()}
+
+    def shutdown(self):
+        """Cancels the messages in flight, closes the connections and stops the loop."""
+        with self.lock:
+            loop = self.loop
+            thread = self.thread
+            self.loop = None
+            self.thread = None
+        if loop is None:
+            return
+
+        async def close():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for peer in self.peers.values():
+                for (reader, writer) in peer.idle:
+                    writer.close()
+                peer.idle.clear()
+
+        asyncio.run_coroutine_threadsafe(close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
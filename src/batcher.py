@@ -0,0 +1,66 @@
+from threading import Lock, Timer
+
+class TransactionBatcher:
+    """
+    Collects the outgoing transactions of a node and sends them to the other
+    nodes in batches (the node itself applies them as they are created).
+
+    A batch is sent when it has `size` transactions or when `window` seconds
+    have passed since its first transaction, whichever comes first, so a
+    burst of transactions costs one request per node instead of one per
+    transaction. A window of 0 disables batching: every transaction is
+    sent on its own, as soon as it is created.
+
+    Attributes:
+        send (function): sends a list of transactions to the other nodes.
+        window (float): the most seconds a transaction waits for its batch.
+        size (int): the most transactions in a batch.
+        pending (list): the transactions of the next batch.
+        timer (Timer): sends the next batch when its window ends.
+        lock (Lock): provides mutual exclusion for pending and the timer.
+    """
+
+    def __init__(self, send, window=0, size=100):
+        """Inits a TransactionBatcher"""
+        self.send = send
+        self.window = window
+        self.size = size
+        self.pending = []
+        self.timer = None
+        self.lock = Lock()
+
+    def __str__(self):
+        """Returns a string representation of a TransactionBatcher object"""
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    def enabled(self):
+        return self.window > 0
+
+    def add(self, transaction):
+        """Adds a transaction to the next batch, sends the batch if it is full."""
+        with self.lock:
+            self.pending.append(transaction)
+            if len(self.pending) < self.size:
+                if self.timer is None:
+                    self.timer = Timer(self.window, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+            batch = self.take()
+        self.send(batch)
+
+    def take(self):
+        """Removes the pending transactions (the lock is already acquired)."""
+        batch = self.pending
+        self.pending = []
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return batch
+
+    def flush(self):
+        """Sends the pending transactions now."""
+        with self.lock:
+            batch = self.take()
+        if batch:
+            self.send(batch)
@@ -2,31 +2,49 @@ import json
 from time import time
 from Crypto.Hash import SHA256
 
+from merkle import merkle_root, merkle_proof
+from transaction import to_raw, to_hex, intern_address
+
 class Block:
     """
     A block in the blockchain.
 
+    The hash of the block is the hash of its header, where the transactions
+    are represented by the Merkle root of their ids. The root is computed once,
+    when the block is sealed (set_hash), so hashing the header does not depend
+    on the number of transactions, and the inclusion of a transaction can be
+    proven with a Merkle proof instead of the whole block.
+
+    Like a Transaction, a block has __slots__ and keeps its hashes as raw
+    bytes (the *_bytes attributes), they are read and written as hex strings.
+
     Attributes:
         index (int): the sequence number of the block.
         timestamp (float): timestamp of the creation of the block.
         transactions (list): list of all the transactions in the block.
-        validator (int): public key of the node that validated the block
-        previous_hash (hash object): hash of the previous block in the blockchain.
-        current_hash (hash object): hash of the block.
+        validator (string): address of the node that validated the block
+        previous_hash (string): hash of the previous block in the blockchain (1 for the genesis block).
+        merkle_root (string): Merkle root of the ids of the transactions,
+                                   None until the block is sealed.
+        current_hash (string): hash of the block (of its header).
     """
 
+    __slots__ = ('index', 'timestamp', 'transactions', 'validator',
+                 'previous_hash_bytes', 'merkle_root_bytes', 'current_hash_bytes')
+
     def __init__(self, index, previous_hash, validator=None):
         """Inits a Block"""
         self.index = index
         self.timestamp = time()
         self.transactions = []
-        self.validator = validator
+        self.validator = intern_address(validator)
         self.previous_hash = previous_hash
+        self.merkle_root = None
         self.current_hash = None
 
     def __str__(self):
         """Returns a string representation of a Block object"""
-        return str(self.__class__) + ": " + str(self.__dict__)
+        return str(self.__class__) + ": " + str(self.to_dict())
 
     def __eq__(self, other):
         """Overrides the default method for comparing Block objects.
@@ -34,23 +52,136 @@ class Block:
         Two blocks are equal if their current_hash is equal.
         """
 
-        return self.current_hash == other.current_hash
+        return self.current_hash_bytes == other.current_hash_bytes
+
+    @property
+    def previous_hash(self):
+        return to_hex(self.previous_hash_bytes)
+
+    @previous_hash.setter
+    def previous_hash(self, value):
+        self.previous_hash_bytes = to_raw(value)
+
+    @property
+    def merkle_root(self):
+        return to_hex(self.merkle_root_bytes)
+
+    @merkle_root.setter
+    def merkle_root(self, value):
+        self.merkle_root_bytes = to_raw(value)
+
+    @property
+    def current_hash(self):
+        return to_hex(self.current_hash_bytes)
+
+    @current_hash.setter
+    def current_hash(self, value):
+        self.current_hash_bytes = to_raw(value)
+
+    def to_dict(self):
+        """Returns the attributes of the block as a dict."""
+        return {'index': self.index, 'timestamp': self.timestamp, 'transactions': self.transactions,
+                'validator': self.validator, 'previous_hash': self.previous_hash,
+                'merkle_root': self.merkle_root, 'current_hash': self.current_hash}
+
+    def header(self):
+        """Returns the header of the block, the fields that its hash covers."""
+        return (self.index, self.timestamp, self.merkle_root, self.validator, self.previous_hash)
+
+    def compute_merkle_root(self):
+        """Computes the Merkle root of the transactions of the block."""
+        return merkle_root([tr.transaction_id_bytes for tr in self.transactions])
+
+    def verify_merkle_root(self):
+        """Checks that the (received) Merkle root matches the transactions.
+
+        This is the only place where a received block is hashed
+        over all of its transactions.
+        """
+        return self.merkle_root is not None and self.merkle_root == self.compute_merkle_root()
 
     def get_hash(self):
         """Computes the current hash of the block."""
 
         # We should compute current hash without using the
         # field self.current_hash.
-        block_list = [self.index, self.timestamp, [
-            tr.transaction_id for tr in self.transactions], self.validator, self.previous_hash]
-        
+        block_list = list(self.header())
+
         block_dump = json.dumps(block_list.__str__())
         return SHA256.new(block_dump.encode("ISO-8859-2")).hexdigest()
 
     def set_hash(self):
-        """Sets current hash of the block."""
+        """Seals the block: sets its Merkle root and its current hash."""
+        self.merkle_root = self.compute_merkle_root()
         self.current_hash = self.get_hash()
 
     def add_transaction(self, transaction):
         """Adds a new transaction in the block."""
-        self.transactions.append(transaction)
\ No newline at end of file
+        if self.current_hash_bytes is not None:
+            raise ValueError("The block is sealed, no transactions can be added")
+        self.transactions.append(transaction)
+
+    def merkle_proof(self, transaction_id):
+        """Returns the Merkle proof of a transaction of the block, None if it is not in the block."""
+        ids = [tr.transaction_id_bytes for tr in self.transactions]
+        transaction_id = to_raw(transaction_id)
+        if transaction_id not in ids:
+            return None
+        return merkle_proof(ids, ids.index(transaction_id))
+
+class CompactBlock:
+    """
+    A block as it is relayed to the nodes, which already have its transactions.
+
+    It is the header of the block with the ids of the transactions instead of
+    the transactions themselves. A node rebuilds the block from the transactions
+    of its pool and asks the validator for the ones it does not have.
+
+    Attributes:
+        index (int): the sequence number of the block.
+        timestamp (float): timestamp of the creation of the block.
+        validator (string): address of the node that validated the block
+        previous_hash_bytes (bytes): hash of the previous block.
+        merkle_root_bytes (bytes): Merkle root of the ids of the transactions.
+        current_hash_bytes (bytes): hash of the block (of its header).
+        transaction_ids (list): the ids (bytes) of the transactions of the block, in order.
+    """
+
+    __slots__ = ('index', 'timestamp', 'validator', 'previous_hash_bytes',
+                 'merkle_root_bytes', 'current_hash_bytes', 'transaction_ids')
+
+    def __init__(self, block):
+        """Inits a CompactBlock from a (sealed) block"""
+        self.index = block.index
+        self.timestamp = block.timestamp
+        self.validator = block.validator
+        self.previous_hash_bytes = block.previous_hash_bytes
+        self.merkle_root_bytes = block.merkle_root_bytes
+        self.current_hash_bytes = block.current_hash_bytes
+        self.transaction_ids = [tr.transaction_id_bytes for tr in block.transactions]
+
+    def __str__(self):
+        """Returns a string representation of a CompactBlock object"""
+        return str(self.__class__) + ": " + str({'index': self.index, 'validator': self.validator,
+                                                 'current_hash': to_hex(self.current_hash_bytes),
+                                                 'transactions': len(self.transaction_ids)})
+
+    def missing(self, transactions):
+        """Returns the ids that are not in transactions (id -> Transaction)."""
+        return [id for id in self.transaction_ids if id not in transactions]
+
+    def rebuild(self, transactions):
+        """Returns the full block, transactions (id -> Transaction) must have all of its ids.
+
+        The block is validated like any other block (its Merkle root
+        covers the ids, so a wrong transaction is detected).
+        """
+        block = Block.__new__(Block)
+        block.index = self.index
+        block.timestamp = self.timestamp
+        block.validator = self.validator
+        block.previous_hash_bytes = self.previous_hash_bytes
+        block.merkle_root_bytes = self.merkle_root_bytes
+        block.current_hash_bytes = self.current_hash_bytes
+        block.transactions = [transactions[id] for id in self.transaction_ids]
+        return block
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from threading import Lock
+
+class LRUCache:
+    """
+    A bounded cache that evicts the least recently used entry.
+
+    It is shared by the request threads, so every access
+    is protected by a lock.
+
+    Attributes:
+        maxsize (int): the maximum number of entries kept.
+        entries (OrderedDict): key -> value, the most recently used at the end.
+        hits (int): how many lookups found their key.
+        misses (int): how many lookups did not find their key.
+        lock (Lock): provides mutual exclusion for the entries and the counters.
+    """
+
+    def __init__(self, maxsize):
+        """Inits an LRUCache"""
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def __str__(self):
+        """Returns a string representation of a LRUCache object"""
+        return str(self.__class__) + ": " + str(self.stats())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        """Returns True if the key is in the cache (it is not counted as a lookup)."""
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key, default=None):
+        """Returns the value of the key (and marks it as recently used)."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Adds (or updates) an entry, evicting the oldest one if the cache is full."""
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def add(self, key, value=True):
+        """Adds an entry only if the key is not in the cache.
+
+        Returns True if it was added, False if the key was already there.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return False
+            self.entries[key] = value
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            return True
+
+    def add_misses(self, count):
+        """Counts lookups that missed the cache and were answered elsewhere
+        (e.g. signatures verified by worker processes)."""
+        with self.lock:
+            self.misses += count
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns the counters of the cache as a dict."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
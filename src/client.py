@@ -1,5 +1,5 @@
 import requests
-import pickle
+import wire
 import os
 
 from PyInquirer import style_from_dict, Token, prompt
@@ -216,7 +216,7 @@ def client():
                 str(PORT) + '/api/view_block'
             try:
                 response = requests.get(address)
-                data = pickle.loads(response._content)
+                data = wire.loads(response._content)
                 table = Texttable()
                 table.set_deco(Texttable.HEADER)
                 table.set_cols_dtype(['t',  # text
@@ -248,7 +248,7 @@ def client():
                 str(PORT) + '/api/get_my_transactions'
             try:
                 response = requests.get(address)
-                data = pickle.loads(response._content)
+                data = wire.loads(response._content)
                 table = Texttable()
                 table.set_deco(Texttable.HEADER)
                 table.set_cols_dtype(['t',  # text
@@ -5,3 +5,87 @@ BOOTSTRAP_PORT = '5000'
 # set to true if the whole system (nodes + bootstrap)
 # is simulated on the same machine (with localhost as IP address)
 LOCAL = True 
+
+# number of verified transaction signatures that each node remembers
+# (a transaction is checked on receipt, in the block and after every block)
+SIGNATURE_CACHE_SIZE = 20000
+
+# worker processes that verify the signatures of a block (or a chain)
+# in parallel, 0 verifies them in the request thread
+VERIFY_WORKERS = 0
+# blocks with fewer unverified signatures are verified in the request thread
+VERIFY_MIN_BATCH = 32
+
+# how the messages are sent to the other nodes: 'threads' (a pool of
+# threads over keep-alive sessions) or 'asyncio' (a single event loop thread)
+TRANSPORT = 'threads'
+# threads that send the messages of the node to the other nodes
+# (over one keep-alive connection per node), for the 'threads' transport
+TRANSPORT_WORKERS = 16
+# messages in flight to each node, for the 'asyncio' transport
+PEER_CONCURRENCY = 8
+# seconds to wait for another node to answer a message
+PEER_TIMEOUT = 30
+# times a message is sent again after a connection error or a timeout
+# ('asyncio' transport), waiting PEER_BACKOFF seconds, then twice as long, ...
+PEER_RETRIES = 2
+PEER_BACKOFF = 0.1
+
+# the created transactions are broadcast in batches of up to BATCH_SIZE
+# transactions, waiting at most BATCH_WINDOW seconds (0 disables batching)
+BATCH_WINDOW = 0
+BATCH_SIZE = 100
+
+# number of transactions submitted to the node whose status
+# (pending, pooled, confirmed, failed) the node remembers
+STATUS_CACHE_SIZE = 10000
+
+# blocks that arrived before their parent and that each node keeps
+# until the parent arrives (the oldest one is dropped to make room)
+REORDER_BUFFER_SIZE = 100
+
+# a node that learns of a block more than SYNC_GAP blocks after the last
+# block of its chain (from an out of order block or from the TTL of a valid
+# transaction) asks the node that has it for the missing blocks, which are
+# sent (and validated) in chunks of SYNC_CHUNK blocks; a block one ahead
+# is normal propagation lag, it is reordered instead
+SYNC_GAP = 1
+SYNC_CHUNK = 50
+
+# the minted blocks are relayed to the other nodes as their header and the
+# ids of their transactions, which the nodes take from their pools
+COMPACT_BLOCKS = False
+# blocks that a validator keeps after minting them, for the nodes that
+# miss some of the transactions of a compact block
+RECENT_BLOCKS = 16
+
+# how the broadcast messages spread: 'off' (the node that creates a message
+# sends it to every other node), 'tree' or 'epidemic' (the message is sent
+# to GOSSIP_FANOUT nodes, which forward it, see fanout.py)
+GOSSIP = 'off'
+GOSSIP_FANOUT = 3
+# messages that each node remembers, so that it drops the copies it gets again
+GOSSIP_SEEN = 10000
+
+# the http server of a node: 'dev' (Flask's development server, a thread
+# per connection) or 'pooled' (SERVER_THREADS worker threads, idle
+# connections kept open for SERVER_KEEP_ALIVE seconds, SERVER_BACKLOG
+# connections waiting to be accepted)
+SERVER = 'dev'
+SERVER_THREADS = 16
+SERVER_KEEP_ALIVE = 5
+SERVER_BACKLOG = 128
+
+# incoming transactions of the other nodes are queued (up to INGEST_QUEUE_SIZE)
+# and validated by a single worker, INGEST_BATCH at a time (0 validates them
+# in the request), the node's own transactions are applied at once
+INGEST_QUEUE_SIZE = 10000
+INGEST_BATCH = 100
+
+# the block producer also checks every PRODUCER_INTERVAL seconds if
+# the node can mint (it is woken up whenever the pool or the chain changes)
+PRODUCER_INTERVAL = 1
+
+# how the transactions of a minted block are chosen from the pool:
+# 'fifo' (arrival order), 'fee' (fee per byte) or 'age' (oldest TTL first)
+BLOCK_POLICY = 'fifo'
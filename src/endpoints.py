@@ -1,8 +1,10 @@
-import pickle
+import wire
+import sync
+import config
 from node import Node
-from copy import deepcopy
+from transaction import signature_cache
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 import traceback
 ###########################################################
 ################## INITIALIZATIONS ########################
@@ -22,34 +24,77 @@ rest_api = Blueprint('rest_api', __name__)
 ###########################################################
 
 
+def queue_transactions(transactions, forward=None):
+    '''Queues incoming transactions for the ingest worker, the worker
+        calls forward (if any) once one of them has passed validation.
+
+        Returns the response: 202 with the number of the queued transactions
+        (the ones already queued are dropped), 503 if the queue is full.
+    '''
+    queued = node.ingest.put(transactions, forward)
+    if queued is None:
+        return jsonify({'message': "Too many transactions, try again later."}), 503
+    return jsonify({'message': "Queued.", 'queued': queued}), 202
+
+def receive_gossip():
+    '''Checks a gossiped message (one with an origin) before it is processed.
+
+        Returns the response of the request instead of processing it:
+        400 if the origin is not a node id, 200 if the node has already
+        got the message (its copy is dropped). Returns None if the message
+        must be processed, it is forwarded once it is valid (see gossip_forward).
+    '''
+    origin = request.args.get('origin')
+    if origin is None:
+        return None
+    try:
+        int(origin)
+    except ValueError:
+        return jsonify({'message': "Bad origin."}), 400
+    if not node.router.first_seen(request.get_data()):
+        return jsonify({'message': "Already received."}), 200
+    return None
+
+def gossip_forward():
+    '''Returns a function that forwards the gossiped message of the request
+        to the next nodes, None if the message was not gossiped.
+    '''
+    origin = request.args.get('origin')
+    if origin is None:
+        return None
+    (path, data) = (request.path, request.get_data())
+    return lambda: node.forward(path, int(origin), data)
+
+def forward_gossip():
+    '''Forwards the gossiped message of the request, after it was decoded and validated.'''
+    forward = gossip_forward()
+    if forward is not None:
+        forward()
+
+
 @rest_api.route('/get_block', methods=['POST'])
 def get_block():
     '''Endpoint that gets an incoming block, validates it and adds it in the
         blockchain.
 
         Input:
-            new_block: the incoming block in pickle format.
+            new_block: the incoming block in wire format.
         Returns:
             message: the outcome of the procedure.
     '''
 
     try:
-        new_block = pickle.loads(request.get_data())
-        (validation, changed_ring) = node.validate_block(new_block)
-        if validation:
-            # If the block is valid:
-            # - Add block to the current blockchain.
-            # - Remove the new_block's transactions from the unconfirmed_blocks of the node.
-            node.chain_lock.acquire()
-            node.add_block_to_chain(new_block, changed_ring)
-            node.chain_lock.release()
-            node.filter_transactions(new_block)
-            node.checkOutOfOrderBlocks()
+        response = receive_gossip()
+        if response is not None:
+            return response
+        new_block = wire.loads(request.get_data())
+        outcome = node.receive_block(new_block)
+
+        if outcome == 'added':
+            forward_gossip()
             return jsonify({'message': "OK"})
         # what happens when a block is rejected?
-        elif new_block.previous_hash != node.chain.blocks[-1].current_hash:
-            # received out of order 
-            node.outOfOrderBlocks.append(new_block)
+        elif outcome == 'out_of_order':
             return jsonify({'message': "Block received out of order."}), 202
         else:
             return jsonify({'mesage': "Block rejected."}), 400
@@ -59,28 +104,85 @@ def get_block():
         print(traceback_string)
         return jsonify({'message': f"{e}"}), 500
 
+@rest_api.route('/get_compact_block', methods=['POST'])
+def get_compact_block():
+    '''Endpoint that gets an incoming compact block (header and transaction ids),
+        rebuilds it from the transaction pool and adds it in the blockchain.
+
+        Input:
+            compact_block: the incoming CompactBlock in wire format.
+        Returns:
+            message: the outcome of the procedure.
+    '''
+
+    try:
+        response = receive_gossip()
+        if response is not None:
+            return response
+        compact_block = wire.loads(request.get_data())
+        new_block = node.rebuild_block(compact_block)
+        if new_block is None:
+            return jsonify({'message': "Missing transactions."}), 400
+        outcome = node.receive_block(new_block)
+
+        if outcome == 'added':
+            forward_gossip()
+            return jsonify({'message': "OK"})
+        elif outcome == 'out_of_order':
+            return jsonify({'message': "Block received out of order."}), 202
+        else:
+            return jsonify({'mesage': "Block rejected."}), 400
+    except Exception as e:
+        tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
+        traceback_string = "".join(tb_str)
+        print(traceback_string)
+        return jsonify({'message': f"{e}"}), 500
+
+@rest_api.route('/get_transactions', methods=['POST'])
+def get_transactions():
+    '''Endpoint that sends the transactions of a block that the node minted.
+
+        Input:
+            block: the hash (bytes) of the block.
+            ids: the ids (bytes) of the wanted transactions.
+        Returns:
+            the list of the transactions in wire format.
+    '''
+    try:
+        wanted = wire.loads(request.get_data())
+        transactions = node.find_transactions(wanted['block'], wanted['ids'])
+        if transactions is None:
+            return jsonify({'message': "Unknown block."}), 404
+        return wire.dumps(transactions)
+    except Exception as e:
+        tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
+        traceback_string = "".join(tb_str)
+        print(traceback_string)
+        return jsonify({'message': f"{e}"}), 500
+
 @rest_api.route('/validate_transaction', methods=['POST'])
 def validate_transaction():
     '''Endpoint that gets an incoming transaction and valdiates it.
        Input:
-            new_transaction: the incoming transaction in pickle format.
+            new_transaction: the incoming transaction in wire format.
        Returns:
             message: the outcome of the procedure.
 
        Note: Each validated transaction is added to the transactions pool,
        from where blocks are shaped, gathering many transactions together.
        If the transaction is validated, the softState is changed.
+       With the ingest queue, the transaction is queued for validation (202),
+       or refused if the queue is full (503).
     '''
     try:
-        new_transaction = pickle.loads(request.get_data())
-        (validation, changed_ring) = node.validate_transaction(new_transaction)
-        if validation:
-            node.add_transaction_to_pool(new_transaction)
-            node.softState_ring = changed_ring
-            # if the current node is the receiver or the sendera added to its wallet
-            if (new_transaction.receiver_address == node.wallet.public_key or \
-                new_transaction.sender_address == node.wallet.public_key):
-                node.wallet.transactions.append([new_transaction, "None", "Unconfirmed"])
+        response = receive_gossip()
+        if response is not None:
+            return response
+        new_transaction = wire.loads(request.get_data())
+        if node.ingest.enabled():
+            return queue_transactions([new_transaction], gossip_forward())
+        if node.ingest_transactions([new_transaction]):
+            forward_gossip()
             return jsonify({'message': "OK"}), 200
         else:
             return jsonify({'message': "The transaction is invalid"}), 400
@@ -90,6 +192,37 @@ def validate_transaction():
         print(traceback_string)
         return jsonify({'message': f"{e}"}), 500
 
+@rest_api.route('/validate_transactions', methods=['POST'])
+def validate_transactions():
+    '''Endpoint that gets a batch of incoming transactions and validates them.
+       Input:
+            new_transactions: the list of the incoming transactions in wire format.
+       Returns:
+            message: the outcome of the procedure.
+            valid: the number of the valid transactions.
+
+       Note: The transactions are validated in a single pass against the
+       softState, the valid ones are added to the transactions pool.
+       With the ingest queue, the transactions are queued for validation (202),
+       or refused if the queue is full (503).
+    '''
+    try:
+        response = receive_gossip()
+        if response is not None:
+            return response
+        new_transactions = wire.loads(request.get_data())
+        if node.ingest.enabled():
+            return queue_transactions(new_transactions, gossip_forward())
+        valid_transactions = node.ingest_transactions(new_transactions)
+        if valid_transactions:
+            forward_gossip()
+        return jsonify({'message': "OK", 'valid': len(valid_transactions)}), 200
+    except Exception as e:
+        tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
+        traceback_string = "".join(tb_str)
+        print(traceback_string)
+        return jsonify({'message': f"{e}"}), 500
+
 @rest_api.route('/register_node', methods=['POST'])
 def register_node():
     '''Endpoint that registers a new node in the network.
@@ -107,33 +240,28 @@ def register_node():
 
         if (not IS_BOOTSTRAP):
             return jsonify({'message': "Node isnt bootstrap"}), 401
-        elif (len(node.chainState_ring) == N):
-            return jsonify({'message': "System is full, exactly N nodes are running"}), 401
 
         # Get the arguments
         node_key = request.form.get('public_key')
         node_ip = request.form.get('ip')
         node_port = request.form.get('port')
-        node_id = len(node.chainState_ring)
 
-        # Add node in the list of registered nodes.
-        node.register_node_to_ring(
-            id=node_id, ip=node_ip, port=node_port, public_key=node_key) 
+        # Add node in the list of registered nodes (with the next id).
+        node_id = node.ledger.call('register', node_ip, node_port, node_key, N)
+        if node_id is None:
+            return jsonify({'message': "System is full, exactly N nodes are running"}), 401
         # When all nodes are registered, the bootstrap node sends them:
         # - the ring
         # - the current chain
         # - a transaction of their first BCCs
         if (node_id == N - 1):
-            # update the soft state of the bootstrap node
-            node.softState_ring = deepcopy(node.chainState_ring) 
-            for ring_node in node.chainState_ring:
-                if ring_node["id"] != node.id: # dont send to myself
-                    node.share_ring(ring_node)
-                    node.share_chain(ring_node)
+            # dont send to myself
+            node.share_state([ring_node for ring_node in node.chainState_ring
+                              if ring_node["id"] != node.id])
             for ring_node in node.chainState_ring:
                 if ring_node["id"] != node.id:
                     node.create_transaction(
-                        receiver=ring_node['public_key'],
+                        receiver=ring_node['address'],
                         amount=1000
                     )
         return jsonify({'message': "OK", 'id': node_id}), 200
@@ -148,16 +276,12 @@ def register_node():
 def get_ring():
     '''Endpoint that gets a ring (information about other nodes).
         Input:
-            ring: the ring in pickle format.
+            ring: the ring in wire format.
         Returns:
             message: the outcome of the procedure.
     '''
     try:
-        node.chainState_ring = pickle.loads(request.get_data())
-        # Update the id of the node based on the given ring.
-        for ring_node in node.chainState_ring:
-            if ring_node['public_key'] == node.wallet.public_key:
-                node.id = ring_node['id']
+        node.ledger.call('ring', wire.loads(request.get_data()))
         return jsonify({'message': "OK"})
     except Exception as e:
         tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
@@ -171,22 +295,13 @@ def get_chain():
     '''Endpoint that gets a blockchain.
 
         Input:
-            chain: the blockchain in pickle format.
+            chain: the blockchain in wire format.
         Returns:
             message: the outcome of the procedure.
     '''
     try:
-        got_chain = pickle.loads(request.get_data())
-        (validation, ring) = node.validate_chain(got_chain)
-        if validation and len(node.chain.blocks) == 0:
-            node.chain = got_chain
-            # init soft and chain state
-            node.chainState_ring = ring
-            node.softState_ring = ring 
-            # clear the transaction pool
-            node.transaction_pool_lock.acquire()
-            node.transaction_pool.clear()
-            node.transaction_pool_lock.release()
+        got_chain = wire.loads(request.get_data())
+        if node.ledger.call('chain', got_chain):
             return jsonify({'message': "OK"}), 200
         return jsonify({'message': "Chain rejected"}), 400
     except Exception as e:
@@ -200,10 +315,40 @@ def send_chain():
     '''Endpoint that sends a blockchain.
 
         Returns:
-            the blockchain of the node in pickle format.
+            the blockchain of the node in wire format.
     '''
     try:
-        return pickle.dumps(node.chain)
+        return wire.dumps(node.ledger.snapshot.chain())
+    except Exception as e:
+        tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
+        traceback_string = "".join(tb_str)
+        print(traceback_string)
+        return jsonify({'message': f"{e}"}), 500
+
+@rest_api.route('/sync_chain', methods=['GET'])
+def sync_chain():
+    '''Endpoint that sends the blocks after a given block, in chunks.
+
+        Input:
+            height: the index of the last block of the asking node.
+            hash: the hash of that block.
+            chunk: the number of blocks per chunk.
+        Returns:
+            the blocks after height, streamed as frames of chunk blocks
+            in wire format (see sync.py), 409 if the node has
+            another block at that height.
+    '''
+    try:
+        height = int(request.args.get('height'))
+        hash = bytes.fromhex(request.args.get('hash'))
+        chunk = max(1, int(request.args.get('chunk', config.SYNC_CHUNK)))
+        # blocks are only appended, the blocks of the snapshot do not change while they are sent
+        snapshot = node.ledger.snapshot
+        block = snapshot.block(height)
+        if block is None or block.current_hash_bytes != hash:
+            return jsonify({'message': "Unknown block."}), 409
+        return Response(sync.frames(snapshot.blocks, height + 1, snapshot.height, chunk),
+                        mimetype='application/octet-stream')
     except Exception as e:
         tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
         traceback_string = "".join(tb_str)
@@ -224,6 +369,9 @@ def create_transaction():
             receiver: the id of the receiver node.
             amount: the amount of BCCs to send.
             message: the message to send
+            async: "true" returns as soon as the transaction is validated by the node
+                   (202 with its transaction_id), it is broadcast in the background
+                   and /api/transaction_status reports what happened to it.
         Returns:
             message: the outcome of the procedure.
     '''
@@ -232,16 +380,22 @@ def create_transaction():
     # Assuming 'stake' is submitted as a string, like "true" 
     # Defaults to 'false'
     if request.form.get('stake', 'false') == 'true':
-        receiver_public_key = "0"
+        receiver_address = "0"
         message = ""
     else:
         receiver_id = int(request.form.get('receiver'))
-        receiver_public_key = node.ID_to_key(receiver_id)
+        receiver_address = node.ID_to_address(receiver_id)
         message = request.form.get('message')
     amount = int(request.form.get('amount'))
     
-    if (receiver_public_key and receiver_public_key != node.wallet.public_key):
-        if node.create_transaction(receiver_public_key, amount, message):
+    if (receiver_address and receiver_address != node.wallet.address):
+        if request.form.get('async', 'false') == 'true':
+            transaction = node.submit_transaction(receiver_address, amount, message)
+            if transaction is not None:
+                return jsonify({'message': 'The transaction was submitted.', 'transaction_id': transaction.transaction_id}), 202
+            else:
+                return jsonify({'message': 'Not enough BCCs.', 'balance': node.wallet.get_balance(), 'stake': node.wallet.get_stake()}), 400
+        if node.create_transaction(receiver_address, amount, message):
             return jsonify({'message': 'The transaction was created successfully.', 'balance': node.wallet.get_balance(), 'stake': node.wallet.get_stake()}), 200
         else:
             return jsonify({'message': 'Not enough BCCs.', 'balance': node.wallet.get_balance(), 'stake': node.wallet.get_stake()}), 400
@@ -249,6 +403,27 @@ def create_transaction():
         return jsonify({'message': 'Transaction failed. Wrong receiver id.'}), 400
 
 
+@rest_api.route('/api/transaction_status/<transaction_id>', methods=['GET'])
+def transaction_status(transaction_id):
+    '''Endpoint that returns the status of a transaction submitted to the node.
+
+        Input:
+            transaction_id: the id returned by /api/create_transaction (async).
+        Returns:
+            status: pending, pooled, confirmed or failed.
+            block: the index of the block of a confirmed transaction.
+    '''
+    try:
+        status = node.transaction_status(transaction_id)
+        if status is None:
+            return jsonify({'message': 'Unknown transaction.'}), 404
+        return jsonify({'transaction_id': transaction_id, 'status': status[0], 'block': status[1]}), 200
+    except Exception as e:
+        tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
+        traceback_string = "".join(tb_str)
+        print(traceback_string)
+        return jsonify({'message': f"{e}"}), 500
+
 @rest_api.route('/api/get_balance', methods=['GET'])
 def get_balance():
     '''Endpoint that returns the current balance of the node.
@@ -284,21 +459,53 @@ def view_block():
     '''Endpoint that returns the transactions of the last confirmed block.
 
         Returns:
-            a formatted list of transactions in pickle format.
+            a formatted list of transactions in wire format.
     '''
     try:
-        transactions_list = [tr.to_list() for tr in node.chain.blocks[-1].transactions]
+        snapshot = node.ledger.snapshot
+        last_block = snapshot.last_block()
+        ring = snapshot.chain_ring
+        transactions_list = [tr.to_list() for tr in last_block.transactions]
         modified_transactions_list = [
             [
-                node.key_to_ID(sender_address), 
-                "--" if receiver_address == "0" else node.key_to_ID(receiver_address), 
+                node.key_to_ID(sender_address, ring), 
+                "--" if receiver_address == "0" else node.key_to_ID(receiver_address, ring), 
                 amount, 
                 "stake update" if receiver_address == "0" else message, 
-                node.key_to_ID(node.chain.blocks[-1].validator)
+                node.key_to_ID(last_block.validator, ring)
             ] 
             for sender_address, receiver_address, amount, message in transactions_list
         ]
-        return pickle.dumps(modified_transactions_list)
+        return wire.dumps(modified_transactions_list)
+    except Exception as e:
+        tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
+        traceback_string = "".join(tb_str)
+        print(traceback_string)
+        return jsonify({'message': f"{e}"}), 500
+
+
+@rest_api.route('/api/get_merkle_proof', methods=['GET'])
+def get_merkle_proof():
+    '''Endpoint that proves that a transaction is in a block of the chain.
+
+        Input:
+            block: the index of the block.
+            transaction_id: the id of the transaction.
+        Returns:
+            the header of the block, its hash and the Merkle proof of the
+            transaction in wire format. The proof can be checked with
+            merkle.verify_proof(transaction_id, proof, merkle_root).
+    '''
+    try:
+        index = int(request.args.get('block'))
+        transaction_id = request.args.get('transaction_id')
+        block = node.ledger.snapshot.block(index)
+        if block is None:
+            return jsonify({'message': "No such block"}), 404
+        proof = block.merkle_proof(transaction_id)
+        if proof is None:
+            return jsonify({'message': "The transaction is not in the block"}), 404
+        return wire.dumps({'header': list(block.header()), 'current_hash': block.current_hash, 'proof': proof})
     except Exception as e:
         tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
         traceback_string = "".join(tb_str)
@@ -310,28 +517,29 @@ def view_block():
 def get_my_transactions():
     '''Endpoint that returns all the transactions of a node (as a sender or receiver).
         Returns:
-            a formatted list of transactions in pickle format.
+            a formatted list of transactions in wire format.
     '''
     try:
-        # update the status of the transactions, check if some failed
-        node.wallet.updateFailedTransactions()
-        wallet_transactions_list = [tr[0].to_list() for tr in node.wallet.transactions]
+        # the status of the transactions, the old unconfirmed ones failed
+        wallet_transactions = node.wallet.get_transactions()
+        ring = node.ledger.snapshot.chain_ring
+        wallet_transactions_list = [tr[0].to_list() for tr in wallet_transactions]
         modified_transactions_list = [
             [
-                node.key_to_ID(sender_address), 
-                "--" if receiver_address == "0" else node.key_to_ID(receiver_address), 
+                node.key_to_ID(sender_address, ring), 
+                "--" if receiver_address == "0" else node.key_to_ID(receiver_address, ring), 
                 amount, 
                 "stake update" if receiver_address == "0" else message, 
             ] 
             for (sender_address, receiver_address, amount, message) in wallet_transactions_list
         ]
-        for modified_transaction, original_transaction in zip(modified_transactions_list, node.wallet.transactions):
+        for modified_transaction, original_transaction in zip(modified_transactions_list, wallet_transactions):
             validator, status = original_transaction[1], original_transaction[2]
             # Append the validator and status to the modified transaction list
-            validator = validator if validator == "None" else node.key_to_ID(validator)
+            validator = validator if validator == "None" else node.key_to_ID(validator, ring)
             modified_transaction.append(validator)
             modified_transaction.append(status)
-        return pickle.dumps(modified_transactions_list)
+        return wire.dumps(modified_transactions_list)
     except Exception as e:
         tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
         traceback_string = "".join(tb_str)
@@ -361,9 +569,19 @@ def get_metrics():
         Returns:
             num_blocks: total number of blocks.
             capacity: the capacity of each block.
+            signature_cache: hits, misses and size of the verified-signature cache.
+            peers: messages sent, errors and send latency per peer ('ip:port').
+            ingest: the transactions waiting for validation and the size of the queue.
+            ledger: the events waiting for the ledger and the events applied per kind.
+            producer: the blocks minted by the producer and the times it tried.
     '''
     try:
-        return jsonify({'num_blocks': len(node.chain.blocks), 'capacity': node.CAPACITY})
+        return jsonify({'num_blocks': node.ledger.snapshot.height, 'capacity': node.CAPACITY,
+                        'signature_cache': signature_cache.stats(),
+                        'peers': node.transport.peer_stats(),
+                        'ingest': node.ingest.stats(),
+                        'ledger': node.ledger.stats(),
+                        'producer': node.producer.stats()})
     except Exception as e:
         tb_str = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
         traceback_string = "".join(tb_str)
@@ -0,0 +1,72 @@
+import random
+
+from Crypto.Hash import SHA256
+
+from cache import LRUCache
+
+class GossipRouter:
+    """
+    Chooses the nodes that a node sends (or forwards) a broadcast message to.
+
+    With mode 'off' the node that creates a message sends it to every other
+    node itself. Otherwise the message is gossiped: it is sent to `fanout`
+    nodes, every node forwards it on its first receipt and drops the copies
+    that it has already seen, so the cost of a broadcast is spread over the
+    network instead of growing with its size at the node that creates it.
+
+        tree:      the nodes (in id order, starting after the origin of the
+                   message) form a tree where every node has `fanout` children.
+                   Every node gets the message exactly once, after about
+                   log(N)/log(fanout) hops, but a node that is down cuts off
+                   its subtree.
+        epidemic:  every node forwards the message to `fanout` random nodes.
+                   Nodes get copies from many paths (more messages), so a node
+                   that is down is routed around; a fanout of about ln(N) + 2
+                   reaches every node with high probability.
+
+    Attributes:
+        mode (string): 'off', 'tree' or 'epidemic'.
+        fanout (int): the nodes that each node sends a message to.
+        seen (LRUCache): the digests of the messages already received.
+    """
+
+    def __init__(self, mode='off', fanout=3, seen_size=10000):
+        """Inits a GossipRouter"""
+        if mode not in ('off', 'tree', 'epidemic'):
+            raise ValueError("Unknown gossip mode " + str(mode))
+        self.mode = mode
+        self.fanout = fanout
+        self.seen = LRUCache(seen_size)
+
+    def __str__(self):
+        """Returns a string representation of a GossipRouter object"""
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    def enabled(self):
+        return self.mode != 'off'
+
+    def first_seen(self, data):
+        """Returns True the first time the message (its bytes) is seen."""
+        return self.seen.add(SHA256.new(data).digest())
+
+    def targets(self, ring_nodes, my_id, origin_id):
+        """Returns the ring nodes that the node sends a message of the origin to.
+
+        ring_nodes are the nodes of the ring in id order (the node included).
+        """
+        if self.mode == 'off':
+            return [node for node in ring_nodes if node['id'] != my_id] if my_id == origin_id else []
+        if self.mode == 'epidemic':
+            candidates = [node for node in ring_nodes if node['id'] != my_id and node['id'] != origin_id]
+            return random.sample(candidates, min(self.fanout, len(candidates)))
+
+        # tree: the position of the node counted from the origin, the
+        # children of position p are the positions fanout*p + 1 ... fanout*p + fanout
+        ids = [node['id'] for node in ring_nodes]
+        if my_id not in ids or origin_id not in ids:
+            return []
+        count = len(ids)
+        start = ids.index(origin_id)
+        position = (ids.index(my_id) - start) % count
+        children = range(self.fanout * position + 1, min(self.fanout * position + self.fanout + 1, count))
+        return [ring_nodes[(start + child) % count] for child in children]
@@ -0,0 +1,99 @@
+import traceback
+
+from collections import deque
+from threading import Condition, Thread
+
+from cache import LRUCache
+
+class TransactionIngest:
+    """
+    Validates the incoming transactions of a node in a single worker thread.
+
+    The request threads only decode the transactions, drop the ones already
+    queued and queue the rest, so a burst of transactions does not tie up the
+    server threads in validation (and in minting) or make them wait for
+    the ledger. The worker takes up to batch_size transactions at a time,
+    in the order they arrived, and validates them in one pass. At most size
+    transactions wait in the queue, the next ones are refused until the
+    worker catches up. A size of 0 disables the queue, the transactions are
+    then validated by the request threads. Only the transactions of the other
+    nodes are queued: the node applies its own ones at once (see
+    Node.make_transaction), so it validates the next one it creates after them.
+    A gossiped message is forwarded by the worker, after one of its
+    transactions has passed validation.
+
+    Attributes:
+        process (function): validates a list of transactions and adds the valid ones to the pool.
+        size (int): the most transactions in the queue.
+        batch_size (int): the most transactions validated in one pass.
+        pending (deque): the queued transactions, each with the forward of its message.
+        seen (LRUCache): the (id, signature) of the transactions queued lately, a copy
+                        with another signature (e.g. a forged one) does not hide the valid one.
+        condition (Condition): provides mutual exclusion for pending and wakes the worker up.
+        thread (Thread): the worker, started with the first transaction.
+    """
+
+    def __init__(self, process, size=10000, batch_size=100):
+        """Inits a TransactionIngest"""
+        self.process = process
+        self.size = size
+        self.batch_size = batch_size
+        self.pending = deque()
+        self.seen = LRUCache(max(size, 1) * 2)
+        self.condition = Condition()
+        self.thread = None
+
+    def __str__(self):
+        """Returns a string representation of a TransactionIngest object"""
+        return str(self.__class__) + ": " + str(self.stats())
+
+    def enabled(self):
+        return self.size > 0
+
+    def put(self, transactions, forward=None):
+        """Queues the transactions that were not queued before.
+
+        forward (if any) is called once, after one of them has passed validation.
+        Returns the number of queued transactions, None if the queue has
+        no room for them (none of them is queued then).
+        """
+        # the transactions of a message share the list, its forward is taken by the first valid one
+        message = [forward]
+        with self.condition:
+            new_transactions = [tr for tr in transactions
+                                if (tr.transaction_id_bytes, tr.signature_bytes) not in self.seen]
+            if len(self.pending) + len(new_transactions) > self.size:
+                return None
+            for tr in new_transactions:
+                self.seen.put((tr.transaction_id_bytes, tr.signature_bytes), True)
+            self.pending.extend((tr, message) for tr in new_transactions)
+            if self.thread is None:
+                self.thread = Thread(target=self.run, name='ingest', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return len(new_transactions)
+
+    def take(self):
+        """Waits for transactions, removes and returns up to batch_size of them."""
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            count = min(self.batch_size, len(self.pending))
+            return [self.pending.popleft() for i in range(count)]
+
+    def run(self):
+        while True:
+            batch = self.take()
+            try:
+                valid = {id(tr) for tr in self.process([tr for (tr, message) in batch])}
+                for (tr, message) in batch:
+                    if message[0] is not None and id(tr) in valid:
+                        (forward, message[0]) = (message[0], None)
+                        forward()
+            except Exception as e:
+                tb_str = traceback.format_exception(type(e), e, e.__traceback__)
+                print("".join(tb_str))
+
+    def stats(self):
+        """Returns the counters of the queue as a dict."""
+        return {'queued': len(self.pending), 'size': self.size}
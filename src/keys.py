@@ -0,0 +1,64 @@
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import pss
+
+from cache import LRUCache
+
+# The network has a fixed set of nodes, so the same few keys are parsed
+# over and over. The parsed keys and the PSS objects (which keep no state
+# between calls) are kept process-wide, keyed by the PEM string of the key.
+KEY_CACHE_SIZE = 1024
+
+key_cache = LRUCache(KEY_CACHE_SIZE)
+signer_cache = LRUCache(KEY_CACHE_SIZE)
+verifier_cache = LRUCache(KEY_CACHE_SIZE)
+
+def add_key(pem, key):
+    """Adds an already parsed key in the cache (e.g. the key of the wallet)."""
+    key_cache.put(pem, key)
+
+def import_key(pem):
+    """Returns the RSA key object of the PEM encoded key, parsing it only once."""
+    key = key_cache.get(pem)
+    if key is None:
+        key = RSA.importKey(pem.encode('ISO-8859-1'))
+        key_cache.put(pem, key)
+    return key
+
+def signer(private_key):
+    """Returns a PSS signature object for the PEM encoded private key."""
+    scheme = signer_cache.get(private_key)
+    if scheme is None:
+        scheme = pss.new(import_key(private_key))
+        signer_cache.put(private_key, scheme)
+    return scheme
+
+def verifier(public_key):
+    """Returns a PSS verification object for the PEM encoded public key."""
+    scheme = verifier_cache.get(public_key)
+    if scheme is None:
+        scheme = pss.new(import_key(public_key))
+        verifier_cache.put(public_key, scheme)
+    return scheme
+
+# Transactions and blocks do not carry the PEM encoded public keys (~270 bytes)
+# of their sender, receiver and validator, but a short fingerprint of them.
+# The registry resolves a fingerprint back to the full key for verification.
+# It holds the keys of the ring (and the node's own key), so it stays small.
+FINGERPRINT_SIZE = 16 # bytes, sent as a hex string of 32 characters
+
+registry = {}
+
+def fingerprint(public_key):
+    """Returns the address (fingerprint) of a PEM encoded public key."""
+    return SHA256.new(public_key.encode('ISO-8859-1')).hexdigest()[:2 * FINGERPRINT_SIZE]
+
+def register(public_key):
+    """Adds a public key in the registry and returns its address."""
+    address = fingerprint(public_key)
+    registry[address] = public_key
+    return address
+
+def resolve(address):
+    """Returns the PEM encoded public key of the address, None if it is unknown."""
+    return registry.get(address)
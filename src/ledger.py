@@ -0,0 +1,384 @@
+import numpy as np
+
+from bisect import bisect_left
+
+import keys
+from cache import LRUCache
+
+class StakeTable:
+    """
+    The distribution of the stakes, used by the Proof of Stake.
+
+    It is built once for a set of stakes and then reused until a stake
+    changes, so finding the validator is a binary search instead of
+    rebuilding the cumulative probabilities. The validator chosen for a
+    hash is memoized, so repeated calls for the same chain head are free.
+
+    Attributes:
+        ids (list): the ids of the nodes, in id order.
+        cumulative_probabilities (list): the cumulative probability of each node.
+        total_stakes (int): the sum of the stakes.
+        validators (LRUCache): hash -> id of the validator already chosen.
+    """
+
+    MEMO_SIZE = 256
+
+    def __init__(self, stakes):
+        """Inits a StakeTable from a list of (id, stake) in id order"""
+        self.ids = [id for (id, stake) in stakes]
+        self.total_stakes = sum(stake for (id, stake) in stakes)
+        self.cumulative_probabilities = []
+        if self.total_stakes != 0:
+            cumulative_probability = 0.0
+            for (id, stake) in stakes:
+                cumulative_probability += stake / self.total_stakes
+                self.cumulative_probabilities.append(cumulative_probability)
+        self.validators = LRUCache(self.MEMO_SIZE)
+
+    def __str__(self):
+        """Returns a string representation of a StakeTable object"""
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    def find_validator(self, hash):
+        """Returns the id of the validator for the given hash, None if there are no stakes.
+
+        The hash (of the previous block) seeds the random number,
+        so every node finds the same validator.
+        """
+        if self.total_stakes == 0:
+            return None
+        validator = self.validators.get(hash)
+        if validator is None:
+            rng = np.random.default_rng(seed=int(hash, 16))
+            rand = rng.random()
+            # the first node whose cumulative probability is >= rand
+            i = bisect_left(self.cumulative_probabilities, rand)
+            validator = self.ids[min(i, len(self.ids) - 1)]
+            self.validators.put(hash, validator)
+        return validator
+
+
+class NonceTracker:
+    """
+    The nonces seen for a sender.
+
+    Instead of keeping every nonce ever seen, it keeps a high-water
+    mark below which all nonces are seen and the few nonces above it
+    that were received out of order. Since the nonces of a sender come
+    from its send counter (0, 1, 2, ...), the sparse set empties as soon
+    as the missing nonces arrive, so the memory per sender is constant.
+
+    A NonceTracker is immutable: add() returns a new tracker, so it can
+    be shared between a state and the overlays on top of it.
+
+    Attributes:
+        next (int): every nonce lower than next is seen.
+        seen (frozenset): the nonces >= next that are seen (out of order).
+        WINDOW (int): how far above next a nonce may be. If a nonce further
+                      ahead arrives, the mark is moved up to keep the window
+                      and the skipped nonces are treated as seen (they can no
+                      longer be used, e.g. transactions that were never broadcast).
+    """
+
+    WINDOW = 1024
+
+    def __init__(self, next=0, seen=frozenset()):
+        """Inits a NonceTracker"""
+        self.next = next
+        self.seen = seen
+
+    def __str__(self):
+        """Returns a string representation of a NonceTracker object"""
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    def __contains__(self, nonce):
+        """Checks if the nonce is seen, O(1)."""
+        return nonce < self.next or nonce in self.seen
+
+    def __len__(self):
+        """Returns the number of the nonces seen."""
+        return self.next + len(self.seen)
+
+    def add(self, nonce):
+        """Returns a new tracker where the nonce is seen as well."""
+        if nonce in self:
+            return self
+        next = self.next
+        seen = set(self.seen)
+        seen.add(nonce)
+        if nonce >= next + self.WINDOW:
+            next = nonce - self.WINDOW + 1
+            seen = {n for n in seen if n >= next}
+        # move the high-water mark over the contiguous nonces
+        while next in seen:
+            seen.remove(next)
+            next += 1
+        return NonceTracker(next, frozenset(seen))
+
+
+class LedgerState:
+    """
+    The state of the ledger, i.e. the ring of the network.
+
+    Keeps the information about every node of the network
+    (id, ip, port, public_key, balance, stake, nonces) indexed
+    by the id of the node and by its address, so that every
+    lookup done while validating transactions and blocks is O(1)
+    instead of a linear scan over the whole ring.
+
+    A LedgerState that is shared (chainState_ring) is treated as
+    immutable: speculative changes are made on a StateOverlay
+    (see overlay()) and commit() builds the next LedgerState.
+    The add_* methods change the state in place and are only
+    used while building a state (bootstrap, genesis block).
+
+    Attributes:
+        nodes (dict): id -> ring node, where a ring node is a dict with the keys
+                      id, ip, port, public_key, address, balance, stake, nonces
+                      (address is the fingerprint of the public key, see keys.py,
+                      nonces is a NonceTracker of the nonces seen).
+                      The ids are given in increasing order, so iterating
+                      over the dict visits the ring nodes in id order.
+        key_index (dict): address -> id, resolves an address without
+                      comparing addresses one by one.
+        stake_index (StakeTable): the distribution of the stakes, built on
+                      first use and dropped when a stake changes.
+    """
+
+    def __init__(self):
+        """Inits an empty LedgerState"""
+        self.nodes = {}
+        self.key_index = {}
+        self.stake_index = None
+
+    def __getstate__(self):
+        """The stake table is not sent along with the state, it is rebuilt."""
+        state = dict(self.__dict__)
+        state['stake_index'] = None
+        return state
+
+    def __str__(self):
+        """Returns a string representation of a LedgerState object"""
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    def __iter__(self):
+        """Iterates over the ring nodes in id order."""
+        return iter(self.nodes.values())
+
+    def __len__(self):
+        """Returns the number of nodes in the ring."""
+        return len(self.nodes)
+
+    def add_node(self, id, ip, port, public_key, balance=0, stake=1, nonces=None):
+        """Adds a new node in the ring (or replaces the one with the same id).
+
+        The public key is registered, so that the transactions of
+        the node can be verified by its address.
+        """
+        address = keys.register(public_key)
+        self.nodes[id] = {
+            'id': id,
+            'ip': ip,
+            'port': port,
+            'public_key': public_key,
+            'address': address,
+            'balance': balance,
+            'stake': stake,
+            'nonces': nonces if nonces is not None else NonceTracker()
+        }
+        self.key_index[address] = id
+        self.stake_index = None
+
+    def get(self, id):
+        """Returns the ring node with the given id, None if there is no such node."""
+        return self.nodes.get(id)
+
+    def key_to_id(self, address, default=None):
+        """Returns the id of the node with the given address."""
+        return self.key_index.get(address, default)
+
+    def _field(self, id, field):
+        ring_node = self.nodes.get(id)
+        return ring_node[field] if ring_node is not None else None
+
+    def balance(self, id):
+        return self._field(id, 'balance')
+
+    def stake(self, id):
+        return self._field(id, 'stake')
+
+    def nonces(self, id):
+        return self._field(id, 'nonces')
+
+    def has_nonce(self, id, nonce):
+        """Checks if the nonce is already seen for the node with the given id."""
+        nonces = self.nonces(id)
+        return nonces is not None and nonce in nonces
+
+    def add_balance(self, id, change):
+        ring_node = self.nodes.get(id)
+        if ring_node is not None:
+            ring_node['balance'] += change
+
+    def add_stake(self, id, change):
+        ring_node = self.nodes.get(id)
+        if ring_node is not None:
+            ring_node['stake'] += change
+            self.stake_index = None
+
+    def add_nonce(self, id, nonce):
+        ring_node = self.nodes.get(id)
+        if ring_node is not None:
+            ring_node['nonces'] = ring_node['nonces'].add(nonce)
+
+    def reset(self):
+        """Resets balances, stakes and nonces to their initial values.
+
+        Used when a whole chain is validated from the genesis block.
+        """
+        for ring_node in self.nodes.values():
+            ring_node['balance'] = 0
+            ring_node['stake'] = 1
+            ring_node['nonces'] = NonceTracker()
+        self.stake_index = None
+
+    def stake_table(self):
+        """Returns the StakeTable of the current stakes."""
+        if self.stake_index is None:
+            self.stake_index = StakeTable([(id, ring_node['stake']) for id, ring_node in self.nodes.items()])
+        return self.stake_index
+
+    def copy(self):
+        """Returns an independent copy of the state."""
+        state = LedgerState()
+        for id, ring_node in self.nodes.items():
+            # the nonce trackers are immutable, they can be shared
+            state.nodes[id] = dict(ring_node)
+        state.key_index = dict(self.key_index)
+        state.stake_index = self.stake_index
+        return state
+
+    def overlay(self):
+        """Returns an empty StateOverlay on top of this state."""
+        return StateOverlay(self)
+
+    def commit(self):
+        """A LedgerState has no pending changes, so it is its own committed state."""
+        return self
+
+
+class StateOverlay:
+    """
+    Speculative changes of the ledger on top of a LedgerState.
+
+    Validating a transaction (or a block) records the changes it
+    makes as small deltas instead of copying the whole ring. The
+    base state is never modified: the overlay is either dropped
+    (the changes are discarded) or committed into a new LedgerState.
+    An overlay of an overlay is flattened, so lookups never walk
+    a chain of overlays.
+
+    Attributes:
+        base (LedgerState): the state the changes are applied on.
+        balances (dict): id -> balance, for the nodes whose balance changed.
+        stakes (dict): id -> stake, for the nodes whose stake changed.
+        stake_index (StakeTable): the distribution of the stakes, if a stake changed.
+        nonces_seen (dict): id -> NonceTracker, for the nodes that sent transactions
+                            on top of the base.
+    """
+
+    def __init__(self, base, balances=None, stakes=None, nonces_seen=None):
+        """Inits a StateOverlay"""
+        self.base = base
+        self.balances = balances if balances is not None else {}
+        self.stakes = stakes if stakes is not None else {}
+        self.nonces_seen = nonces_seen if nonces_seen is not None else {}
+        self.stake_index = None
+
+    def __str__(self):
+        """Returns a string representation of a StateOverlay object"""
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    def __iter__(self):
+        """Iterates over the ring nodes in id order, with the changes applied."""
+        for id in self.base.nodes:
+            yield self.get(id)
+
+    def __len__(self):
+        return len(self.base)
+
+    def get(self, id):
+        ring_node = self.base.get(id)
+        if ring_node is None or (id not in self.balances and id not in self.stakes
+                                 and id not in self.nonces_seen):
+            return ring_node
+        return dict(ring_node, balance=self.balance(id), stake=self.stake(id), nonces=self.nonces(id))
+
+    def key_to_id(self, address, default=None):
+        return self.base.key_to_id(address, default)
+
+    def balance(self, id):
+        if id in self.balances:
+            return self.balances[id]
+        return self.base.balance(id)
+
+    def stake(self, id):
+        if id in self.stakes:
+            return self.stakes[id]
+        return self.base.stake(id)
+
+    def nonces(self, id):
+        if id in self.nonces_seen:
+            return self.nonces_seen[id]
+        return self.base.nonces(id)
+
+    def has_nonce(self, id, nonce):
+        nonces = self.nonces(id)
+        return nonces is not None and nonce in nonces
+
+    def add_balance(self, id, change):
+        balance = self.balance(id)
+        if balance is not None:
+            self.balances[id] = balance + change
+
+    def add_stake(self, id, change):
+        stake = self.stake(id)
+        if stake is not None:
+            self.stakes[id] = stake + change
+            self.stake_index = None
+
+    def stake_table(self):
+        """Returns the StakeTable of the stakes, the base one if no stake changed."""
+        if not self.stakes:
+            return self.base.stake_table()
+        if self.stake_index is None:
+            self.stake_index = StakeTable([(id, self.stake(id)) for id in self.base.nodes])
+        return self.stake_index
+
+    def add_nonce(self, id, nonce):
+        nonces = self.nonces(id)
+        if nonces is not None:
+            self.nonces_seen[id] = nonces.add(nonce)
+
+    def overlay(self):
+        """Returns a new overlay with the same changes, on the same base.
+
+        Only the (small) delta dicts are copied, the nonce
+        trackers are immutable and shared.
+        """
+        return StateOverlay(self.base, dict(self.balances), dict(self.stakes), dict(self.nonces_seen))
+
+    def commit(self):
+        """Returns a new LedgerState: the base with the changes applied.
+
+        The untouched ring nodes are shared with the base, only
+        the ones that changed are copied.
+        """
+        state = LedgerState()
+        state.nodes = dict(self.base.nodes)
+        state.key_index = dict(self.base.key_index)
+        if not self.stakes:
+            state.stake_index = self.base.stake_index
+        for id in set(self.balances) | set(self.stakes) | set(self.nonces_seen):
+            state.nodes[id] = self.get(id)
+        return state
@@ -0,0 +1,125 @@
+import heapq
+
+from collections import OrderedDict
+
+class Mempool:
+    """
+    The validated transactions of a node that wait to be inserted to a block.
+
+    The transactions are indexed by their id, so adding one, finding one and
+    removing one (e.g. the transactions of a block that was added to the chain)
+    takes the same time for any size of the pool, and no transaction is
+    compared with another. They are kept in the order they arrived, and they
+    are also grouped by their sender, where the transaction with the lowest
+    nonce of a sender is found without sorting (a heap of the nonces, from
+    which the removed ones are dropped when they reach its top), and the
+    next one of the sender by its nonce (see BlockAssembler).
+
+    Only the ledger actor of the node uses the pool, so it has no lock.
+
+    Attributes:
+        transactions (OrderedDict): transaction_id (bytes) -> transaction, in the order they arrived.
+        senders (dict): sender address -> dict nonce -> transaction, the pooled transactions of the sender.
+        nonces (dict): sender address -> heap of the nonces of the sender (it may hold removed ones).
+        arrivals (dict): transaction_id (bytes) -> the sequence number of its arrival.
+        sequence (int): the sequence number of the next transaction added.
+    """
+
+    def __init__(self, transactions=()):
+        """Inits a Mempool"""
+        self.transactions = OrderedDict()
+        self.senders = {}
+        self.nonces = {}
+        self.arrivals = {}
+        self.sequence = 0
+        self.extend(transactions)
+
+    def __str__(self):
+        """Returns a string representation of a Mempool object"""
+        return str(self.__class__) + ": " + str(self.stats())
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def __iter__(self):
+        """Iterates over the transactions in the order they arrived."""
+        return iter(self.transactions.values())
+
+    def __contains__(self, transaction):
+        return transaction.transaction_id_bytes in self.transactions
+
+    def get(self, transaction_id):
+        """Returns the transaction with the given id (bytes), None if it is not in the pool."""
+        return self.transactions.get(transaction_id)
+
+    def add(self, transaction):
+        """Adds a transaction, returns False if it is already in the pool."""
+        if transaction.transaction_id_bytes in self.transactions:
+            return False
+        self.transactions[transaction.transaction_id_bytes] = transaction
+        self.arrivals[transaction.transaction_id_bytes] = self.sequence
+        self.sequence += 1
+        by_nonce = self.senders.get(transaction.sender_address)
+        if by_nonce is None:
+            by_nonce = self.senders[transaction.sender_address] = {}
+            self.nonces[transaction.sender_address] = []
+        by_nonce[transaction.nonce] = transaction
+        heapq.heappush(self.nonces[transaction.sender_address], transaction.nonce)
+        return True
+
+    def extend(self, transactions):
+        """Adds many transactions, returns the number of the ones added."""
+        return sum(1 for transaction in transactions if self.add(transaction))
+
+    def remove(self, transaction):
+        """Removes a transaction, returns False if it is not in the pool."""
+        transaction = self.transactions.pop(transaction.transaction_id_bytes, None)
+        if transaction is None:
+            return False
+        del self.arrivals[transaction.transaction_id_bytes]
+        by_nonce = self.senders[transaction.sender_address]
+        if by_nonce.get(transaction.nonce) is transaction:
+            del by_nonce[transaction.nonce]
+        if not by_nonce:
+            del self.senders[transaction.sender_address]
+            del self.nonces[transaction.sender_address]
+        return True
+
+    def remove_all(self, transactions):
+        """Removes many transactions (e.g. the ones of a block), returns the ones that were in the pool."""
+        return [transaction for transaction in transactions if self.remove(transaction)]
+
+    def first(self, sender_address):
+        """Returns the transaction of the sender with the lowest nonce, None if it has none."""
+        by_nonce = self.senders.get(sender_address)
+        if by_nonce is None:
+            return None
+        nonces = self.nonces[sender_address]
+        while nonces[0] not in by_nonce:
+            heapq.heappop(nonces)
+        return by_nonce[nonces[0]]
+
+    def next(self, transaction):
+        """Returns the transaction of the same sender with the next higher nonce, None if it has none."""
+        by_nonce = self.senders.get(transaction.sender_address, {})
+        following = by_nonce.get(transaction.nonce + 1)
+        if following is None and len(by_nonce) > 1:
+            # the nonces of the sender have a gap
+            higher = [nonce for nonce in by_nonce if nonce > transaction.nonce]
+            if higher:
+                following = by_nonce[min(higher)]
+        return following
+
+    def arrival(self, transaction):
+        """Returns the sequence number of the arrival of a pooled transaction."""
+        return self.arrivals[transaction.transaction_id_bytes]
+
+    def clear(self):
+        self.transactions.clear()
+        self.senders.clear()
+        self.nonces.clear()
+        self.arrivals.clear()
+
+    def stats(self):
+        """Returns the size of the pool as a dict."""
+        return {'transactions': len(self.transactions), 'senders': len(self.senders)}
@@ -0,0 +1,61 @@
+"""
+Merkle trees over the transaction ids of a block.
+
+The leaves and the inner nodes are hashed with a different prefix, so an
+inner node can never be passed off as a transaction id. When a level has
+an odd number of nodes, the last one is carried up unchanged (instead of
+being paired with itself), so two different lists of ids never share a root.
+"""
+
+from Crypto.Hash import SHA256
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+def _leaf(transaction_id):
+    # the ids are hex strings, or raw bytes (Transaction.transaction_id_bytes)
+    if isinstance(transaction_id, str):
+        transaction_id = bytes.fromhex(transaction_id)
+    return SHA256.new(LEAF_PREFIX + transaction_id).digest()
+
+def _node(left, right):
+    return SHA256.new(NODE_PREFIX + left + right).digest()
+
+def _next_level(level):
+    next_level = [_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2 == 1:
+        next_level.append(level[-1])
+    return next_level
+
+def merkle_root(transaction_ids):
+    """Returns the Merkle root (hex string) of a list of transaction ids."""
+    if not transaction_ids:
+        return SHA256.new(b'').hexdigest()
+    level = [_leaf(id) for id in transaction_ids]
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0].hex()
+
+def merkle_proof(transaction_ids, index):
+    """Returns the proof that the transaction_ids[index] is in the tree.
+
+    The proof is the list of the siblings on the path from the leaf to the
+    root, as tuples (sibling hash in hex, True if the sibling is on the left).
+    """
+    level = [_leaf(id) for id in transaction_ids]
+    proof = []
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((level[sibling].hex(), sibling < index))
+        level = _next_level(level)
+        index //= 2
+    return proof
+
+def verify_proof(transaction_id, proof, root):
+    """Checks that a transaction id is in the tree with the given root."""
+    current = _leaf(transaction_id)
+    for (sibling, is_left) in proof:
+        sibling = bytes.fromhex(sibling)
+        current = _node(sibling, current) if is_left else _node(current, sibling)
+    return current.hex() == root
@@ -1,15 +1,26 @@
 import requests
-import pickle
-import numpy as np
 
-from copy import deepcopy
-from collections import deque
 from threading import Lock, Thread
 
+import wire
+import sync
+import config
 from blockchain import Blockchain
-from block import Block
+from block import Block, CompactBlock
 from wallet import Wallet
 from transaction import Transaction
+from cache import LRUCache
+from reorder import ReorderBuffer
+from ledger import LedgerState
+from verifier import BatchVerifier
+from transport import create_transport
+from batcher import TransactionBatcher
+from fanout import GossipRouter
+from ingest import TransactionIngest
+from actor import LedgerActor, LedgerSnapshot
+from producer import BlockProducer
+from mempool import Mempool
+from selection import BlockAssembler
 
 class Node:
     """
@@ -19,24 +30,54 @@ class Node:
         id (int): the id of the node.
         chain (Blockchain): the blockchain that the node has.
         wallet (Wallet): the wallet of the node.
-        chainState_ring (list): list of information about other nodes
-                                (id, ip, port, public_key, balance, stake, nonces).
-                                nonces is a list where the nonces seen are kept.
+        chainState_ring (LedgerState): information about other nodes
+                                (id, ip, port, public_key, address, balance, stake, nonces)
+                                indexed by id and by address.
+                                nonces is a NonceTracker of the nonces seen (a
+                                high-water mark plus the nonces seen out of order).
                                 The balances, stakes, nonces are the ones up until the 
                                 last block of the chain, so they are valid but not 100% 
                                 up to date
-        softState_ring (list):  same with chainState_ring but the balances, stakes, nonces
+        softState_ring (StateOverlay):  same with chainState_ring but the balances, stakes, nonces
                                 include the ones from the chainState with the additional 
                                 state's change enforced by the validated transactions
                                 of the transaction pool (which are not yet added to the blockchain).
                                 That means that the softState is NOT valid (added to the chain)
-                                but 100% up to date
-        lock (Lock): a lock in order to provide mutual exclution for chain/transaction_pool.
-        outOfOrderBlocks (deque): A queue that contains the block that received out of order
-        transaction_pool (deque): A queue that contains all the validated 
-                                transactions waiting to be inserted to a block
+                                but 100% up to date. The changes are kept as an overlay
+                                on top of the chainState_ring, which is never copied.
+        ledger (LedgerActor):   the single writer of the chain, the rings, the transaction
+                                pool and the wallet: the requests send it their changes
+                                as events and read the snapshot that it publishes
+        producer (BlockProducer): mints the blocks of the node in the background, woken up
+                                when the pool or the chain changes
+        recent_blocks (LRUCache): hash (bytes) -> the blocks that the node minted last,
+                                the other nodes ask them for the transactions
+                                of a compact block that they do not have
+        compact_blocks (bool):  the minted blocks are relayed as CompactBlocks
+                                (header and transaction ids) to the other nodes
+        outOfOrderBlocks (ReorderBuffer): the blocks that were received out of order,
+                                indexed by the hash of their parent (bounded by
+                                config.REORDER_BUFFER_SIZE)
+        sync_lock (Lock):       the node catches up with one other node at a time
+        sync_hint (int):        the highest block index that the node has caught up for
+        transaction_pool (Mempool): A pool that contains all the validated 
+                                transactions waiting to be inserted to a block,
+                                indexed by id and grouped by sender in nonce order
+        assembler (BlockAssembler): chooses the transactions of a minted block from the
+                                pool by a policy (fifo, fee or age)
         send_counter (int):     a counter that holds how many transactions were made
                                 by the current node as sender
+        submitted (LRUCache):   transaction_id (bytes) -> [status, block index] of the
+                                transactions submitted to the node (see submit_transaction)
+        verifier (BatchVerifier): verifies the signatures of a block/chain in parallel
+        transport (PeerTransport/AsyncTransport): sends the messages to the other nodes
+                                (config.TRANSPORT selects threads or asyncio)
+        batcher (TransactionBatcher): groups the created transactions into batches
+                                before they are sent to the other nodes (disabled by default)
+        router (GossipRouter):  chooses the nodes that a broadcast message is sent
+                                (or forwarded) to, every node by default
+        ingest (TransactionIngest): queues the incoming transactions for a single
+                                validation worker (see ingest_transactions)
         CAPACITY(int):          the number of transaction in a block
     """
 
@@ -45,13 +86,36 @@ class Node:
         self.id = None
         self.chain = Blockchain()
         self.wallet = self.generate_wallet() 
-        self.chainState_ring = []
-        self.softState_ring = []
-        self.chain_lock = Lock()
-        self.transaction_pool_lock = Lock()
-        self.transaction_pool = deque()
-        self.outOfOrderBlocks = deque()
+        self.chainState_ring = LedgerState()
+        self.softState_ring = LedgerState()
+        self.recent_blocks = LRUCache(config.RECENT_BLOCKS)
+        self.compact_blocks = config.COMPACT_BLOCKS
+        self.transaction_pool = Mempool()
+        self.assembler = BlockAssembler(config.BLOCK_POLICY, self.transaction_fee)
+        self.outOfOrderBlocks = ReorderBuffer(config.REORDER_BUFFER_SIZE)
+        self.sync_lock = Lock()
+        self.sync_hint = 0
         self.send_counter = 0
+        self.submitted = LRUCache(config.STATUS_CACHE_SIZE)
+        self.verifier = BatchVerifier(config.VERIFY_WORKERS, config.VERIFY_MIN_BATCH)
+        self.transport = create_transport(config.TRANSPORT)
+        self.batcher = TransactionBatcher(self.send_transactions,
+                                          config.BATCH_WINDOW, config.BATCH_SIZE)
+        self.router = GossipRouter(config.GOSSIP, config.GOSSIP_FANOUT, config.GOSSIP_SEEN)
+        self.ingest = TransactionIngest(self.ingest_transactions,
+                                        config.INGEST_QUEUE_SIZE, config.INGEST_BATCH)
+        self.ledger = LedgerActor({'transactions': self.apply_transactions,
+                                   'create': self.make_transaction,
+                                   'block': self.apply_block,
+                                   'chunk': self.apply_chunk,
+                                   'resume': self.resume,
+                                   'mint': self.mint_block,
+                                   'pool': self.pooled_transactions,
+                                   'register': self.add_node_to_ring,
+                                   'ring': self.adopt_ring,
+                                   'chain': self.adopt_chain}, self.take_snapshot)
+        self.ledger.refresh()
+        self.producer = BlockProducer(self.produce_block, config.PRODUCER_INTERVAL)
 
     def __str__(self):
         """Returns a string representation of a Node object."""
@@ -69,8 +133,9 @@ class Node:
             validator = 0
             return Block(new_idx, previous_hash, validator)
         else:
-            new_block = Block(self.chain.blocks[-1].index + 1, self.chain.blocks[-1].current_hash, self.ID_to_key(self.id))
-            self.add_transactions_to_block(new_block)
+            new_block = Block(self.chain.blocks[-1].index + 1, self.chain.blocks[-1].current_hash, self.ID_to_address(self.id))
+            if self.add_transactions_to_block(new_block) is None:
+                return None
             new_block.set_hash()
             return new_block
         
@@ -81,68 +146,103 @@ class Node:
         This method is called only in the bootstrap node.
         """
 
-        self.chainState_ring.append(
-            {
-                'id': id,
-                'ip': ip,
-                'port': port,
-                'public_key': public_key,
-                'balance': 0, # default value
-                'stake': 1, # default value
-                'nonces': []
-            })
+        # balance = 0 and stake = 1 are the default values
+        self.chainState_ring.add_node(id, ip, port, public_key)
+
+    def add_node_to_ring(self, ip, port, public_key, count):
+        """Registers a new node with the next id (ledger event), in the bootstrap node.
+
+        The ring is copied, the snapshots keep the ring they were published with.
+        Returns the id of the node, None if the ring has count nodes already.
+        """
+        if len(self.chainState_ring) >= count:
+            return None
+        node_id = len(self.chainState_ring)
+        self.chainState_ring = self.chainState_ring.copy()
+        self.register_node_to_ring(node_id, ip, port, public_key)
+        self.softState_ring = self.chainState_ring.overlay()
+        return node_id
+
+    def adopt_ring(self, ring):
+        """Takes the ring sent by the bootstrap node (ledger event)."""
+        self.chainState_ring = ring
+        # Update the id of the node based on the given ring.
+        my_id = ring.key_to_id(self.wallet.address)
+        if my_id is not None:
+            self.id = my_id
+
+    def adopt_chain(self, chain):
+        """Validates the chain sent by the bootstrap node and takes it
+            if the node has no chain yet (ledger event).
+
+            Returns True if the chain was taken.
+        """
+        (validation, ring) = self.validate_chain(chain)
+        if not validation or len(self.chain.blocks) != 0:
+            return False
+        self.chain = chain
+        # init soft and chain state
+        self.chainState_ring = ring
+        self.softState_ring = ring.overlay()
+        # clear the transaction pool
+        self.transaction_pool.clear()
+        return True
+
+    def take_snapshot(self):
+        """Returns a LedgerSnapshot of the chain, the rings and the pool as they are now."""
+        validator = self.find_validator() if self.chain.blocks else None
+        return LedgerSnapshot(self.chain.blocks, self.chainState_ring, self.softState_ring,
+                              validator, len(self.transaction_pool))
 
     @staticmethod
     def ID_to_balance(id, ring):
-        # search for the first occurrence that matches your condition 
-        # and return its balance. If no matching condition is found, 
-        # it will return None
-        return next((ring_node['balance'] for ring_node in ring if ring_node['id'] == id), None)
+        # returns None if there is no node with the given id
+        return ring.balance(id)
    
     @staticmethod
     def ID_to_stake(id, ring):
-        return next((ring_node['stake'] for ring_node in ring if ring_node['id'] == id), None)
-
+        return ring.stake(id)
 
     @staticmethod
     def update_balance(id, change, ring):
-        for ring_node in ring:
-            if ring_node['id'] == id:
-                ring_node['balance'] += change
-                break
+        ring.add_balance(id, change)
 
     @staticmethod
     def update_nonces(id, nonce, ring):
-        for ring_node in ring:
-            if ring_node['id'] == id:
-                ring_node['nonces'].append(nonce)
-                break  
+        ring.add_nonce(id, nonce)
 
     @staticmethod
     def update_stake(id, change, ring):
-        for ring_node in ring:
-            if ring_node['id'] == id:
-                ring_node['stake'] += change
-                break
+        ring.add_stake(id, change)
 
     @staticmethod
     def ID_to_nonces(id, ring):
-        return next((ring_node['nonces'] for ring_node in ring if ring_node['id'] == id), None)
+        return ring.nonces(id)
 
-    def key_to_ID(self, address):
-        return next((ring_node['id'] for ring_node in self.chainState_ring if ring_node['public_key'] == address), 0)
+    def key_to_ID(self, address, ring=None):
+        ring = ring if ring is not None else self.chainState_ring
+        return ring.key_to_id(address, 0)
 
     def IP_to_ID(self, address):
+        # ips are not unique (many nodes may run on the same machine),
+        # so there is no index for them
         return next((ring_node['id'] for ring_node in self.chainState_ring if ring_node['ip'] == address), None)
     
     def ID_to_IP(self, id):
-        return next((ring_node['ip'] for ring_node in self.chainState_ring if ring_node['id'] == id), None)
+        ring_node = self.chainState_ring.get(id)
+        return ring_node['ip'] if ring_node is not None else None
 
     def ID_to_port(self, id):
-        return next((ring_node['port'] for ring_node in self.chainState_ring if ring_node['id'] == id), None)
+        ring_node = self.chainState_ring.get(id)
+        return ring_node['port'] if ring_node is not None else None
 
     def ID_to_key(self, id):
-        return next((ring_node['public_key'] for ring_node in self.chainState_ring if ring_node['id'] == id), None)
+        ring_node = self.chainState_ring.get(id)
+        return ring_node['public_key'] if ring_node is not None else None
+
+    def ID_to_address(self, id):
+        ring_node = self.chainState_ring.get(id)
+        return ring_node['address'] if ring_node is not None else None
 
     @staticmethod
     def totalChargedAmount(amount, message, stake=False):
@@ -152,10 +252,15 @@ class Node:
             """ extra 3% fee and 1BCC for each message's character """
             return 1.03*amount + len(message)
     
+    def transaction_fee(self, transaction):
+        """Returns the fee of a transaction (what the sender pays on top of the amount)."""
+        stake = transaction.receiver_address == "0"
+        return self.totalChargedAmount(transaction.amount, transaction.message, stake) - transaction.amount
+
     def create_transaction(self, receiver, amount, message=""):
         """Creates a new transaction.
 
-        receiver: The public_key of the receiver
+        receiver: The address of the receiver
         
         This method creates a new transaction
         Returns true if the transaction was created
@@ -164,8 +269,36 @@ class Node:
         stake argument determines if the transaction is a stake update
         """
 
+        transaction = self.new_transaction(receiver, amount, message)
+        if transaction is None:
+            return False
+
+        # Broadcast the transaction to the other nodes (the node has applied it).
+        self.broadcast_transaction(transaction)
+            
+        return True
+
+    def new_transaction(self, receiver, amount, message="", submitted=False):
+        """Creates, signs and validates a new transaction, and applies it to
+        the node (its pool and softState), see make_transaction.
+
+        If submitted, the status of the transaction is kept (see transaction_status).
+        Returns the transaction, None if it is not valid (balance, amount).
+        """
+        return self.ledger.call('create', receiver, amount, message, submitted)
+
+    def make_transaction(self, receiver, amount, message, submitted):
+        """Creates a transaction of the node on the last block of its chain,
+            signs it and adds it to the pool (ledger event).
+
+            The events are applied one at a time, so every nonce is used once
+            and every transaction is validated after the ones created before
+            it. Its TTL is the block that the ledger has reached, the
+            snapshot may lag behind the events that wait in the actor.
+            Returns the transaction, None if it is not valid.
+        """
         transaction = Transaction(
-            sender_address=self.wallet.public_key,
+            sender_address=self.wallet.address,
             receiver_address=receiver,
             amount=amount,
             message=message,
@@ -176,53 +309,142 @@ class Node:
         # Sign the transaction
         transaction.sign_transaction(self.wallet.private_key)
 
-        # validate the transaction (balance, amount)
-        if not self.validate_transaction(transaction)[0]:
-            return False
+        if submitted:
+            self.submitted.put(transaction.transaction_id_bytes, ['pending', None])
+        if not self.apply_transactions([transaction]):
+            return None
 
         self.send_counter += 1 # increase send counter
-        # Broadcast the transaction to the whole network.
+        return transaction
+
+    def submit_transaction(self, receiver, amount, message=""):
+        """Creates a new transaction and broadcasts it in the background.
+
+        Unlike create_transaction, it returns as soon as the transaction
+        is validated and applied by the node, the status of the transaction is then
+        reported by transaction_status.
+        Returns the transaction, None if it is not valid.
+        """
+        transaction = self.new_transaction(receiver, amount, message, submitted=True)
+        if transaction is None:
+            return None
+        # the transport sends it to the other nodes in the background
         self.broadcast_transaction(transaction)
-            
-        return True
+        return transaction
+
+    def set_status(self, transaction, status, block_index=None):
+        """Updates the status of a transaction, if it was submitted to the node."""
+        entry = self.submitted.get(transaction.transaction_id_bytes)
+        if entry is None:
+            return
+        # a confirmed transaction stays confirmed (its block may arrive
+        # before the transaction itself, which is then rejected as a repeat)
+        if entry[0] == 'confirmed' and status != 'confirmed':
+            return
+        entry[0] = status
+        entry[1] = block_index
+
+    def transaction_status(self, transaction_id):
+        """Returns [status, block index] of a submitted transaction (hex id).
+
+        The status is one of:
+            pending: validated locally, not yet in the node's pool.
+            pooled: in the node's pool, waiting for a block.
+            confirmed: in the block (index) of the node's chain.
+            failed: rejected by the node (or dropped from its pool).
+        Returns None if the transaction was not submitted to the node
+        (or it is forgotten, see config.STATUS_CACHE_SIZE).
+        """
+        try:
+            transaction_id_bytes = bytes.fromhex(transaction_id)
+        except ValueError:
+            return None
+        entry = self.submitted.get(transaction_id_bytes)
+        return list(entry) if entry is not None else None
 
     def add_transactions_to_block(self, block):
         """Add transactions to the block.
 
-           This method adds transactions in the block
-           transaction_pool_lock is already acquired
+           This method adds transactions in the block, chosen by the
+           assembler and valid in the order of the block, and removes them
+           from the pool.
+           Returns None if the pool has less than CAPACITY transactions
+           (another block may have taken them) that can go in the block
         """
-        self.transaction_pool_lock.acquire()
-        for i in range(self.CAPACITY):
-            block.add_transaction(self.transaction_pool.popleft())
-        self.transaction_pool_lock.release()
+        if len(self.transaction_pool) < self.CAPACITY:
+            return None
+        ring = self.chainState_ring
+        validator = self.find_validator()
+
+        def accept(tr):
+            nonlocal ring
+            (validation, changed_ring) = self.validate_transaction(tr, ring, validator, block)
+            if validation:
+                ring = changed_ring
+            return validation
+
+        transactions = self.assembler.select(self.transaction_pool, self.CAPACITY, accept)
+        if len(transactions) < self.CAPACITY:
+            return None
+        self.transaction_pool.remove_all(transactions)
+        for tr in transactions:
+            block.add_transaction(tr)
         return block
 
-    def broadcast_transaction(self, transaction):
-        """Broadcasts a transaction to the whole network.
+    def send_to_peers(self, endpoint, data):
+        """Sends a (serialized) message of the node to the other nodes in the background.
 
-        This is called each time a new transaction is created. In order to
-        send the transaction simultaneously, each request is sent by a
-        different thread. If all nodes accept the transaction, the node adds
-        it in the current block. the transaction is send back to the sender as well
+        Without gossip every other node is sent to. With gossip the
+        message goes to the nodes chosen by the router, marked with the
+        id of the node (its origin), and they forward it (see forward).
+        Returns the list of the Futures of the responses.
         """
+        if not self.router.enabled():
+            peers = [node for node in self.chainState_ring if node['id'] != self.id]
+            return self.transport.broadcast(peers, endpoint, data)
+        # the message comes back to the node through the other nodes
+        self.router.first_seen(data)
+        peers = self.router.targets(list(self.chainState_ring), self.id, self.id)
+        return self.transport.broadcast(peers, endpoint + '?origin=' + str(self.id), data)
+
+    def forward(self, endpoint, origin, data):
+        """Forwards a gossiped message of the origin node to the next nodes.
+
+        The node forwards a message once, after it has decoded and validated
+        it (the copies are dropped by the endpoints, see GossipRouter.first_seen).
+        """
+        peers = self.router.targets(list(self.ledger.snapshot.chain_ring), self.id, origin)
+        if peers:
+            self.transport.broadcast(peers, endpoint + '?origin=' + str(origin), data)
 
-        """ we should NOT wait for all nodes to validate the transaction """
-
-        def thread_func(node, endpoint):
-            address = 'http://' + node['ip'] + ':' + node['port']
-            requests.post(address + endpoint, data=pickle.dumps(transaction))
+    def broadcast_transaction(self, transaction):
+        """Broadcasts a transaction to the other nodes.
+
+        This is called each time a new transaction is created. 
+        If all nodes accept the transaction, the node adds
+        it in the current block. The node itself has already applied it
+        (see make_transaction), it is not posted to the node's own server:
+        the request that creates it holds a worker of the server. The other
+        nodes are sent to in the background by the transport's workers,
+        waiting for them could tie up all the workers of two nodes that
+        wait for each other.
+        """
 
-        threads = []
-        for node in self.chainState_ring:
-            thread = Thread(target=thread_func, args=(
-                node, '/validate_transaction'))
-            threads.append(thread)
-            thread.start()
+        """ we should NOT wait for all nodes to validate the transaction """
+        if self.batcher.enabled():
+            # sent with the next batch (see send_transactions)
+            self.batcher.add(transaction)
+        else:
+            self.send_to_peers('/validate_transaction', wire.dumps(transaction))
+        return True
 
-        for tr in threads:
-            tr.join()
+    def send_transactions(self, transactions):
+        """Sends a batch of transactions of the node to the other nodes.
 
+        The batch is one message, the nodes validate it
+        in a single pass (see validate_transactions).
+        """
+        self.send_to_peers('/validate_transactions', wire.dumps(transactions))
         return True
 
     def validate_transaction(self, transaction, ring=None, validator=None, block=None):
@@ -258,45 +480,119 @@ class Node:
         if block.index-transaction.TTL > self.TTL_LIMIT: 
             return (False, None) # reject transaction as old one
 
+        sender_id = self.key_to_ID(transaction.sender_address, ring)
+        charged_amount = self.totalChargedAmount(transaction.amount, transaction.message, transaction.receiver_address == "0")
         # negative amounts are accepted only for stake transactions
         if transaction.amount < 0:
             if transaction.receiver_address != "0":
                 return (False, None)
             # if the stakes update (amount) is greater than the actual stake
-            if self.ID_to_stake(self.key_to_ID(transaction.sender_address), ring) < abs(transaction.amount):
+            if ring.stake(sender_id) < abs(transaction.amount):
                 return (False, None)
         else:
-            if self.ID_to_balance(self.key_to_ID(transaction.sender_address), ring) < self.totalChargedAmount(transaction.amount, transaction.message, transaction.receiver_address == "0"):
+            if ring.balance(sender_id) < charged_amount:
                 return (False, None)
 
-        if transaction.nonce in self.ID_to_nonces(self.key_to_ID(transaction.sender_address), ring):
+        if ring.has_nonce(sender_id, transaction.nonce):
             return (False, None)
 
-        temp_ring = deepcopy(ring)
-        sender_id = self.key_to_ID(transaction.sender_address) 
-        self.update_balance(sender_id, -self.totalChargedAmount(transaction.amount, transaction.message, transaction.receiver_address == "0"), temp_ring)
+        # record the changes on top of the given ring, the ring itself is not modified
+        temp_ring = ring.overlay()
+        self.update_balance(sender_id, -charged_amount, temp_ring)
         self.update_nonces(sender_id, transaction.nonce, temp_ring)
         if transaction.receiver_address == "0": #stake transaction
             self.update_stake(sender_id, transaction.amount, temp_ring)
         else: # regular transaction
-            receiver_id = self.key_to_ID(transaction.receiver_address)
+            receiver_id = self.key_to_ID(transaction.receiver_address, ring)
             self.update_balance(receiver_id, transaction.amount, temp_ring)
             self.update_balance(validator_id, transaction.amount*0.03+len(transaction.message), temp_ring)
         return (True, temp_ring)
 
-    def add_transaction_to_pool(self, transaction):
-        """Appends a transaction to the pool
+    def validate_transactions(self, transactions, ring=None):
+        """Validates a batch of incoming transactions.
+
+        The transactions are validated in order, each one against the
+        ring with the changes of the valid ones before it. The validator
+        is found once for the whole batch, and the
+        signatures are verified together (in parallel if there are workers).
 
-            If there are enough transactions >= CAPACITY
-            then a block can be formed, call mine_block()
+        Returns the tuple (valid_transactions, changed_ring),
+        changed_ring is the given ring if none of them is valid.
         """
-        self.transaction_pool_lock.acquire()
-        self.transaction_pool.append(transaction)
-        if len(self.transaction_pool) >= self.CAPACITY:
-            self.transaction_pool_lock.release()
-            self.mint_block()
-        else:
-            self.transaction_pool_lock.release()
+        ring = ring if ring is not None else self.softState_ring
+        validator = self.find_validator()
+        # the results are kept in the signature cache
+        self.verifier.verify(transactions)
+
+        valid_transactions = []
+        for transaction in transactions:
+            (validation, changed_ring) = self.validate_transaction(transaction, ring, validator)
+            if validation:
+                valid_transactions.append(transaction)
+                ring = changed_ring
+        return (valid_transactions, ring)
+
+    def add_transactions_to_pool(self, transactions):
+        """Validates a batch of transactions and appends the valid ones to the pool
+
+            The validation against the softState, the pool and the
+            softState change together (in the ledger actor), so batches
+            that arrive at the same time are applied one after the other.
+            The block producer is woken up, it mints the blocks
+            that the pool fills (if the node is the validator).
+
+            Returns the valid transactions.
+        """
+        (valid_transactions, changed_ring) = self.validate_transactions(transactions)
+        self.transaction_pool.extend(valid_transactions)
+        self.softState_ring = changed_ring
+        if len(valid_transactions) < len(transactions):
+            for tr in set(transactions).difference(valid_transactions):
+                self.set_status(tr, 'failed')
+        for tr in valid_transactions:
+            self.set_status(tr, 'pooled')
+        if valid_transactions:
+            self.producer.wake()
+        return valid_transactions
+
+    def produce_block(self):
+        """Mints the next block if the pool has CAPACITY transactions and
+            the node is its validator (called by the producer).
+
+            The block is minted by the ledger, one block per event, so the
+            transactions that arrive meanwhile are not held up by many blocks.
+            Returns True if a block was minted.
+        """
+        return self.ledger.call('mint')
+
+    def ingest_transactions(self, transactions):
+        """Verifies the signatures of incoming transactions and sends them
+            to the ledger (see apply_transactions).
+
+            It is called by the ingest worker (or by the request thread
+            when the ingest queue is disabled), and by the node for its own
+            transactions (see make_transaction). Returns the valid transactions.
+        """
+        # the results are kept in the signature cache, the ledger only looks them up
+        self.verifier.verify(transactions)
+        return self.ledger.call('transactions', transactions)
+
+    def apply_transactions(self, transactions):
+        """Adds the valid transactions to the pool (see add_transactions_to_pool)
+            and, if the node is their sender or receiver, to its wallet (ledger event).
+
+            Returns the valid transactions.
+        """
+        valid_transactions = self.add_transactions_to_pool(transactions)
+        for tr in valid_transactions:
+            if (tr.receiver_address == self.wallet.address or \
+                tr.sender_address == self.wallet.address):
+                self.wallet.transactions.append([tr, "None", "Unconfirmed"])
+        if valid_transactions:
+            # the senders may have blocks the node has not received
+            newest = max(valid_transactions, key=lambda tr: tr.TTL)
+            self.check_height(newest.TTL, newest.sender_address)
+        return valid_transactions
 
     def find_validator(self, block=None, ring=None, chain=None):
         """ Finds the validator of the block according 
@@ -318,31 +614,17 @@ class Node:
                 hash of the previous block)
         """
 
-        total_stakes = 0
-        for ring_node in ring:
-            total_stakes += ring_node['stake']
-        if total_stakes == 0:
-            return None
-
-        # Create a sorted list of (cumulative_probability, node_id) tuples
-        cumulative_probabilities = []
-        cumulative_probability = 0.0
-        for ring_node in ring:
-            cumulative_probability += ring_node["stake"] / total_stakes
-            cumulative_probabilities.append((cumulative_probability, ring_node["id"]))
-
-        # Draw a random number and find the corresponding node
-        # Use the hash of the last block as a seed
-        rng = np.random.default_rng(seed=int(hash, 16))  
-        rand = rng.random()
-        return next(node_id for cum_prob, node_id in cumulative_probabilities if rand <= cum_prob)
+        # The ring keeps the cumulative probabilities of the stakes until a
+        # stake changes, and draws a random number using the hash as a seed.
+        return ring.stake_table().find_validator(hash)
 
     def mint_block(self):
         """Implements the proof-of-stake.
 
         This methods implements the proof of stake algorithm.
         if the calling node isnt the validator false is returned
-        otherwise the block is mined and broadcasted, true is returned
+        otherwise the block is mined, added to the chain and broadcasted,
+        true is returned (ledger event, see produce_block)
         """
 
         validator = self.find_validator()
@@ -351,6 +633,14 @@ class Node:
             return False
 
         mined_block = self.create_new_block()
+        if mined_block is None:
+            return False
+        # the node adds the block to its chain before the other nodes get it
+        if self.apply_block(mined_block) != 'added':
+            # its transactions were taken from the pool, they go back
+            self.transaction_pool.extend(mined_block.transactions)
+            return False
+        self.recent_blocks.put(mined_block.current_hash_bytes, mined_block)
         self.broadcast_block(mined_block)
         return True
 
@@ -362,32 +652,74 @@ class Node:
         The miner that mined the block does not wait for explicit 
         validation from other nodes, he adds the block to his blockchain 
         immediately upon successful mining.
-        miner broadcasts it to himself as well
+        the block is minted by the ledger actor, which adds it to the chain
+        before it is sent (see mint_block)
 
         when we are about to send a block we dont need to validate it,
         cause the transactions were validated while they were being received
+
+        With compact_blocks, the other nodes get the header of the block
+        with the ids of its transactions, which they already have in their
+        pools (see rebuild_block).
         """
 
-        def thread_func(node):
-            address = 'http://' + node['ip'] + ':' + node['port']
-            requests.post(address + '/get_block', data=pickle.dumps(block))
+        if self.compact_blocks:
+            self.send_to_peers('/get_compact_block', wire.dumps(CompactBlock(block)))
+        else:
+            self.send_to_peers('/get_block', wire.dumps(block))
 
-        threads = []
-        for node in self.chainState_ring:
-            thread = Thread(target=thread_func, args=(node,))
-            threads.append(thread)
-            thread.start()
+    def rebuild_block(self, compact_block):
+        """Rebuilds a block from a CompactBlock.
 
-        for tr in threads:
-            tr.join()
+        The transactions are taken from the pool, the missing ones
+        are asked from the validator of the block (/get_transactions).
+        Returns the block, None if the validator could not send them.
+        """
+        transactions = self.ledger.call('pool', compact_block.transaction_ids)
+        missing = compact_block.missing(transactions)
+        if missing:
+            validator_id = self.key_to_ID(compact_block.validator, self.ledger.snapshot.chain_ring)
+            response = self.transport.post(self.ID_to_IP(validator_id), self.ID_to_port(validator_id),
+                                           '/get_transactions',
+                                           wire.dumps({'block': compact_block.current_hash_bytes,
+                                                       'ids': missing}))
+            if response.status_code != 200:
+                return None
+            for tr in wire.loads(response.content):
+                transactions[tr.transaction_id_bytes] = tr
+            if compact_block.missing(transactions):
+                return None
+        return compact_block.rebuild(transactions)
+
+    def pooled_transactions(self, transaction_ids):
+        """Returns the transactions (ids) that are in the pool as a dict id -> transaction (ledger event)."""
+        transactions = {}
+        for transaction_id in transaction_ids:
+            tr = self.transaction_pool.get(transaction_id)
+            if tr is not None:
+                transactions[transaction_id] = tr
+        return transactions
+
+    def find_transactions(self, block_hash, transaction_ids):
+        """Returns the transactions (ids) of a block that the node minted lately,
+            None if the node does not have the block.
+        """
+        block = self.recent_blocks.get(block_hash)
+        if block is None:
+            return None
+        wanted = set(transaction_ids)
+        return [tr for tr in block.transactions if tr.transaction_id_bytes in wanted]
 
     def validate_block(self, block, chain=None, ring=None):
         """Validates an incoming block.
 
             The validation consists of:
-            - check that current hash is valid.
+            - check that the Merkle root matches the transactions
+              (the only hashing over the whole block).
+            - check that current hash (the hash of the header) is valid.
             - validate the previous hash.
             - validate all transactions of the block
+              (the signatures are verified first, as a batch)
 
             its not enough to validate each transaction separately
             we must make sure that the costs all together can be afforded
@@ -411,16 +743,21 @@ class Node:
         ring = ring if ring is not None else self.chainState_ring
         chain = chain if chain is not None else self.chain
 
+        if not block.verify_merkle_root():
+            return (False, None)
         if block.current_hash != block.get_hash(): 
             return (False, None)
-        if block.previous_hash != chain.blocks[-1].current_hash:
+        if block.previous_hash_bytes != chain.blocks[-1].current_hash_bytes:
             return (False, None)
-        if self.find_validator(block, ring, chain) != self.key_to_ID(block.validator):
+        validator_id = self.key_to_ID(block.validator, ring)
+        if self.find_validator(block, ring, chain) != validator_id:
+            return (False, None)
+        if not self.verifier.verify(block.transactions):
             return (False, None)
         
-        temp_ring = deepcopy(ring)
+        temp_ring = ring.overlay()
         for transaction in block.transactions:
-            (validation, temp_ring) = self.validate_transaction(transaction, temp_ring, validator=self.key_to_ID(block.validator), block=block)
+            (validation, temp_ring) = self.validate_transaction(transaction, temp_ring, validator=validator_id, block=block)
             if validation == False:
                 return (False, None)
         return (True, temp_ring)
@@ -440,17 +777,21 @@ class Node:
         # If the node is the recipient or the sender of the transaction,
         # it adds the transaction in its wallet.
         for tr in block.transactions:
-            if (tr.receiver_address == self.wallet.public_key or \
-                tr.sender_address == self.wallet.public_key):
-                for w_tr in self.wallet.transactions:
+            self.set_status(tr, 'confirmed', block.index)
+            if (tr.receiver_address == self.wallet.address or \
+                tr.sender_address == self.wallet.address):
+                for (i, w_tr) in enumerate(self.wallet.transactions):
                     if w_tr[0] == tr:
-                        w_tr[1] = block.validator
-                        w_tr[2] = "Confirmed"
+                        # the entry is replaced, not changed, the requests read the wallet as it is
+                        self.wallet.transactions[i] = [tr, block.validator, "Confirmed"]
                         break
+                else:
+                    # the block arrived before the transaction was validated
+                    self.wallet.transactions.append([tr, block.validator, "Confirmed"])
                     
         self.chain.blocks.append(block)
-        self.chainState_ring = deepcopy(new_ring)
-        self.softState_ring = deepcopy(new_ring)
+        self.chainState_ring = new_ring.commit()
+        self.softState_ring = self.chainState_ring.overlay()
 
     def filter_transactions(self, mined_block):
         """ When a block is got, validated and added to the chain,
@@ -458,51 +799,98 @@ class Node:
             Additionally, if transactions remain in the transaction pool,
             we should change the softState accordingly
         """
-        self.transaction_pool_lock.acquire()
-        try:
-            
-            # Remove transactions that are in the mined block
-            self.transaction_pool = deque(
-                tr for tr in self.transaction_pool if tr not in mined_block.transactions
-            )
-            # MUST VALIDATE THE TRANSACTIONS REMAINED IN THE TRANSACTION POOL
-            # AND CHANGE THE SOFT STATE
-            transactions_to_remove = [] # list to collect transactions that need to be removed
-            for tr in self.transaction_pool:
-                (validation, changed_ring) = self.validate_transaction(tr)
-                # if the transaction is not valid yet remove it
-                # check if the transaction is old, if it is remove it
-                if validation == True and mined_block.index-tr.TTL <= self.TTL_LIMIT: 
-                    self.softState_ring = changed_ring
-                else: # not valid or old, remove it
-                    transactions_to_remove.append(tr)
-
-            # Remove the transactions that are invalid or too old
-            for tr in transactions_to_remove:
-                self.transaction_pool.remove(tr)
-        finally:
-            #pass
-            self.transaction_pool_lock.release()
+        # the softState is rebuilt from the chainState and the pool
+        self.softState_ring = self.chainState_ring.overlay()
+
+        # Remove transactions that are in the mined block (by id, the pool is not scanned)
+        self.transaction_pool.remove_all(mined_block.transactions)
+        # MUST VALIDATE THE TRANSACTIONS REMAINED IN THE TRANSACTION POOL
+        # AND CHANGE THE SOFT STATE
+        transactions_to_remove = [] # list to collect transactions that need to be removed
+        # the validator of the next block is the same for all of them
+        validator = self.find_validator()
+        for tr in self.transaction_pool:
+            (validation, changed_ring) = self.validate_transaction(tr, validator=validator)
+            # if the transaction is not valid yet remove it
+            # check if the transaction is old, if it is remove it
+            if validation == True and mined_block.index-tr.TTL <= self.TTL_LIMIT: 
+                self.softState_ring = changed_ring
+            else: # not valid or old, remove it
+                transactions_to_remove.append(tr)
+
+        # Remove the transactions that are invalid or too old
+        for tr in self.transaction_pool.remove_all(transactions_to_remove):
+            self.set_status(tr, 'failed')
+
+    def receive_block(self, block):
+        """Verifies the signatures of an incoming block and sends it to
+            the ledger (see apply_block).
+
+            Returns 'added', 'out_of_order' (the block is kept until its
+            parent is added) or 'rejected'.
+        """
+        # the results are kept in the signature cache, the ledger only looks them up
+        self.verifier.verify(block.transactions)
+        return self.ledger.call('block', block)
+
+    def apply_block(self, block):
+        """Validates a block and adds it to the chain, together with the
+            blocks that arrived before it and follow it (ledger event).
+
+            Returns 'added', 'out_of_order' or 'rejected'.
+        """
+        outcome = self.add_block(block)
+        if outcome == 'out_of_order':
+            # many blocks may be missing, they are asked from the validator of this one
+            self.check_height(block.index, block.validator)
+        # the missing block may have been added in the meantime
+        last_block = self.checkOutOfOrderBlocks()
+        if last_block is None and outcome == 'added':
+            last_block = block
+        # the pool may have filled up while the node was waiting for this
+        # block to learn that it is the next validator
+        if last_block is not None and last_block.validator != self.wallet.address:
+            self.producer.wake()
+        return outcome
+
+    def add_block(self, block):
+        """Validates a block and adds it to the chain, or keeps it
+            in outOfOrderBlocks if its parent has not arrived yet.
+
+            Returns 'added', 'out_of_order' or 'rejected'.
+        """
+        (validation, changed_ring) = self.validate_block(block)
+        last_block = self.chain.blocks[-1]
+        if validation:
+            self.add_block_to_chain(block, changed_ring)
+            self.outOfOrderBlocks.prune(block.index)
+        elif (block.previous_hash_bytes != last_block.current_hash_bytes and
+              block.index > last_block.index):
+            # received out of order
+            self.outOfOrderBlocks.add(block)
+            return 'out_of_order'
+        else:
+            return 'rejected'
+        # Remove the block's transactions from the transaction pool.
+        self.filter_transactions(block)
+        return 'added'
 
     def checkOutOfOrderBlocks(self):
         """ When a block is got, validated and added to the chain,
             and after the transaction filtering, we must check the 
-            deque that contained out of order blocks if now the blocks
-            can get in order. If there is the next block in the queue, 
-            remove it and send it again to myself
-        """
-        # Use a list to track blocks to be removed
-        blocks_to_remove = []
-        for outOfOrderBlock in self.outOfOrderBlocks:
-            if outOfOrderBlock.previous_hash == self.chain.blocks[-1].current_hash:
-                blocks_to_remove.append(outOfOrderBlock)
-                address = 'http://' + self.ID_to_IP(self.id) + ':' + self.ID_to_port(self.id)
-                requests.post(address + '/get_block', data=pickle.dumps(outOfOrderBlock))
-                break
-        
-        # Remove the identified blocks
-        for block in blocks_to_remove:
-            self.outOfOrderBlocks.remove(block)
+            blocks that were received out of order if now the blocks
+            can get in order. Every block that follows the last block
+            of the chain is added, one after the other.
+
+            Returns the last block added, None if no block was added.
+        """
+        last_block = None
+        while True:
+            next_block = self.outOfOrderBlocks.pop_next(self.chain.blocks[-1].current_hash_bytes)
+            if next_block is None:
+                return last_block
+            if self.add_block(next_block) == 'added':
+                last_block = next_block
 
     def share_ring(self, ring_node):
         """Shares the node's ring (neighbor nodes) to a specific node.
@@ -510,9 +898,24 @@ class Node:
         This function is called for every newcoming node in the blockchain.
         """
 
-        address = 'http://' + ring_node['ip'] + ':' + ring_node['port']
-        requests.post(address + '/get_ring',
-                      data=pickle.dumps(self.chainState_ring))
+        self.transport.post(ring_node['ip'], ring_node['port'], '/get_ring',
+                            wire.dumps(self.ledger.snapshot.chain_ring))
+
+    def share_state(self, ring_nodes):
+        """Shares the ring and then the chain to many nodes at once.
+
+        Every node gets the ring before the chain (the chain is validated
+        against the ring), but the nodes are sent to in parallel.
+        Returns when all of them have answered.
+        """
+        snapshot = self.ledger.snapshot
+        ring = wire.dumps(snapshot.chain_ring)
+        chain = wire.dumps(snapshot.chain())
+        futures = [self.transport.send_sequence(ring_node['ip'], ring_node['port'],
+                                                [('/get_ring', ring), ('/get_chain', chain)])
+                   for ring_node in ring_nodes]
+        for future in futures:
+            future.result()
 
     def validate_chain(self, chain):
         """Validates all the blocks of a chain.
@@ -529,18 +932,22 @@ class Node:
         'ring' is the ring if the changes of the chain
         is applied to the initial state (self.ring)
         """
-        temp_ring = deepcopy(self.chainState_ring)
-        for ring_node in temp_ring:
-            ring_node['balance'] = 0
-            ring_node['nonces'] = []
-            ring_node['stake'] = 1
+        temp_ring = self.chainState_ring.copy()
+        temp_ring.reset()
         blocks = chain.blocks
+        # verify the signatures of the whole chain at once, the blocks
+        # then find the results in the signature cache
+        if not self.verifier.verify([tr for block in blocks[1:] for tr in block.transactions]):
+            return (False, None)
+        # every block is validated against the blocks before it
+        validated = Blockchain()
         for i in range(len(blocks)):
             if i == 0:
                 if (blocks[i].previous_hash != 1 or
+                    not blocks[i].verify_merkle_root() or
                     blocks[i].current_hash != blocks[i].get_hash() or 
                     blocks[i].transactions[0].sender_address != "0" or 
-                    blocks[i].transactions[0].receiver_address != self.ID_to_key(0) or
+                    blocks[i].transactions[0].receiver_address != self.ID_to_address(0) or
                     blocks[i].transactions[0].amount != 1000 * len(temp_ring) or
                     blocks[i].transactions[0].message != "" or 
                     blocks[i].transactions[0].nonce != 0):
@@ -548,19 +955,112 @@ class Node:
                 self.update_balance(0, 1000 * len(temp_ring), temp_ring)
                 self.update_nonces(0, 0, temp_ring)
             else:
-                (validation, temp_ring) = self.validate_block(blocks[i], temp_ring)
+                (validation, temp_ring) = self.validate_block(blocks[i], validated, temp_ring)
                 if not validation:  
                     return (False, None)
+                temp_ring = temp_ring.commit()
+            validated.add_block(blocks[i])
         return (True, temp_ring)
 
+    def sync_chain(self, ip, port):
+        """Asks a node for the blocks after the last block of the chain.
+
+        The node answers with a stream of chunks of blocks (see sync.py),
+        every chunk is validated and added to the chain as soon as it
+        arrives, so the cost depends on the missing blocks only.
+
+        Returns the number of blocks added, None if the node does not
+        have the last block of the chain (it follows another chain).
+        """
+        last_block = self.ledger.snapshot.last_block()
+        response = requests.get('http://' + ip + ':' + port + '/sync_chain',
+                                params={'height': last_block.index, 'hash': last_block.current_hash,
+                                        'chunk': config.SYNC_CHUNK},
+                                stream=True, timeout=config.PEER_TIMEOUT)
+        with response:
+            if response.status_code != 200:
+                return None
+            added = 0
+            for blocks in sync.read_frames(response.raw):
+                # the signatures of the chunk are verified at once, the
+                # blocks then find the results in the signature cache
+                self.verifier.verify([tr for block in blocks for tr in block.transactions])
+                (chunk_added, follows) = self.ledger.call('chunk', blocks)
+                added += chunk_added
+                if not follows:
+                    # the rest of the stream does not follow the chain
+                    return added
+            return added
+
+    def apply_chunk(self, blocks):
+        """Adds a chunk of synced blocks to the chain (ledger event).
+
+        Returns the tuple (blocks added, False if a block does not follow the chain).
+        """
+        added = 0
+        for block in blocks:
+            outcome = self.add_block(block)
+            if outcome == 'added':
+                added += 1
+            elif not self.has_block(block):
+                return (added, False)
+        return (added, True)
+
+    def has_block(self, block):
+        """Returns True if the block is in the chain (it may have arrived while syncing)."""
+        blocks = self.chain.blocks
+        return (block.index < len(blocks) and
+                blocks[block.index].current_hash_bytes == block.current_hash_bytes)
+
+    def check_height(self, index, address):
+        """Catches up in the background if another node (address) has
+            a block (index) more than config.SYNC_GAP blocks after the
+            last block of the chain (ledger event).
+
+            The node learns it from an out of order block, or from the TTL
+            of a transaction that passed validation (it is signed by a node
+            of the ring, the last block of its sender). The index is only a
+            hint, the blocks are asked by height (see sync_chain), and an
+            index is not asked for twice.
+        """
+        if (index > max(self.chain.blocks[-1].index, self.sync_hint) + config.SYNC_GAP and
+            not self.sync_lock.locked()):
+            self.sync_hint = index
+            Thread(target=self.catch_up, args=(address,), daemon=True).start()
+
+    def catch_up(self, address):
+        """Syncs the chain with the node of the address, which is ahead of it."""
+        # the node is already catching up, the blocks of the other node will arrive too
+        if not self.sync_lock.acquire(blocking=False):
+            return
+        try:
+            # an address that is not in the ring is not asked (it is not node 0)
+            peer_id = self.ledger.snapshot.chain_ring.key_to_id(address)
+            if peer_id is None or peer_id == self.id:
+                return
+            added = self.sync_chain(self.ID_to_IP(peer_id), self.ID_to_port(peer_id))
+            if added:
+                self.ledger.call('resume')
+        except Exception as e:
+            print("Syncing the chain failed: " + repr(e))
+        finally:
+            self.sync_lock.release()
+
+    def resume(self):
+        """Adds the blocks that follow the chain after a sync and mints
+            if the node is the next validator (ledger event).
+        """
+        self.checkOutOfOrderBlocks()
+        self.producer.wake()
+
     def share_chain(self, ring_node):
         """Shares the node's current blockchain to a specific node.
 
         This function is called whenever there is a conflict and the node is
         asked to send its chain by the ring_node.
         """
-        address = 'http://' + ring_node['ip'] + ':' + ring_node['port']
-        requests.post(address + '/get_chain', data=pickle.dumps(self.chain))
+        self.transport.post(ring_node['ip'], ring_node['port'], '/get_chain',
+                            wire.dumps(self.ledger.snapshot.chain()))
 
     def stake(self, amount):
         """ updates the stake of the current node 
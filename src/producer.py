@@ -0,0 +1,68 @@
+import traceback
+
+from threading import Condition, Thread
+
+class BlockProducer:
+    """
+    Mints the blocks of a node in the background.
+
+    The events that may let the node mint (transactions added to the pool,
+    a block that makes the node the next validator) only wake the producer
+    up, so the requests that bring them return without waiting for a block
+    to be assembled, hashed and sent. The producer asks for one block at a
+    time and again as long as one is minted, so the transactions that arrive
+    meanwhile are applied between the blocks; a block is sent to the other
+    nodes in the background, the next one is assembled while it travels.
+    Every interval seconds the producer also wakes up by itself, in case a
+    change was missed (e.g. blocks added by a sync).
+
+    Attributes:
+        produce (function): mints a block if the node can, returns True if it minted one.
+        interval (float): seconds between the wakeups of the timer.
+        pending (bool): the producer was woken up since it last tried.
+        condition (Condition): provides mutual exclusion for pending and wakes the producer up.
+        thread (Thread): the producer, started with the first wakeup.
+        produced (int): the number of blocks minted.
+        wakeups (int): the number of times the producer tried to mint.
+    """
+
+    def __init__(self, produce, interval=1.0):
+        """Inits a BlockProducer"""
+        self.produce = produce
+        self.interval = interval
+        self.pending = False
+        self.condition = Condition()
+        self.thread = None
+        self.produced = 0
+        self.wakeups = 0
+
+    def __str__(self):
+        """Returns a string representation of a BlockProducer object"""
+        return str(self.__class__) + ": " + str(self.stats())
+
+    def wake(self):
+        """Lets the producer try to mint (the pool or the chain changed)."""
+        with self.condition:
+            self.pending = True
+            if self.thread is None:
+                self.thread = Thread(target=self.run, name='producer', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.pending:
+                    self.condition.wait(self.interval)
+                self.pending = False
+            self.wakeups += 1
+            try:
+                while self.produce():
+                    self.produced += 1
+            except Exception as e:
+                tb_str = traceback.format_exception(type(e), e, e.__traceback__)
+                print("".join(tb_str))
+
+    def stats(self):
+        """Returns the counters of the producer as a dict."""
+        return {'produced': self.produced, 'wakeups': self.wakeups, 'interval': self.interval}
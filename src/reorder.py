@@ -0,0 +1,79 @@
+from collections import OrderedDict
+
+class ReorderBuffer:
+    """
+    The blocks that arrived before their parent, indexed by the hash of the parent.
+
+    When a block is added to the chain, the block that follows it (if it
+    arrived earlier) is found with one lookup instead of a scan. At most
+    maxsize blocks are kept, the oldest one is dropped to make room, and
+    the blocks that can no longer follow the chain (their index is not
+    after the last block) are dropped when a block is added.
+
+    Only the ledger actor of the node accesses the buffer.
+
+    Attributes:
+        maxsize (int): the maximum number of blocks kept.
+        blocks (OrderedDict): previous_hash (bytes) -> {current_hash (bytes): Block},
+                              the parent that was waited for the longest first.
+        size (int): the number of blocks kept.
+    """
+
+    def __init__(self, maxsize=100):
+        """Inits a ReorderBuffer"""
+        self.maxsize = maxsize
+        self.blocks = OrderedDict()
+        self.size = 0
+
+    def __str__(self):
+        """Returns a string representation of a ReorderBuffer object"""
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for children in self.blocks.values():
+            yield from children.values()
+
+    def add(self, block):
+        """Keeps a block until its parent is added to the chain.
+
+        Returns False if the block is already kept.
+        """
+        children = self.blocks.setdefault(block.previous_hash_bytes, {})
+        if block.current_hash_bytes in children:
+            return False
+        children[block.current_hash_bytes] = block
+        self.size += 1
+        while self.size > self.maxsize:
+            self.evict_oldest()
+        return True
+
+    def evict_oldest(self):
+        (previous_hash, children) = next(iter(self.blocks.items()))
+        children.pop(next(iter(children)))
+        self.size -= 1
+        if not children:
+            del self.blocks[previous_hash]
+
+    def pop_next(self, previous_hash):
+        """Removes and returns a block that follows the given hash, None if there is none."""
+        children = self.blocks.get(previous_hash)
+        if not children:
+            return None
+        block = children.pop(next(iter(children)))
+        self.size -= 1
+        if not children:
+            del self.blocks[previous_hash]
+        return block
+
+    def prune(self, height):
+        """Drops the blocks with index up to height (the chain has a block at their place)."""
+        for previous_hash in list(self.blocks):
+            children = self.blocks[previous_hash]
+            for current_hash in [h for (h, block) in children.items() if block.index <= height]:
+                del children[current_hash]
+                self.size -= 1
+            if not children:
+                del self.blocks[previous_hash]
@@ -4,9 +4,11 @@ import requests
 import threading
 
 import config
-import endpoints
-from endpoints import node, rest_api
 from transaction import Transaction
+from transport import create_transport
+from fanout import GossipRouter
+from selection import BlockAssembler, POLICIES
+from server import PooledWSGIServer
 
 from flask_cors import CORS
 from argparse import ArgumentParser
@@ -36,27 +38,43 @@ else:
     The resulting IP address is stored in the IPAddr variable. """
 
 
-# Define the flask environment and register the blueprint with the endpoints.
-app = Flask(__name__) # initializes a new Flask application from root path
-app.register_blueprint(rest_api) # register a blueprint
-""" Blueprints are a way to organize a group of related routes and other 
-app functionalities. By splitting an application into blueprints, you can modularize 
-your code, improve readability, and facilitate reuse across the application or even 
-between different applications. """
-CORS(app) # enables Cross-Origin Resource Sharing (CORS) for the entire Flask application
-""" CORS is a security feature that allows or restricts resources on a web server to be 
-requested from another domain. By default, web browsers enforce the same-origin policy, 
-which prevents a web page from making requests to a different domain than the one that 
-served the web page. Using CORS(app) from the Flask-CORS extension makes your Flask 
-application accept requests from clients hosted on different origins (domains, schemes, 
-or ports), which is essential for API services that are consumed by web applications 
-hosted on different domains. """
+def create_app():
+    """Returns the Flask app that serves the endpoints of the node.
+
+    The node is made when endpoints is first imported, so the file can be
+    imported (by the verifier's workers, by the benchmarks) without a node.
+    """
+    from endpoints import rest_api
+
+    # Define the flask environment and register the blueprint with the endpoints.
+    app = Flask(__name__) # initializes a new Flask application from root path
+    app.register_blueprint(rest_api) # register a blueprint
+    """ Blueprints are a way to organize a group of related routes and other 
+    app functionalities. By splitting an application into blueprints, you can modularize 
+    your code, improve readability, and facilitate reuse across the application or even 
+    between different applications. """
+    CORS(app) # enables Cross-Origin Resource Sharing (CORS) for the entire Flask application
+    """ CORS is a security feature that allows or restricts resources on a web server to be 
+    requested from another domain. By default, web browsers enforce the same-origin policy, 
+    which prevents a web page from making requests to a different domain than the one that 
+    served the web page. Using CORS(app) from the Flask-CORS extension makes your Flask 
+    application accept requests from clients hosted on different origins (domains, schemes, 
+    or ports), which is essential for API services that are consumed by web applications 
+    hosted on different domains. """
+    return app
+
 
 """ When a Python file (script) is executed, Python sets the __name__ variable to "__main__" 
 if the file is being run as the main program. If the file is imported as a module into another 
 file, __name__ is set to the module's name. """
 
 if __name__ == '__main__':
+    # The node is built here, not when the file is imported: the worker
+    # processes of the verifier are spawned and import this file again.
+    import endpoints
+    from endpoints import node
+    app = create_app()
+
     # Define the argument parser.
     parser = ArgumentParser(description='Rest api of BlockChat.')
 
@@ -71,6 +89,32 @@ if __name__ == '__main__':
                           help='block\'s capacity of transactions', required=True)
     optional.add_argument('-bootstrap', action='store_true',
                           help='set if the current node is the bootstrap')
+    optional.add_argument('-workers', type=int, default=config.VERIFY_WORKERS,
+                          help='processes that verify the signatures of blocks in parallel (0 disables them)')
+    optional.add_argument('-transport', choices=['threads', 'asyncio'], default=config.TRANSPORT,
+                          help='how the messages are sent to the other nodes')
+    optional.add_argument('-batch_window', type=float, default=config.BATCH_WINDOW,
+                          help='seconds the created transactions wait to be broadcast in a batch (0 disables batching)')
+    optional.add_argument('-batch_size', type=int, default=config.BATCH_SIZE,
+                          help='the most transactions in a batch')
+    optional.add_argument('-compact_blocks', action='store_true', default=config.COMPACT_BLOCKS,
+                          help='relay the minted blocks as their header and transaction ids')
+    optional.add_argument('-gossip', choices=['off', 'tree', 'epidemic'], default=config.GOSSIP,
+                          help='how the broadcast messages spread to the other nodes')
+    optional.add_argument('-fanout', type=int, default=config.GOSSIP_FANOUT,
+                          help='the nodes that each node sends (or forwards) a gossiped message to')
+    optional.add_argument('-block_policy', choices=POLICIES, default=config.BLOCK_POLICY,
+                          help='how the transactions of a minted block are chosen from the pool')
+    optional.add_argument('-ingest_queue', type=int, default=config.INGEST_QUEUE_SIZE,
+                          help='incoming transactions waiting for the validation worker (0 validates them in the request)')
+    optional.add_argument('-server', choices=['dev', 'pooled'], default=config.SERVER,
+                          help='the http server of the node: Flask\'s development server or a pool of threads')
+    optional.add_argument('-threads', type=int, default=config.SERVER_THREADS,
+                          help='worker threads of the pooled server')
+    optional.add_argument('-keep_alive', type=float, default=config.SERVER_KEEP_ALIVE,
+                          help='seconds the pooled server keeps an idle connection open')
+    optional.add_argument('-backlog', type=int, default=config.SERVER_BACKLOG,
+                          help='connections that wait to be accepted by the pooled server')
 
     # Parse the given arguments.
     args = parser.parse_args()
@@ -79,9 +123,27 @@ if __name__ == '__main__':
     node.TTL_LIMIT = args.n
     # set the TTL limit as big as the network
     node.CAPACITY = args.capacity
+    node.verifier.workers = args.workers
+    if args.transport != config.TRANSPORT:
+        node.transport = create_transport(args.transport)
+    node.batcher.window = args.batch_window
+    node.batcher.size = args.batch_size
+    node.compact_blocks = args.compact_blocks
+    node.router = GossipRouter(args.gossip, args.fanout, config.GOSSIP_SEEN)
+    node.ingest.size = args.ingest_queue
+    node.assembler = BlockAssembler(args.block_policy, node.transaction_fee)
     IS_BOOTSTRAP = args.bootstrap
     endpoints.IS_BOOTSTRAP = IS_BOOTSTRAP
 
+    def serve(host, port):
+        """Listens in the specified address (ip:port) with the chosen server."""
+        if args.server == 'pooled':
+            server = PooledWSGIServer(host, port, app, args.threads, args.backlog, args.keep_alive)
+            print(" * Serving on http://%s:%s (%d threads)" % (host, port, args.threads))
+            server.serve_forever()
+        else:
+            app.run(host=host, port=port)
+
     if (IS_BOOTSTRAP):
         """
         The bootstrap node (id = 0):
@@ -98,19 +160,22 @@ if __name__ == '__main__':
         gen_block = node.create_new_block(genesis=True)
 
         # Adds the first and only transaction in the genesis block.
-        first_transaction = Transaction(sender_address="0", receiver_address=node.wallet.public_key, 
+        first_transaction = Transaction(sender_address="0", receiver_address=node.wallet.address, 
             amount=1000 * endpoints.N, message="", nonce=0, TTL=gen_block.index)
         
         gen_block.add_transaction(first_transaction)
         gen_block.set_hash()
         node.update_balance(0, 1000 * endpoints.N, node.chainState_ring) 
+        # the nonce of the first transaction is seen, as in validate_chain()
+        node.update_nonces(0, 0, node.chainState_ring)
         node.wallet.transactions.append([first_transaction, "None", "Confirmed"])
         node.send_counter += 1
         # Add the genesis block in the chain.
         node.chain.blocks.append(gen_block)
+        node.ledger.refresh()
 
         # Listen in the specified address (ip:port)
-        app.run(host=BOOTSTRAP_IP, port=BOOTSTRAP_PORT)
+        serve(BOOTSTRAP_IP, BOOTSTRAP_PORT)
     else:
         """
         The rest nodes (id = 1, .., n-1):
@@ -147,7 +212,7 @@ if __name__ == '__main__':
         req.start()
 
         # Listen in the specified address (ip:port)
-        app.run(host=IP_ADDR, port=PORT)
+        serve(IP_ADDR, PORT)
         """ the Flask web server is started on the IP address (IPAddr) 
         and port number (port) specified. This server listens for incoming 
         HTTP requests """
\ No newline at end of file
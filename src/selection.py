@@ -0,0 +1,90 @@
+import heapq
+
+import wire
+
+POLICIES = ('fifo', 'fee', 'age')
+
+class BlockAssembler:
+    """
+    Chooses the transactions of the next block from the pool.
+
+    The policy orders the transactions that compete for the block:
+
+        fifo:  the ones that arrived first (the default).
+        fee:   the ones that pay the highest fee per byte (the 3% fee and
+               the charge of the message, see Node.totalChargedAmount,
+               over the size of the transaction in wire format), so a pool
+               that is backed up does not hold valuable transfers behind
+               cheap messages.
+        age:   the ones created on the oldest block (their TTL), which are
+               the first to expire, then the ones that arrived first.
+
+    The transactions of a sender are taken in nonce order, so only the
+    transaction with the lowest nonce of every sender competes: the heap
+    holds one transaction per sender, and when one is taken the next one
+    of its sender takes its place. Choosing a block costs
+    O(capacity log senders), for any size of the pool.
+
+    A transaction is chosen only if it is valid after the ones chosen
+    before it (accept), since the block is validated in its own order. One
+    that is not (e.g. its sender is paid by a transaction that is not
+    chosen yet) waits, and competes again after the next one is chosen.
+
+    Attributes:
+        policy (string): 'fifo', 'fee' or 'age'.
+        fee (function): transaction -> the fee that it pays.
+    """
+
+    def __init__(self, policy='fifo', fee=None):
+        """Inits a BlockAssembler"""
+        if policy not in POLICIES:
+            raise ValueError("Unknown block policy " + str(policy))
+        if policy == 'fee' and fee is None:
+            raise ValueError("The fee policy needs the fee of a transaction")
+        self.policy = policy
+        self.fee = fee
+
+    def __str__(self):
+        """Returns a string representation of a BlockAssembler object"""
+        return str(self.__class__) + ": " + str({'policy': self.policy})
+
+    def priority(self, pool, transaction):
+        """Returns the key of a pooled transaction, the lowest key is chosen first."""
+        arrival = pool.arrival(transaction)
+        if self.policy == 'fee':
+            return (-self.fee(transaction) / len(wire.dumps(transaction)), arrival)
+        if self.policy == 'age':
+            return (transaction.TTL, arrival)
+        return (arrival,)
+
+    def select(self, pool, count, accept):
+        """Returns up to count transactions of the pool, in the order of the block.
+
+        accept(transaction) returns True if the transaction is valid after the
+        ones accepted before it (and then counts it as applied). The chosen
+        transactions are not removed from the pool.
+        """
+        heap = []
+        for sender_address in pool.senders:
+            transaction = pool.first(sender_address)
+            heap.append((self.priority(pool, transaction), transaction.transaction_id_bytes, transaction))
+        heapq.heapify(heap)
+
+        chosen = []
+        waiting = []
+        while heap and len(chosen) < count:
+            entry = heapq.heappop(heap)
+            transaction = entry[2]
+            if not accept(transaction):
+                # its sender keeps its place, after this transaction
+                waiting.append(entry)
+                continue
+            chosen.append(transaction)
+            following = pool.next(transaction)
+            if following is not None:
+                heapq.heappush(heap, (self.priority(pool, following), following.transaction_id_bytes, following))
+            # the chosen transaction may make the waiting ones valid
+            for entry in waiting:
+                heapq.heappush(heap, entry)
+            waiting = []
+        return chosen
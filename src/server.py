@@ -0,0 +1,148 @@
+import queue
+import socket
+import selectors
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+class PooledRequestHandler(WSGIRequestHandler):
+    """Handles one request of a connection, the server keeps the connection for the next one."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # a client that stops in the middle of a request frees the worker
+        self.timeout = self.server.keep_alive
+        super().setup()
+
+    def handle(self):
+        self.close_connection = True
+        try:
+            self.handle_one_request()
+        except (ConnectionError, socket.timeout) as e:
+            self.close_connection = True
+            self.connection_dropped(e)
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Serves the node with a fixed pool of worker threads and keep-alive connections.
+
+    The development server (app.run) starts a thread for every connection, and
+    the thread waits on the connection for as long as the client keeps it open.
+    Here the main thread waits on the listening socket and on every idle
+    connection at once (selectors), and hands a connection to a worker only
+    when a request arrives on it (a new connection waits with the idle ones
+    for its first request). So many nodes can keep their connections
+    to the node open with a few workers, and the workers are never held by
+    idle connections. Connections idle for more than keep_alive seconds are
+    closed, and up to backlog connections wait to be accepted. A worker waits
+    at most keep_alive seconds for the rest of a request.
+
+    The clients of the nodes do not pipeline requests (they wait for the
+    response before they send the next request on a connection).
+
+    Attributes:
+        threads (int): the number of worker threads.
+        keep_alive (float): seconds an idle connection is kept open.
+        pool (ThreadPoolExecutor): the worker threads.
+        parked (SimpleQueue): the connections that the workers hand back to the main thread.
+        idle (dict): connection -> the time it became idle (main thread only).
+        running (bool): False stops serve_forever().
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=16, backlog=128, keep_alive=5):
+        """Inits a PooledWSGIServer"""
+        self.threads = threads
+        self.keep_alive = keep_alive
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='server')
+        self.parked = queue.SimpleQueue()
+        self.idle = {}
+        self.running = False
+        # the workers wake the main thread up when they hand back a connection
+        (self.wakeup_reader, self.wakeup_writer) = socket.socketpair()
+        self.wakeup_writer.setblocking(False)
+        # the size of the listen queue is read when the socket starts listening
+        self.request_queue_size = backlog
+        super().__init__(host, int(port), app, handler=PooledRequestHandler)
+
+    def __str__(self):
+        """Returns a string representation of a PooledWSGIServer object"""
+        return str(self.__class__) + ": " + str({'threads': self.threads, 'keep_alive': self.keep_alive,
+                                                 'backlog': self.request_queue_size,
+                                                 'idle': len(self.idle)})
+
+    def serve_forever(self, poll_interval=0.5):
+        self.running = True
+        selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ, 'accept')
+        selector.register(self.wakeup_reader, selectors.EVENT_READ, 'wakeup')
+        try:
+            while self.running:
+                for (key, events) in selector.select(poll_interval):
+                    if key.data == 'accept':
+                        try:
+                            (connection, client_address) = self.socket.accept()
+                        except OSError:
+                            continue
+                        # served when its first request arrives, like an idle connection
+                        self.parked.put((connection, client_address))
+                    elif key.data == 'wakeup':
+                        self.wakeup_reader.recv(4096)
+                    else:
+                        # a request arrived on an idle connection
+                        selector.unregister(key.fileobj)
+                        del self.idle[key.fileobj]
+                        self.pool.submit(self.serve_request, key.fileobj, key.data)
+
+                now = time.monotonic()
+                while not self.parked.empty():
+                    (connection, client_address) = self.parked.get()
+                    self.idle[connection] = now
+                    selector.register(connection, selectors.EVENT_READ, client_address)
+                for (connection, since) in list(self.idle.items()):
+                    if now - since > self.keep_alive:
+                        selector.unregister(connection)
+                        del self.idle[connection]
+                        self.shutdown_request(connection)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            selector.close()
+            self.server_close()
+
+    def serve_request(self, connection, client_address):
+        """Serves one request of a connection (in a worker thread)."""
+        try:
+            handler = self.RequestHandlerClass(connection, client_address, self)
+        except Exception:
+            self.handle_error(connection, client_address)
+            self.shutdown_request(connection)
+            return
+        if handler.close_connection:
+            self.shutdown_request(connection)
+        else:
+            self.parked.put((connection, client_address))
+            self.wakeup()
+
+    def wakeup(self):
+        try:
+            self.wakeup_writer.send(b'\0')
+        except BlockingIOError:
+            # the main thread has not read the previous wakeups yet, it will wake up anyway
+            pass
+
+    def shutdown(self):
+        self.running = False
+        self.wakeup()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+        for connection in list(self.idle):
+            self.shutdown_request(connection)
+        self.idle.clear()
+        self.wakeup_reader.close()
+        self.wakeup_writer.close()
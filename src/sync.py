@@ -0,0 +1,43 @@
+import struct
+
+import wire
+
+# every frame starts with the length of its (wire format) list of blocks
+FRAME_HEADER = struct.Struct('>I')
+
+class SyncError(ValueError):
+    """Raised when a chain sync stream ends in the middle of a frame."""
+
+def frames(blocks, start, end, chunk):
+    """Yields blocks[start:end] as frames of up to chunk blocks.
+
+    The blocks are serialized one chunk at a time, so the first
+    frame is sent before the last one is even serialized.
+    """
+    for i in range(start, end, chunk):
+        data = wire.dumps(blocks[i:min(i + chunk, end)])
+        yield FRAME_HEADER.pack(len(data)) + data
+
+def read_exactly(stream, size):
+    """Reads size bytes from a file-like stream, fewer only at its end."""
+    data = b''
+    while len(data) < size:
+        part = stream.read(size - len(data))
+        if not part:
+            break
+        data += part
+    return data
+
+def read_frames(stream):
+    """Yields the list of blocks of every frame of a file-like stream, as it arrives."""
+    while True:
+        header = read_exactly(stream, FRAME_HEADER.size)
+        if not header:
+            return
+        if len(header) < FRAME_HEADER.size:
+            raise SyncError("Truncated frame header")
+        (size,) = FRAME_HEADER.unpack(header)
+        data = read_exactly(stream, size)
+        if len(data) < size:
+            raise SyncError("Truncated frame")
+        yield wire.loads(data)
@@ -1,30 +1,63 @@
+import sys
 import json
 from Crypto.Hash import SHA256
-from Crypto.PublicKey import RSA
-from Crypto.Signature import pss
+
+import keys
+import config
+from cache import LRUCache
+
+# (transaction_id, signature, sender_address) -> result of the verification,
+# the id and the signature as raw bytes.
+# The sender is part of the key, so a signature is never accepted for another key.
+signature_cache = LRUCache(config.SIGNATURE_CACHE_SIZE)
+
+def to_raw(value):
+    """Hashes and signatures are kept as raw bytes, this converts a hex string.
+
+    Anything else (None, the genesis previous hash 1) is kept as is.
+    """
+    return bytes.fromhex(value) if isinstance(value, str) else value
+
+def to_hex(value):
+    """The opposite of to_raw(), the attributes are read as hex strings."""
+    return value.hex() if isinstance(value, bytes) else value
+
+def intern_address(address):
+    """The same few addresses appear in every transaction, keep one copy of each."""
+    return sys.intern(address) if isinstance(address, str) else address
 
 class Transaction:
     """
     A BlockChat transaction in the blockchain
 
+    Every node keeps every transaction of the chain in memory, so a transaction
+    has no __dict__ (__slots__), keeps its id and signature as raw bytes and
+    shares its (interned) addresses with all the other transactions. The id and
+    the signature are still read and written as hex strings.
+
     Attributes:
-        sender_address (int): the public key of the sender's wallet.
-        receiver_address (int): the public key of the receiver's wallet.
+        sender_address (string): the address (key fingerprint) of the sender's wallet.
+        receiver_address (string): the address (key fingerprint) of the receiver's wallet,
+                      "0" for stake transactions.
         amount (int): the sent amount of BCCs 
                       it DOES NOT include fees and message costs
         message (string): the sent message, defaults to empty string "" 
         nonce (int): counter of transactions made by the sender
-        transaction_id (int): hash of the transaction.
+        transaction_id (string): hash of the transaction (stored as bytes).
         TTL (int): (Time-To-Live) is the index of the last block of the node's chain when the transaction
                     is created. If the transaction remain unconfirmed in the network more than a limit (compare the TTL
                     with the index of the last block of the current chain) the transaction is rejected
-        signature (int): signature that verifies that the owner of the wallet created the transaction.
+        signature (string): signature that verifies that the owner of the wallet created the transaction
+                      (stored as bytes).
     """
 
+    __slots__ = ('sender_address', 'receiver_address', 'amount', 'message', 'nonce', 'TTL',
+                 'transaction_id_bytes', 'signature_bytes')
+
     def __init__(self, sender_address, receiver_address, amount, message, nonce, TTL):
         """Inits a Transaction"""
-        self.sender_address = sender_address
-        self.receiver_address = receiver_address
+        self.sender_address = intern_address(sender_address)
+        self.receiver_address = intern_address(receiver_address)
         self.amount = amount 
         self.message = message
         self.nonce = nonce
@@ -34,13 +67,38 @@ class Transaction:
 
     def __str__(self):
         """Returns a string representation of a Transaction object"""
-        return str(self.__class__) + ": " + str(self.__dict__)
+        return str(self.__class__) + ": " + str(self.to_dict())
 
     def __eq__(self, other):
         """Overrides the default method for comparing Transaction objects.
         Two transactions are equal if their current_hash is equal.
         """
-        return self.transaction_id == other.transaction_id
+        return self.transaction_id_bytes == other.transaction_id_bytes
+
+    def __hash__(self):
+        return hash(self.transaction_id_bytes)
+
+    @property
+    def transaction_id(self):
+        return self.transaction_id_bytes.hex()
+
+    @transaction_id.setter
+    def transaction_id(self, value):
+        self.transaction_id_bytes = to_raw(value)
+
+    @property
+    def signature(self):
+        return to_hex(self.signature_bytes)
+
+    @signature.setter
+    def signature(self, value):
+        self.signature_bytes = to_raw(value)
+
+    def to_dict(self):
+        """Returns the attributes of the transaction as a dict."""
+        return {'sender_address': self.sender_address, 'receiver_address': self.receiver_address,
+                'amount': self.amount, 'message': self.message, 'nonce': self.nonce, 'TTL': self.TTL,
+                'transaction_id': self.transaction_id, 'signature': self.signature}
 
     def to_list(self):
         """Converts a Transaction object into to list."""
@@ -58,20 +116,38 @@ class Transaction:
         return SHA256.new(serialized_transaction.encode("ISO-8859-2")).hexdigest()
 
     def sign_transaction(self, private_key):
-        """Sign the current transaction with the given private key."""
+        """Sign the current transaction with the given private key.
+
+        The key is parsed once per process (see keys.py).
+        """
         transaction_hash = SHA256.new()
-        transaction_hash.update(bytes.fromhex(self.transaction_id))
+        transaction_hash.update(self.transaction_id_bytes)
 
-        key = RSA.importKey(private_key.encode("ISO-8859-1"))
-        self.signature = pss.new(key).sign(transaction_hash).hex()
+        self.signature_bytes = keys.signer(private_key).sign(transaction_hash)
 
     def verify_signature(self):
-        """Verifies the signature of a transaction."""
+        """Verifies the signature of a transaction.
+
+        The same transaction is verified on receipt, when its block
+        arrives and every time the pool is filtered, so the results
+        are kept in the signature_cache.
+        """
+        cache_key = (self.transaction_id_bytes, self.signature_bytes, self.sender_address)
+        verified = signature_cache.get(cache_key)
+        if verified is not None:
+            return verified
+
         transaction_hash = SHA256.new()
-        transaction_hash.update(bytes.fromhex(self.transaction_id))
-        key = RSA.importKey(self.sender_address.encode('ISO-8859-1'))
+        transaction_hash.update(self.transaction_id_bytes)
+        # the sender is known by its address, the registry gives its key
+        public_key = keys.resolve(self.sender_address)
+        if public_key is None:
+            return False
+        verifier = keys.verifier(public_key)
         try:
-            pss.new(key).verify(transaction_hash, bytes.fromhex(self.signature))
-            return True
+            verifier.verify(transaction_hash, self.signature_bytes)
+            verified = True
         except (ValueError, TypeError):
-            return False
+            verified = False
+        signature_cache.put(cache_key, verified)
+        return verified
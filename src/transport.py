@@ -0,0 +1,180 @@
+import time
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from requests.adapters import HTTPAdapter
+
+import config
+
+def create_transport(kind):
+    """Returns the transport of a node: 'threads' (PeerTransport) or 'asyncio' (AsyncTransport)."""
+    if kind == 'threads':
+        return PeerTransport(config.TRANSPORT_WORKERS, config.PEER_TIMEOUT)
+    if kind == 'asyncio':
+        from async_transport import AsyncTransport
+        return AsyncTransport(config.PEER_CONCURRENCY, config.PEER_TIMEOUT,
+                              config.PEER_RETRIES, config.PEER_BACKOFF)
+    raise ValueError("Unknown transport " + str(kind))
+
+class PeerStats:
+    """
+    The send counters of a peer.
+
+    Attributes:
+        sent (int): the messages delivered to the peer.
+        errors (int): the messages that failed (connection error or status >= 500).
+        retries (int): the attempts that were repeated after a connection error or a timeout.
+        total_latency (float): the sum of the send latencies, in seconds.
+        max_latency (float): the slowest send, in seconds.
+    """
+
+    def __init__(self):
+        """Inits a PeerStats"""
+        self.sent = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def __str__(self):
+        """Returns a string representation of a PeerStats object"""
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    def add(self, latency, error):
+        if error:
+            self.errors += 1
+        else:
+            self.sent += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def to_dict(self):
+        count = self.sent + self.errors
+        return {'sent': self.sent, 'errors': self.errors, 'retries': self.retries,
+                'mean_latency_ms': round(1000 * self.total_latency / count, 3) if count else 0.0,
+                'max_latency_ms': round(1000 * self.max_latency, 3)}
+
+class PeerTransport:
+    """
+    Sends the messages of the node to its peers.
+
+    Every peer has its own keep-alive session, so the TCP connections are
+    opened once and reused by all the messages to that peer. The sends run
+    on a fixed pool of worker threads instead of a new thread per message,
+    and a broadcast message is serialized once by the caller and the same
+    bytes are handed to every peer.
+
+    Attributes:
+        workers (int): the number of sending threads.
+        timeout (float): seconds to wait for a peer to answer.
+        pool (ThreadPoolExecutor): the sending threads, started on first use.
+        sessions (dict): (ip, port) -> requests.Session of the peer.
+        stats (dict): (ip, port) -> PeerStats of the peer.
+        lock (Lock): provides mutual exclusion for the sessions, the stats and the pool.
+    """
+
+    def __init__(self, workers=16, timeout=30):
+        """Inits a PeerTransport"""
+        self.workers = workers
+        self.timeout = timeout
+        self.pool = None
+        self.sessions = {}
+        self.stats = {}
+        self.lock = Lock()
+
+    def __str__(self):
+        """Returns a string representation of a PeerTransport object"""
+        return str(self.__class__) + ": " + str(self.peer_stats())
+
+    def session(self, ip, port):
+        """Returns the session of a peer, creating it on the first message."""
+        with self.lock:
+            peer = (ip, port)
+            if peer not in self.sessions:
+                session = requests.Session()
+                # the workers may send to the same peer at the same time
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+                session.mount('http://', adapter)
+                self.sessions[peer] = session
+                self.stats[peer] = PeerStats()
+            return self.sessions[peer]
+
+    def executor(self):
+        """Returns the pool of the sending threads, starting it on first use."""
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers,
+                                               thread_name_prefix='transport')
+            return self.pool
+
+    def post(self, ip, port, endpoint, data):
+        """Sends a message to a peer and waits for its answer.
+
+        Returns the response, raises the exception of requests if the peer
+        can not be reached.
+        """
+        session = self.session(ip, port)
+        start = time.perf_counter()
+        error = True
+        try:
+            response = session.post('http://' + ip + ':' + port + endpoint,
+                                    data=data, timeout=self.timeout)
+            error = response.status_code >= 500
+            return response
+        finally:
+            latency = time.perf_counter() - start
+            with self.lock:
+                self.stats[(ip, port)].add(latency, error)
+
+    def send(self, ip, port, endpoint, data):
+        """Sends a message to a peer in the background.
+
+        Returns a Future of the response (None if the peer could not be reached).
+        """
+        return self.executor().submit(self._send, ip, port, endpoint, data)
+
+    def _send(self, ip, port, endpoint, data):
+        try:
+            return self.post(ip, port, endpoint, data)
+        except Exception as e:
+            print("Sending to " + ip + ":" + port + endpoint + " failed: " + repr(e))
+            return None
+
+    def send_sequence(self, ip, port, messages):
+        """Sends messages (endpoint, data) to a peer in the background, one after the other.
+
+        Returns a Future of the last response (None if a message could not be sent).
+        """
+        return self.executor().submit(self._send_sequence, ip, port, messages)
+
+    def _send_sequence(self, ip, port, messages):
+        response = None
+        for (endpoint, data) in messages:
+            response = self._send(ip, port, endpoint, data)
+            if response is None:
+                return None
+        return response
+
+    def broadcast(self, peers, endpoint, data):
+        """Sends the same (already serialized) message to all the peers.
+
+        peers are the ring nodes (dicts with ip and port).
+        Returns the list of the Futures of the responses.
+        """
+        return [self.send(peer['ip'], peer['port'], endpoint, data) for peer in peers]
+
+    def peer_stats(self):
+        """Returns the send counters of every peer, keyed by 'ip:port'."""
+        with self.lock:
+            return {ip + ':' + port: stats.to_dict() for ((ip, port), stats) in self.stats.items()}
+
+    def shutdown(self):
+        with self.lock:
+            pool = self.pool
+            self.pool = None
+            sessions = list(self.sessions.values())
+        if pool is not None:
+            pool.shutdown()
+        for session in sessions:
+            session.close()
@@ -0,0 +1,96 @@
+import multiprocessing
+
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor
+from Crypto.Hash import SHA256
+
+import keys
+from transaction import signature_cache
+
+def verify_one(args):
+    """Verifies a signature, runs in a worker process.
+
+    args is the tuple (transaction_id, signature, public_key), the id and
+    the signature as raw bytes. The worker has no key registry, so it
+    gets the PEM encoded key of the sender instead of its address.
+    """
+    transaction_id, signature, public_key = args
+    if public_key is None:
+        return False
+    transaction_hash = SHA256.new()
+    transaction_hash.update(transaction_id)
+    try:
+        keys.verifier(public_key).verify(transaction_hash, signature)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+class BatchVerifier:
+    """
+    Verifies the signatures of many transactions at once.
+
+    The signature checks of a block (or of a whole chain) are independent
+    of each other and CPU-bound, so they are spread over a pool of worker
+    processes before the transactions are applied one by one. The results
+    go to the signature_cache, where validate_transaction() finds them.
+    Small batches are verified in the calling thread, since sending them
+    to other processes costs more than it saves.
+
+    The workers are spawned, so they import the main module of the node
+    again (run.py), which only builds a node when it is run as a script.
+
+    Attributes:
+        workers (int): number of worker processes, 0 disables the pool.
+        min_batch (int): the least number of signatures worth sending to the pool.
+        pool (ProcessPoolExecutor): the worker processes, started on first use.
+        pool_lock (Lock): the pool is started once (verify is called by many threads).
+    """
+
+    def __init__(self, workers=0, min_batch=32):
+        """Inits a BatchVerifier"""
+        self.workers = workers
+        self.min_batch = min_batch
+        self.pool = None
+        self.pool_lock = Lock()
+
+    def __str__(self):
+        """Returns a string representation of a BatchVerifier object"""
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+    def verify(self, transactions):
+        """Verifies the signatures of the transactions.
+
+        Returns True if all of them are valid, False otherwise.
+        """
+        # the cache is only looked at here, verify_signature counts the lookups
+        pending = [tr for tr in transactions
+                   if (tr.transaction_id_bytes, tr.signature_bytes, tr.sender_address) not in signature_cache]
+        if self.workers <= 0 or len(pending) < self.min_batch:
+            return all(tr.verify_signature() for tr in transactions)
+
+        pool = self.start_pool()
+        args = [(tr.transaction_id_bytes, tr.signature_bytes, keys.resolve(tr.sender_address)) for tr in pending]
+        chunksize = max(1, len(args) // (4 * self.workers))
+        results = list(pool.map(verify_one, args, chunksize=chunksize))
+        for tr, verified in zip(pending, results):
+            signature_cache.put((tr.transaction_id_bytes, tr.signature_bytes, tr.sender_address), verified)
+        # the workers verified the pending ones, each was a miss of the cache
+        signature_cache.add_misses(len(pending))
+        verified_ids = set(tr.transaction_id_bytes for tr in pending)
+        others = [tr for tr in transactions if tr.transaction_id_bytes not in verified_ids]
+        return all(results) and all(tr.verify_signature() for tr in others)
+
+    def start_pool(self):
+        """Returns the pool of the workers, it is started by the first caller."""
+        with self.pool_lock:
+            if self.pool is None:
+                # spawn instead of fork, the node is multi-threaded
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+            return self.pool
+
+    def shutdown(self):
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
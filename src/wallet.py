@@ -2,19 +2,24 @@ import Crypto
 import Crypto.Random
 from Crypto.PublicKey import RSA
 
+import keys
+
 class Wallet:
     """
     The wallet of a node in the network.
 
     Attributes:
         private_key (int): the private key of the node.
-        public_key (int): the public key of the node (also serves as the node's address).
+        public_key (int): the public key of the node.
+        address (string): the fingerprint of the public key, the node's address
+                          in transactions and blocks.
         transactions (list of lists): a list of lists that contains the transactions of the node
                              as list (transaction, validator, status)
                              When a transaction is validated and is relevant to the current node,
                              its added to the wallet as [transaction, "None", "Unconfirmed"]
                              When a transaction is added to the blockchain, the transactions
                              alter to [transaction, validator, "Confirmed"]
+                             Only the ledger actor of the node changes the list.
         parent_node (reference): pointer to the parent node
     """
 
@@ -26,6 +31,11 @@ class Wallet:
         self.private_key = key.exportKey().decode('ISO-8859-1')
         # Generate the public key from the above private key.
         self.public_key = key.publickey().exportKey().decode('ISO-8859-1')
+        # The keys are parsed only here, signing and verifying
+        # find the key objects in the key cache.
+        keys.add_key(self.private_key, key)
+        keys.add_key(self.public_key, key.publickey())
+        self.address = keys.register(self.public_key)
         self.transactions = []
         self.parent_node = node
 
@@ -35,15 +45,21 @@ class Wallet:
 
     def get_balance(self):
         """Returns the total balance of the wallet"""
-        return self.parent_node.ID_to_balance(self.parent_node.id, self.parent_node.softState_ring)
+        return self.parent_node.ID_to_balance(self.parent_node.id, self.parent_node.ledger.snapshot.soft_ring)
     
     def get_stake(self):
         """Returns the stake of the wallet"""
-        return self.parent_node.ID_to_stake(self.parent_node.id, self.parent_node.softState_ring)
+        return self.parent_node.ID_to_stake(self.parent_node.id, self.parent_node.ledger.snapshot.soft_ring)
     
-    def updateFailedTransactions(self):
-        for w_tr in self.transactions:
-            if w_tr[2] == "Unconfirmed" and self.parent_node.chain.blocks[-1].index-w_tr[0].TTL > self.parent_node.TTL_LIMIT: # transaction failed (as old)
-                w_tr[1] = "None"
-                w_tr[2] = "Failed"
+    def get_transactions(self):
+        """Returns the transactions of the wallet as lists (transaction, validator, status),
+            the unconfirmed ones that are too old to enter a block are reported as failed.
+        """
+        last_index = self.parent_node.ledger.snapshot.last_block().index
+        w_trs = []
+        for (tr, validator, status) in list(self.transactions):
+            if status == "Unconfirmed" and last_index-tr.TTL > self.parent_node.TTL_LIMIT: # transaction failed (as old)
+                (validator, status) = ("None", "Failed")
+            w_trs.append([tr, validator, status])
+        return w_trs
                             
\ No newline at end of file
@@ -0,0 +1,460 @@
+"""
+The binary format of the messages exchanged between the nodes
+(and between a node and its client).
+
+A message is the version byte followed by one encoded value. Every value
+starts with a one-byte tag; integers and lengths are (zigzag) varints,
+so the small numbers of the protocol take one or two bytes. Hashes and
+signatures travel as raw bytes instead of hex strings (they are already
+kept as raw bytes in the transactions and the blocks), and the objects
+of the blockchain are encoded field by field, without the class metadata
+that pickle carries. The addresses are sent once per message. The rest
+of a transaction is fixed-width, it is decoded with struct.unpack_from
+straight from the message (a memoryview), without slicing it field by field.
+
+    value        := tag payload
+    None/True/False          'N' / 'T' / 'F'
+    int                      'i' varint(zigzag)
+    float                    'f' 8 bytes, big endian double
+    str                      's' varint(length) utf-8
+    shared str (>= 16 chars) 'S' varint(length) utf-8, the first time in the message
+                             'R' varint(index), every next time
+    bytes                    'b' varint(length) bytes
+    hex string               'x' varint(length) bytes (hashes, signatures)
+    shared hex string        'X' varint(length) bytes, the first time in the message
+                                 (addresses), 'R' varint(index) every next time
+    list/tuple               'l' varint(count) value*
+    dict                     'd' varint(count) (value value)*
+    Transaction              't' sender receiver amount message
+                                 nonce TTL (8 bytes each, big endian, signed)
+                                 length(id) (1 byte) length(signature) (2 bytes,
+                                 0xffff for no signature) id signature
+    Block                    'k' index timestamp validator previous_hash merkle_root
+                                 current_hash varint(count) Transaction*
+    CompactBlock             'K' index timestamp validator previous_hash merkle_root
+                                 current_hash varint(count) transaction_id*
+    Blockchain               'c' varint(count) Block*
+    LedgerState (ring)       'r' varint(count) (id ip port public_key balance stake
+                                 varint(next) varint(count) varint(seen)*)*
+"""
+
+import struct
+
+from block import Block, CompactBlock
+from blockchain import Blockchain
+from ledger import LedgerState, NonceTracker
+from transaction import Transaction, intern_address
+
+WIRE_VERSION = 4
+MIMETYPE = 'application/octet-stream'
+
+class WireError(ValueError):
+    """Raised when a message can not be decoded."""
+
+_double = struct.Struct('>d')
+# nonce, TTL, length of the id, length of the signature
+_transaction_fields = struct.Struct('>qqBH')
+NO_SIGNATURE = 0xffff
+# the id and the signature of a transaction, by their lengths
+_digests = {}
+
+def _digests_struct(id_length, signature_length):
+    layout = _digests.get((id_length, signature_length))
+    if layout is None:
+        layout = _digests[(id_length, signature_length)] = struct.Struct(
+            '%ds%ds' % (id_length, signature_length))
+    return layout
+
+# strings at least this long (keys, addresses) are sent once per message,
+# the next occurrences are references to the first one
+SHARED_STRING_LENGTH = 16
+
+###########################################################
+######################## ENCODING #########################
+###########################################################
+
+def _varint(out, n):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _zigzag(out, n):
+    _varint(out, (n << 1) if n >= 0 else ((-n) << 1) - 1)
+
+def _hex(out, value, strings):
+    """Hashes and signatures are hex strings, sent as raw bytes when possible."""
+    if type(value) is str and len(value) % 2 == 0 and value == value.lower():
+        try:
+            data = bytes.fromhex(value)
+        except ValueError:
+            data = None
+        if data is not None:
+            out.append(0x78) # 'x'
+            _varint(out, len(data))
+            out += data
+            return
+    _value(out, value, strings)
+
+def _address(out, value, strings):
+    """Addresses are hex strings, sent as raw bytes the first time and as references after."""
+    ref = strings.get(value)
+    if ref is not None:
+        out.append(0x52) # 'R'
+        _varint(out, ref)
+        return
+    if type(value) is str:
+        try:
+            data = bytes.fromhex(value)
+        except ValueError:
+            data = None
+        if data is not None and data.hex() == value:
+            strings[value] = len(strings)
+            out.append(0x58) # 'X'
+            _varint(out, len(data))
+            out += data
+            return
+    _value(out, value, strings)
+
+def _raw(out, value, strings):
+    """The raw hashes and signatures of the objects, sent as they are."""
+    if type(value) is bytes:
+        out.append(0x78) # 'x'
+        _varint(out, len(value))
+        out += value
+    else:
+        _value(out, value, strings)
+
+def _transaction(out, tr, strings):
+    out.append(0x74) # 't'
+    _address(out, tr.sender_address, strings)
+    _address(out, tr.receiver_address, strings)
+    _value(out, tr.amount, strings)
+    _value(out, tr.message, strings)
+    transaction_id = tr.transaction_id_bytes
+    signature = tr.signature_bytes
+    out += _transaction_fields.pack(tr.nonce, tr.TTL, len(transaction_id),
+                                    NO_SIGNATURE if signature is None else len(signature))
+    out += transaction_id
+    if signature is not None:
+        out += signature
+
+def _block(out, block, strings):
+    out.append(0x6b) # 'k'
+    _zigzag(out, block.index)
+    out += _double.pack(block.timestamp)
+    _address(out, block.validator, strings)
+    _raw(out, block.previous_hash_bytes, strings)
+    _raw(out, block.merkle_root_bytes, strings)
+    _raw(out, block.current_hash_bytes, strings)
+    _varint(out, len(block.transactions))
+    for tr in block.transactions:
+        _transaction(out, tr, strings)
+
+def _compact_block(out, block, strings):
+    out.append(0x4b) # 'K'
+    _zigzag(out, block.index)
+    out += _double.pack(block.timestamp)
+    _address(out, block.validator, strings)
+    _raw(out, block.previous_hash_bytes, strings)
+    _raw(out, block.merkle_root_bytes, strings)
+    _raw(out, block.current_hash_bytes, strings)
+    _varint(out, len(block.transaction_ids))
+    for transaction_id in block.transaction_ids:
+        _raw(out, transaction_id, strings)
+
+def _blockchain(out, chain, strings):
+    out.append(0x63) # 'c'
+    _varint(out, len(chain.blocks))
+    for block in chain.blocks:
+        _block(out, block, strings)
+
+def _ring(out, ring, strings):
+    out.append(0x72) # 'r'
+    _varint(out, len(ring))
+    for ring_node in ring:
+        _zigzag(out, ring_node['id'])
+        _value(out, ring_node['ip'], strings)
+        _value(out, ring_node['port'], strings)
+        _value(out, ring_node['public_key'], strings)
+        _value(out, ring_node['balance'], strings)
+        _value(out, ring_node['stake'], strings)
+        nonces = ring_node['nonces']
+        _varint(out, nonces.next)
+        _varint(out, len(nonces.seen))
+        for nonce in sorted(nonces.seen):
+            _varint(out, nonce)
+
+def _value(out, value, strings):
+    kind = type(value)
+    if kind is str:
+        if len(value) >= SHARED_STRING_LENGTH:
+            ref = strings.get(value)
+            if ref is not None:
+                out.append(0x52) # 'R'
+                _varint(out, ref)
+                return
+            strings[value] = len(strings)
+            out.append(0x53) # 'S'
+        else:
+            out.append(0x73) # 's'
+        data = value.encode('utf-8')
+        _varint(out, len(data))
+        out += data
+    elif kind is int:
+        out.append(0x69) # 'i'
+        _zigzag(out, value)
+    elif kind is float:
+        out.append(0x66) # 'f'
+        out += _double.pack(value)
+    elif value is None:
+        out.append(0x4e) # 'N'
+    elif value is True:
+        out.append(0x54) # 'T'
+    elif value is False:
+        out.append(0x46) # 'F'
+    elif isinstance(value, int):
+        out.append(0x69) # 'i'
+        _zigzag(out, int(value))
+    elif isinstance(value, float):
+        out.append(0x66) # 'f'
+        out += _double.pack(value)
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(0x62) # 'b'
+        _varint(out, len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out.append(0x6c) # 'l'
+        _varint(out, len(value))
+        for item in value:
+            _value(out, item, strings)
+    elif isinstance(value, dict):
+        out.append(0x64) # 'd'
+        _varint(out, len(value))
+        for key, item in value.items():
+            _value(out, key, strings)
+            _value(out, item, strings)
+    elif isinstance(value, Transaction):
+        _transaction(out, value, strings)
+    elif isinstance(value, Block):
+        _block(out, value, strings)
+    elif isinstance(value, CompactBlock):
+        _compact_block(out, value, strings)
+    elif isinstance(value, Blockchain):
+        _blockchain(out, value, strings)
+    elif isinstance(value, LedgerState):
+        _ring(out, value, strings)
+    else:
+        raise WireError("Can not encode " + str(type(value)))
+
+def dumps(value):
+    """Encodes a value (transaction, block, compact block, chain, ring or plain data) into bytes."""
+    out = bytearray()
+    out.append(WIRE_VERSION)
+    _value(out, value, {})
+    return bytes(out)
+
+###########################################################
+######################## DECODING #########################
+###########################################################
+
+# The readers take the message, the position of the field and the shared
+# strings seen so far, and return the decoded field with the position of
+# the next one.
+
+def _read_varint(data, pos):
+    b = data[pos]
+    if b < 0x80:
+        return (b, pos + 1)
+    n = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return (n, pos)
+        shift += 7
+
+def _read_zigzag(data, pos):
+    (n, pos) = _read_varint(data, pos)
+    return ((n >> 1) if not n & 1 else -((n + 1) >> 1), pos)
+
+def _read_raw(data, pos):
+    (length, pos) = _read_varint(data, pos)
+    end = pos + length
+    if end > len(data):
+        raise IndexError
+    return (bytes(data[pos:end]), end)
+
+def _read_digest(data, pos, strings):
+    """Reads a hash or a signature, kept as raw bytes by the objects."""
+    if data[pos] == 0x78: # 'x'
+        return _read_raw(data, pos + 1)
+    (value, pos) = _read_value(data, pos, strings)
+    if isinstance(value, str):
+        raise WireError("Hash is not raw bytes")
+    return (value, pos)
+
+def _read_address(data, pos, strings):
+    if data[pos] == 0x52: # 'R', the shared addresses are interned already
+        (ref, pos) = _read_varint(data, pos + 1)
+        return (strings[ref], pos)
+    (address, pos) = _read_value(data, pos, strings)
+    return (intern_address(address), pos)
+
+def _read_transaction(data, pos, strings):
+    tr = Transaction.__new__(Transaction)
+    (tr.sender_address, pos) = _read_address(data, pos, strings)
+    (tr.receiver_address, pos) = _read_address(data, pos, strings)
+    (tr.amount, pos) = _read_value(data, pos, strings)
+    (tr.message, pos) = _read_value(data, pos, strings)
+    (tr.nonce, tr.TTL, id_length, signature_length) = _transaction_fields.unpack_from(data, pos)
+    pos += _transaction_fields.size
+    if signature_length == NO_SIGNATURE:
+        (tr.transaction_id_bytes, tr.signature_bytes) = (_digests_struct(id_length, 0).unpack_from(data, pos)[0], None)
+        return (tr, pos + id_length)
+    layout = _digests_struct(id_length, signature_length)
+    (tr.transaction_id_bytes, tr.signature_bytes) = layout.unpack_from(data, pos)
+    return (tr, pos + layout.size)
+
+def _read_block(data, pos, strings):
+    block = Block.__new__(Block)
+    (block.index, pos) = _read_zigzag(data, pos)
+    block.timestamp = _double.unpack_from(data, pos)[0]
+    (block.validator, pos) = _read_address(data, pos + 8, strings)
+    (block.previous_hash_bytes, pos) = _read_digest(data, pos, strings)
+    (block.merkle_root_bytes, pos) = _read_digest(data, pos, strings)
+    (block.current_hash_bytes, pos) = _read_digest(data, pos, strings)
+    (count, pos) = _read_varint(data, pos)
+    block.transactions = []
+    for i in range(count):
+        if data[pos] != 0x74: # 't'
+            raise WireError("Unexpected tag " + str(data[pos]))
+        (tr, pos) = _read_transaction(data, pos + 1, strings)
+        block.transactions.append(tr)
+    return (block, pos)
+
+def _read_compact_block(data, pos, strings):
+    block = CompactBlock.__new__(CompactBlock)
+    (block.index, pos) = _read_zigzag(data, pos)
+    block.timestamp = _double.unpack_from(data, pos)[0]
+    (block.validator, pos) = _read_address(data, pos + 8, strings)
+    (block.previous_hash_bytes, pos) = _read_digest(data, pos, strings)
+    (block.merkle_root_bytes, pos) = _read_digest(data, pos, strings)
+    (block.current_hash_bytes, pos) = _read_digest(data, pos, strings)
+    (count, pos) = _read_varint(data, pos)
+    block.transaction_ids = []
+    for i in range(count):
+        (transaction_id, pos) = _read_digest(data, pos, strings)
+        block.transaction_ids.append(transaction_id)
+    return (block, pos)
+
+def _read_blockchain(data, pos, strings):
+    chain = Blockchain()
+    (count, pos) = _read_varint(data, pos)
+    for i in range(count):
+        (block, pos) = _read_expected(data, pos, strings, 0x6b)
+        chain.blocks.append(block)
+    return (chain, pos)
+
+def _read_ring(data, pos, strings):
+    ring = LedgerState()
+    (count, pos) = _read_varint(data, pos)
+    for i in range(count):
+        (id, pos) = _read_zigzag(data, pos)
+        (ip, pos) = _read_value(data, pos, strings)
+        (port, pos) = _read_value(data, pos, strings)
+        (public_key, pos) = _read_value(data, pos, strings)
+        (balance, pos) = _read_value(data, pos, strings)
+        (stake, pos) = _read_value(data, pos, strings)
+        (next, pos) = _read_varint(data, pos)
+        (seen_count, pos) = _read_varint(data, pos)
+        seen = []
+        for j in range(seen_count):
+            (nonce, pos) = _read_varint(data, pos)
+            seen.append(nonce)
+        ring.add_node(id, ip, port, public_key, balance, stake, NonceTracker(next, frozenset(seen)))
+    return (ring, pos)
+
+def _read_value(data, pos, strings):
+    tag = data[pos]
+    pos += 1
+    if tag == 0x78: # 'x'
+        (raw, pos) = _read_raw(data, pos)
+        return (raw.hex(), pos)
+    if tag == 0x52: # 'R'
+        (ref, pos) = _read_varint(data, pos)
+        return (strings[ref], pos)
+    if tag == 0x58: # 'X'
+        (raw, pos) = _read_raw(data, pos)
+        value = intern_address(raw.hex())
+        strings.append(value)
+        return (value, pos)
+    if tag == 0x73 or tag == 0x53: # 's' / 'S'
+        (length, pos) = _read_varint(data, pos)
+        end = pos + length
+        if end > len(data):
+            raise IndexError
+        value = str(data[pos:end], 'utf-8')
+        if tag == 0x53:
+            strings.append(value)
+        return (value, end)
+    if tag == 0x69: # 'i'
+        return _read_zigzag(data, pos)
+    if tag == 0x66: # 'f'
+        return (_double.unpack_from(data, pos)[0], pos + 8)
+    if tag == 0x4e: # 'N'
+        return (None, pos)
+    if tag == 0x54: # 'T'
+        return (True, pos)
+    if tag == 0x46: # 'F'
+        return (False, pos)
+    if tag == 0x62: # 'b'
+        return _read_raw(data, pos)
+    if tag == 0x6c: # 'l'
+        (count, pos) = _read_varint(data, pos)
+        items = []
+        for i in range(count):
+            (item, pos) = _read_value(data, pos, strings)
+            items.append(item)
+        return (items, pos)
+    if tag == 0x64: # 'd'
+        (count, pos) = _read_varint(data, pos)
+        items = {}
+        for i in range(count):
+            (key, pos) = _read_value(data, pos, strings)
+            (items[key], pos) = _read_value(data, pos, strings)
+        return (items, pos)
+    if tag == 0x74: # 't'
+        return _read_transaction(data, pos, strings)
+    if tag == 0x6b: # 'k'
+        return _read_block(data, pos, strings)
+    if tag == 0x4b: # 'K'
+        return _read_compact_block(data, pos, strings)
+    if tag == 0x63: # 'c'
+        return _read_blockchain(data, pos, strings)
+    if tag == 0x72: # 'r'
+        return _read_ring(data, pos, strings)
+    raise WireError("Unknown tag " + str(tag))
+
+def _read_expected(data, pos, strings, tag):
+    if data[pos] != tag:
+        raise WireError("Unexpected tag " + str(data[pos]))
+    return _read_value(data, pos, strings)
+
+def loads(data):
+    """Decodes a message created by dumps()."""
+    # the fields are read from the message in place
+    data = memoryview(data)
+    if not data:
+        raise WireError("Empty message")
+    if data[0] != WIRE_VERSION:
+        raise WireError("Unsupported wire version " + str(data[0]))
+    try:
+        (value, pos) = _read_value(data, 1, [])
+    except (IndexError, struct.error, UnicodeDecodeError):
+        raise WireError("Truncated or corrupted message")
+    if pos != len(data):
+        raise WireError("Trailing data")
+    return value
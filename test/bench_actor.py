@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import threading
+
+from argparse import ArgumentParser
+
+# Add the source files in our path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from bench_ledger import setup_node, make_transactions
+
+def serialized_read(node):
+    """A read that is an event of the ledger, it waits in its queue behind the writes.
+
+    It is not the lock-based read of the nodes before the ledger actor, only
+    the cost of a read that is serialized with the writes.
+    """
+    return (node.ID_to_balance(node.id, node.softState_ring), node.chain.blocks[-1].index)
+
+def snapshot_read(node):
+    """A read served from the last snapshot, it never waits for the writers."""
+    snapshot = node.ledger.snapshot
+    return (node.ID_to_balance(node.id, snapshot.soft_ring), snapshot.last_block().index)
+
+def writer(node, batches, done):
+    for batch in batches:
+        node.ingest_transactions(batch)
+    done.append(len(batches))
+
+def reader(node, mode, think, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        if mode == 'snapshot':
+            snapshot_read(node)
+        else:
+            node.ledger.call('read', node)
+        latencies.append(time.perf_counter() - start)
+        # a client waits between its requests (and a busy loop would hold the interpreter)
+        time.sleep(think)
+
+def run(node, mode, readers, writers, transactions, batch_size, think):
+    """Returns (transactions/s, reads/s, median read latency, 99th percentile read latency)."""
+    # every run starts from an empty pool
+    node.transaction_pool.clear()
+    node.softState_ring = node.chainState_ring.overlay()
+    node.ledger.refresh()
+    batches = [transactions[i:i + batch_size] for i in range(0, len(transactions), batch_size)]
+
+    stop = threading.Event()
+    latencies = []
+    done = []
+    reader_threads = [threading.Thread(target=reader, args=(node, mode, think, stop, latencies))
+                      for i in range(readers)]
+    # the batches are dealt out in order, so the nonces of a writer increase
+    writer_threads = [threading.Thread(target=writer, args=(node, batches[i::writers], done))
+                      for i in range(writers)]
+    for thread in reader_threads:
+        thread.start()
+    start = time.perf_counter()
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in reader_threads:
+        thread.join()
+    assert len(node.transaction_pool) == len(transactions)
+    latencies.sort()
+    if not latencies:
+        return (len(transactions) / elapsed, 0.0, 0.0, 0.0)
+    return (len(transactions) / elapsed, len(latencies) / elapsed, latencies[len(latencies) // 2],
+            latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))])
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Measures the reads of the ledger while many clients write to it.')
+    parser.add_argument('-n', type=int, default=10, help='nodes in the ring')
+    parser.add_argument('-t', type=int, default=2000, help='transactions written per run')
+    parser.add_argument('-batch', type=int, default=10, help='transactions per write')
+    parser.add_argument('-readers', type=int, nargs='+', default=[1, 8, 32], help='concurrent readers')
+    parser.add_argument('-writers', type=int, nargs='+', default=[1, 8], help='concurrent writers')
+    parser.add_argument('-think', type=float, default=0.001, help='seconds a reader waits between reads')
+    args = parser.parse_args()
+
+    # no block is minted, the transactions stay in the pool
+    node = setup_node(args.n, capacity=10 ** 9)
+    # enough BCCs for every transaction
+    node.update_balance(0, 10 ** 9, node.chainState_ring)
+    node.ledger.handlers['read'] = serialized_read
+    transactions = make_transactions(node, args.t)
+    # the signatures are verified once (signature cache), every run validates the same transactions
+    node.verifier.verify(transactions)
+    print("%-11s %8s %8s %14s %12s %14s %14s" % (
+        "reads", "readers", "writers", "writes (tx/s)", "reads/s", "read p50 (us)", "read p99 (us)"))
+    for writers in args.writers:
+        for readers in args.readers:
+            for mode in ['serialized', 'snapshot']:
+                (throughput, reads, p50, p99) = run(node, mode, readers, writers, transactions, args.batch, args.think)
+                print("%-11s %8d %8d %14.1f %12.1f %14.1f %14.1f" % (
+                    mode, readers, writers, throughput, reads, 1e6 * p50, 1e6 * p99))
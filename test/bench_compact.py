@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+
+# Add the source files in our path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import wire
+from wallet import Wallet
+from block import Block, CompactBlock
+from transaction import Transaction
+
+def make_block(wallets, index, previous_hash, capacity):
+    """Builds a block of capacity signed transactions between the wallets."""
+    block = Block(index, previous_hash, wallets[0].address)
+    for i in range(capacity):
+        sender = wallets[i % len(wallets)]
+        receiver = wallets[(i + 1) % len(wallets)]
+        tr = Transaction(sender.address, receiver.address, 10, "message %d" % i, index * capacity + i, index)
+        tr.sign_transaction(sender.private_key)
+        block.add_transaction(tr)
+    block.set_hash()
+    return block
+
+def timed(function, repeat):
+    """Returns the seconds of one call of function (the mean of repeat calls)."""
+    start = time.perf_counter()
+    for i in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Compares the relay of full and compact blocks.')
+    parser.add_argument('-capacities', type=int, nargs='+', default=[5, 10, 100],
+                        help='block capacities to measure')
+    parser.add_argument('-peers', type=int, default=10, help='nodes the validator relays a block to')
+    parser.add_argument('-repeat', type=int, default=200, help='decodings timed per capacity')
+    args = parser.parse_args()
+
+    wallets = [Wallet(None) for i in range(5)]
+
+    print("%-10s %12s %14s %8s %14s %14s %16s" % (
+        "capacity", "full B", "compact B", "ratio", "sent B/block", "full decode us", "compact+pool us"))
+    for capacity in args.capacities:
+        block = make_block(wallets, 1, Block(0, 1).get_hash(), capacity)
+        full = wire.dumps(block)
+        compact = wire.dumps(CompactBlock(block))
+        # the receivers already have the transactions in their pools
+        pool = {tr.transaction_id_bytes: tr for tr in block.transactions}
+
+        full_time = timed(lambda: wire.loads(full), args.repeat)
+        compact_time = timed(lambda: wire.loads(compact).rebuild(pool), args.repeat)
+        print("%-10d %12d %14d %7.1fx %14d %14.1f %16.1f" % (
+            capacity, len(full), len(compact), len(full) / len(compact),
+            args.peers * len(compact), full_time * 1e6, compact_time * 1e6))
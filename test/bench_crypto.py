@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import pss
+
+# Add the source files in our path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import keys
+from wallet import Wallet
+from transaction import Transaction
+
+def sign_uncached(transaction, private_key):
+    """Signs the transaction parsing the private key every time (the old way)."""
+    transaction_hash = SHA256.new()
+    transaction_hash.update(bytes.fromhex(transaction.transaction_id))
+    key = RSA.importKey(private_key.encode("ISO-8859-1"))
+    transaction.signature = pss.new(key).sign(transaction_hash).hex()
+
+def verify_uncached(transaction):
+    """Verifies the transaction parsing the public key every time (the old way)."""
+    transaction_hash = SHA256.new()
+    transaction_hash.update(bytes.fromhex(transaction.transaction_id))
+    key = RSA.importKey(keys.resolve(transaction.sender_address).encode('ISO-8859-1'))
+    try:
+        pss.new(key).verify(transaction_hash, bytes.fromhex(transaction.signature))
+        return True
+    except (ValueError, TypeError):
+        return False
+
+def make_transactions(sender, receiver, count):
+    return [Transaction(sender.address, receiver.address, 1, "hello", nonce, 0)
+            for nonce in range(count)]
+
+def throughput(func, transactions):
+    """Returns how many transactions per second func handles."""
+    start = time.perf_counter()
+    for tr in transactions:
+        func(tr)
+    return len(transactions) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmarks signing and verifying transactions.')
+    parser.add_argument('-t', type=int, default=1000, help='number of transactions')
+    args = parser.parse_args()
+
+    sender = Wallet(None)
+    receiver = Wallet(None)
+
+    # every transaction is distinct, so the signature cache
+    # never answers and only the key handling is measured
+    before = make_transactions(sender, receiver, args.t)
+    after = make_transactions(sender, receiver, args.t)
+
+    sign_before = throughput(lambda tr: sign_uncached(tr, sender.private_key), before)
+    sign_after = throughput(lambda tr: tr.sign_transaction(sender.private_key), after)
+    verify_before = throughput(verify_uncached, before)
+    verify_after = throughput(lambda tr: tr.verify_signature(), after)
+
+    print("%8s %16s %16s %10s" % ("", "before (tx/s)", "after (tx/s)", "speedup"))
+    print("%8s %16.1f %16.1f %9.2fx" % ("sign", sign_before, sign_after, sign_after / sign_before))
+    print("%8s %16.1f %16.1f %9.2fx" % ("verify", verify_before, verify_after, verify_after / verify_before))
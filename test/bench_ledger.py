@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import base64
+import random
+
+from argparse import ArgumentParser
+
+# Add the source files in our path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from node import Node
+from transaction import Transaction
+
+def fake_public_key():
+    """Returns a string that looks like (and is as long as) a PEM encoded RSA public key.
+
+    Only the node that sends the transactions needs a real key pair,
+    the rest of the ring only has to be resolved by address.
+    """
+    body = base64.b64encode(os.urandom(162)).decode()
+    lines = [body[i:i + 64] for i in range(0, len(body), 64)]
+    return '-----BEGIN PUBLIC KEY-----\n' + '\n'.join(lines) + '\n-----END PUBLIC KEY-----'
+
+def setup_node(n, capacity):
+    """Builds a node that is the bootstrap of a network of n nodes."""
+    node = Node()
+    node.id = 0
+    node.TTL_LIMIT = n
+    node.CAPACITY = capacity
+    node.register_node_to_ring(0, '127.0.0.1', '5000', node.wallet.public_key)
+    for i in range(1, n):
+        node.register_node_to_ring(i, '127.0.0.1', str(5000 + i), fake_public_key())
+    gen_block = node.create_new_block(genesis=True)
+    gen_block.add_transaction(Transaction("0", node.wallet.address, 1000 * n, "", 0, 0))
+    gen_block.set_hash()
+    node.chain.blocks.append(gen_block)
+    node.update_balance(0, 1000 * n, node.chainState_ring)
+    node.update_nonces(0, 0, node.chainState_ring)
+    node.softState_ring = node.chainState_ring.overlay()
+    return node
+
+def make_transactions(node, count, first_nonce=1):
+    """Signs count transactions from the node to random members of the ring."""
+    transactions = []
+    for nonce in range(first_nonce, first_nonce + count):
+        receiver = node.ID_to_address(random.randrange(1, len(node.chainState_ring)))
+        tr = Transaction(node.wallet.address, receiver, 1, "hello", nonce, 0)
+        tr.sign_transaction(node.wallet.private_key)
+        transactions.append(tr)
+    return transactions
+
+def bench_lookups(node, rounds):
+    """Times the ring lookups that a transaction validation needs (per transaction)."""
+    ring = node.softState_ring
+    addresses = [ring_node['address'] for ring_node in ring]
+    start = time.perf_counter()
+    for i in range(rounds):
+        address = addresses[i % len(addresses)]
+        id = node.key_to_ID(address, ring)
+        ring.balance(id)
+        ring.stake(id)
+        ring.has_nonce(id, i)
+    return (time.perf_counter() - start) / rounds
+
+def bench_linear_lookups(node, rounds):
+    """Same lookups with a linear scan over the ring, as a reference
+    (comparing the PEM encoded keys, as the addresses used to be)."""
+    ring = list(node.softState_ring)
+    keys = [ring_node['public_key'] for ring_node in ring]
+    start = time.perf_counter()
+    for i in range(rounds):
+        address = keys[i % len(keys)]
+        id = next((r['id'] for r in ring if r['public_key'] == address), 0)
+        next((r['balance'] for r in ring if r['id'] == id), None)
+        next((r['stake'] for r in ring if r['id'] == id), None)
+        i in next((r['nonces'] for r in ring if r['id'] == id), None)
+    return (time.perf_counter() - start) / rounds
+
+def bench_validation(node, transactions):
+    """Times validate_transaction against the soft state (per transaction)."""
+    start = time.perf_counter()
+    for tr in transactions:
+        (validation, ring) = node.validate_transaction(tr, validator=0)
+        assert validation
+    return (time.perf_counter() - start) / len(transactions)
+
+def bench_find_validator(node, rounds):
+    """Times find_validator for the head of the chain (per call)."""
+    start = time.perf_counter()
+    for i in range(rounds):
+        node.find_validator()
+    return (time.perf_counter() - start) / rounds
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmarks the ledger state lookups and the transaction validation.')
+    parser.add_argument('-sizes', type=int, nargs='+', default=[5, 10, 25, 50, 100, 200],
+                        help='network sizes (-n) to measure')
+    parser.add_argument('-t', type=int, default=200, help='transactions validated per size')
+    parser.add_argument('-history', type=int, nargs='+', default=[0, 1000, 10000, 100000],
+                        help='transactions already in the chain of every sender')
+    args = parser.parse_args()
+
+    print("%6s %18s %18s %18s %20s" % ("n", "lookups (us)", "linear scan (us)", "validation (us)", "find_validator (us)"))
+    for n in args.sizes:
+        node = setup_node(n, capacity=5)
+        transactions = make_transactions(node, args.t)
+        lookups = bench_lookups(node, 10000)
+        linear = bench_linear_lookups(node, 10000)
+        validation = bench_validation(node, transactions)
+        find_validator = bench_find_validator(node, 1000)
+        print("%6d %18.2f %18.2f %18.2f %20.2f" % (n, lookups * 1e6, linear * 1e6, validation * 1e6, find_validator * 1e6))
+
+    # The soft state is an overlay on top of the chain state, so the
+    # validation should not depend on how many transactions the chain holds.
+    print("\n%8s %18s" % ("history", "validation (us)"))
+    for history in args.history:
+        node = setup_node(10, capacity=5)
+        for ring_node in node.chainState_ring:
+            for nonce in range(1, history + 1):
+                node.update_nonces(ring_node['id'], nonce, node.chainState_ring)
+        node.softState_ring = node.chainState_ring.overlay()
+        transactions = make_transactions(node, args.t, first_nonce=history + 1)
+        validation = bench_validation(node, transactions)
+        print("%8d %18.2f" % (history, validation * 1e6))
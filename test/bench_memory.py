@@ -0,0 +1,75 @@
+import os
+import sys
+import pickle
+import tracemalloc
+
+from argparse import ArgumentParser
+
+# Add the source files in our path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import wire
+from wallet import Wallet
+from block import Block
+from transaction import Transaction
+
+class DictTransaction:
+    """A transaction as it was kept before __slots__: a __dict__ of hex strings."""
+
+class DictBlock:
+    """A block as it was kept before __slots__: a __dict__ of hex strings."""
+
+def to_dict_block(block):
+    """Copies a block (and its transactions) into the old representation."""
+    old = DictBlock()
+    old.__dict__.update(block.to_dict())
+    old.transactions = []
+    for tr in block.transactions:
+        old_tr = DictTransaction()
+        old_tr.__dict__.update(tr.to_dict())
+        old.transactions.append(old_tr)
+    return old
+
+def make_block(wallets, index, previous_hash, capacity):
+    """Builds a block of capacity signed transactions between the wallets."""
+    block = Block(index, previous_hash, wallets[0].address)
+    for i in range(capacity):
+        sender = wallets[i % len(wallets)]
+        receiver = wallets[(i + 1) % len(wallets)]
+        tr = Transaction(sender.address, receiver.address, 10, "message %d" % i, index * capacity + i, index)
+        tr.sign_transaction(sender.private_key)
+        block.add_transaction(tr)
+    block.set_hash()
+    return block
+
+def measure(load, messages):
+    """Returns the bytes allocated by loading every message (and keeping the results)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    blocks = [load(message) for message in messages]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Measures the memory held by the blocks of a chain.')
+    parser.add_argument('-capacities', type=int, nargs='+', default=[5, 10, 100],
+                        help='block capacities to measure')
+    parser.add_argument('-transactions', type=int, default=1000, help='transactions in the measured chain')
+    args = parser.parse_args()
+
+    wallets = [Wallet(None) for i in range(5)]
+
+    print("%-10s %7s %14s %14s %14s %14s %8s" % (
+        "capacity", "blocks", "dict B/tx", "slots B/tx", "dict B/block", "slots B/block", "saved"))
+    for capacity in args.capacities:
+        count = max(1, args.transactions // capacity)
+        template = make_block(wallets, 1, Block(0, 1).get_hash(), capacity)
+        # every block arrives in its own message, like on a node
+        old_messages = [pickle.dumps(to_dict_block(template)) for i in range(count)]
+        new_messages = [wire.dumps(template) for i in range(count)]
+
+        old = measure(pickle.loads, old_messages)
+        new = measure(wire.loads, new_messages)
+        print("%-10d %7d %14.1f %14.1f %14.1f %14.1f %7.1f%%" % (
+            capacity, count, old / (count * capacity), new / (count * capacity),
+            old / count, new / count, 100.0 * (old - new) / old))
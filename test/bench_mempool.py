@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import random
+
+from collections import deque
+from argparse import ArgumentParser
+
+# Add the source files in our path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from mempool import Mempool
+from transaction import Transaction
+
+def make_pool(size, senders):
+    """Returns size transactions of the given number of senders (the pool only needs their ids)."""
+    addresses = ["%064x" % random.getrandbits(256) for i in range(senders)]
+    counters = [0] * senders
+    transactions = []
+    for i in range(size):
+        sender = random.randrange(senders)
+        transactions.append(Transaction(addresses[sender], addresses[(sender + 1) % senders],
+                                        1, "hello", counters[sender], 0))
+        counters[sender] += 1
+    return transactions
+
+def deque_filter(transactions, block, invalid):
+    """The block and the invalid transactions leave a deque, as the pool used to do."""
+    pool = deque(transactions)
+    start = time.perf_counter()
+    pool = deque(tr for tr in pool if tr not in block)
+    for tr in invalid:
+        pool.remove(tr)
+    return time.perf_counter() - start
+
+def mempool_filter(transactions, block, invalid):
+    """The block and the invalid transactions leave a Mempool."""
+    pool = Mempool(transactions)
+    start = time.perf_counter()
+    pool.remove_all(block)
+    pool.remove_all(invalid)
+    return time.perf_counter() - start
+
+def bench_add(transactions):
+    """Returns the seconds per transaction to add them to a Mempool."""
+    pool = Mempool()
+    start = time.perf_counter()
+    pool.extend(transactions)
+    return (time.perf_counter() - start) / len(transactions)
+
+def bench_first(transactions, senders, rounds):
+    """Returns the seconds per lookup of the lowest nonce of a sender."""
+    pool = Mempool(transactions)
+    addresses = list(pool.senders)
+    start = time.perf_counter()
+    for i in range(rounds):
+        pool.first(addresses[i % len(addresses)])
+    return (time.perf_counter() - start) / rounds
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Compares the transaction pool deque with the indexed Mempool.')
+    parser.add_argument('-sizes', type=int, nargs='+', default=[1000, 10000, 50000], help='pending transactions')
+    parser.add_argument('-capacity', type=int, nargs='+', default=[5, 100], help='transactions in a block')
+    parser.add_argument('-invalid', type=int, default=50, help='transactions dropped as invalid after a block')
+    parser.add_argument('-senders', type=int, default=50, help='senders of the pending transactions')
+    args = parser.parse_args()
+
+    print("%8s %9s %16s %16s %16s %16s" % (
+        "pool", "capacity", "deque (ms)", "mempool (ms)", "add (us/tx)", "first (us)"))
+    for size in args.sizes:
+        transactions = make_pool(size, args.senders)
+        add = bench_add(transactions)
+        first = bench_first(transactions, args.senders, 10000)
+        for capacity in args.capacity:
+            # the block takes the oldest transactions, the invalid ones are anywhere in the pool
+            block = transactions[:capacity]
+            invalid = random.sample(transactions[capacity:], min(args.invalid, size - capacity))
+            old = deque_filter(transactions, block, invalid)
+            new = mempool_filter(transactions, block, invalid)
+            print("%8d %9d %16.2f %16.3f %16.2f %16.2f" % (
+                size, capacity, 1000 * old, 1000 * new, 1e6 * add, 1e6 * first))
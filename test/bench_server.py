@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import socket
+import logging
+import threading
+import multiprocessing
+
+import requests
+
+from argparse import ArgumentParser
+
+# Add the source files in our path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def serve(kind, port, threads, backlog, keep_alive):
+    """Runs the api of a node (in another process) with the dev or the pooled server."""
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    from run import create_app
+    app = create_app()
+    if kind == 'pooled':
+        from server import PooledWSGIServer
+        PooledWSGIServer('127.0.0.1', port, app, threads, backlog, keep_alive).serve_forever()
+    else:
+        app.run(host='127.0.0.1', port=port)
+
+def start_server(kind, args):
+    port = free_port()
+    process = multiprocessing.Process(target=serve, daemon=True,
+                                      args=(kind, port, args.threads, args.backlog, args.keep_alive))
+    process.start()
+    url = 'http://127.0.0.1:%d/api/get_id' % port
+    for i in range(200):
+        try:
+            requests.get(url, timeout=1)
+            break
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    return (url, process)
+
+def client(url, requests_per_client, reuse, latencies, failures):
+    """Sends the requests of a client, it stops at the first one that fails."""
+    session = requests.Session() if reuse else None
+    for i in range(requests_per_client):
+        start = time.perf_counter()
+        try:
+            if reuse:
+                response = session.get(url, timeout=30)
+            else:
+                response = requests.get(url, timeout=30, headers={'Connection': 'close'})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except requests.RequestException as e:
+            failures.append(e)
+            return
+
+def run(url, clients, requests_per_client, reuse):
+    """Returns (requests/s, median latency, 99th percentile latency).
+
+    A failed request (an error or a non-2xx answer) aborts the benchmark.
+    """
+    latencies = []
+    failures = []
+    threads = [threading.Thread(target=client, args=(url, requests_per_client, reuse, latencies, failures))
+               for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if failures:
+        raise RuntimeError("%d of %d clients failed, the first with: %r" % (len(failures), clients, failures[0]))
+    latencies.sort()
+    return (len(latencies) / elapsed, latencies[len(latencies) // 2],
+            latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))])
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Compares the development server with the pooled server.')
+    parser.add_argument('-clients', type=int, nargs='+', default=[8, 64], help='concurrent clients')
+    parser.add_argument('-requests', type=int, default=100, help='requests per client')
+    parser.add_argument('-threads', type=int, default=16, help='worker threads of the pooled server')
+    parser.add_argument('-backlog', type=int, default=128, help='listen backlog of the pooled server')
+    parser.add_argument('-keep_alive', type=float, default=5, help='seconds an idle connection is kept (pooled)')
+    args = parser.parse_args()
+
+    print("%-8s %-8s %-11s %12s %12s %12s" % (
+        "server", "clients", "connection", "requests/s", "p50 (ms)", "p99 (ms)"))
+    for kind in ['dev', 'pooled']:
+        (url, process) = start_server(kind, args)
+        try:
+            for clients in args.clients:
+                for reuse in [True, False]:
+                    (throughput, p50, p99) = run(url, clients, args.requests, reuse)
+                    print("%-8s %-8d %-11s %12.1f %12.2f %12.2f" % (
+                        kind, clients, "keep-alive" if reuse else "new", throughput,
+                        1000 * p50, 1000 * p99))
+        finally:
+            process.terminate()
+            process.join()
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import socket
+import threading
+import multiprocessing
+
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the source files in our path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from transport import PeerTransport
+from async_transport import AsyncTransport
+
+class PeerHandler(BaseHTTPRequestHandler):
+    """A peer that accepts every message (after the delay of its server)."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.server.delay)
+        body = b'{"message": "OK"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_peers(count, delay, connection):
+    """Runs count local peers (in another process), sends back their ports."""
+    servers = []
+    for i in range(count):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), PeerHandler)
+        server.daemon_threads = True
+        server.delay = delay
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    connection.send([server.server_address[1] for server in servers])
+    # serve until the benchmark ends
+    connection.recv()
+
+def start_peers(count, delay):
+    """Starts count local peers, returns their ring entries and their process."""
+    (parent, child) = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve_peers, args=(count, delay, child), daemon=True)
+    process.start()
+    ports = parent.recv()
+    return ([{'ip': '127.0.0.1', 'port': str(port)} for port in ports], process)
+
+def dead_peer():
+    """Returns the ring entry of a port where nobody listens."""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return {'ip': '127.0.0.1', 'port': str(port)}
+
+def run(transport, peers, messages, size):
+    """Broadcasts messages to the peers, returns (seconds, peak threads, failed sends)."""
+    data = os.urandom(size)
+    peak = threading.active_count()
+    start = time.perf_counter()
+    futures = []
+    for i in range(messages):
+        futures += transport.broadcast(peers, '/validate_transaction', data)
+        peak = max(peak, threading.active_count())
+    failed = 0
+    for future in futures:
+        if future.result() is None:
+            failed += 1
+        peak = max(peak, threading.active_count())
+    elapsed = time.perf_counter() - start
+    transport.shutdown()
+    return (elapsed, peak, failed)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Compares the thread and the asyncio transports on local peers.')
+    parser.add_argument('-peers', type=int, default=50, help='number of local peers')
+    parser.add_argument('-messages', type=int, default=20, help='messages broadcast to all the peers')
+    parser.add_argument('-size', type=int, default=2000, help='bytes per message')
+    parser.add_argument('-delay', type=float, default=0.01, help='seconds each peer takes to answer')
+    parser.add_argument('-workers', type=int, default=16, help='threads of the thread transport')
+    parser.add_argument('-concurrency', type=int, default=8, help='messages in flight per peer (asyncio)')
+    args = parser.parse_args()
+
+    # the peers run in another process, only the threads of the sender are counted
+    (peers, process) = start_peers(args.peers, args.delay)
+    # a node that left the network: retried, then reported as failed
+    unreachable = peers + [dead_peer()]
+    base = threading.active_count()
+
+    print("%d peers, %d broadcasts of %d bytes, %.0f ms per answer" % (
+        args.peers, args.messages, args.size, args.delay * 1000))
+    print("%-26s %10s %12s %14s %8s" % ("", "time (s)", "messages/s", "extra threads", "failed"))
+    for (name, transport, ring) in [
+            ("threads", PeerTransport(args.workers, 5), peers),
+            ("asyncio", AsyncTransport(args.concurrency, 5, 2, 0.05), peers),
+            ("threads + dead peer", PeerTransport(args.workers, 5), unreachable),
+            ("asyncio + dead peer", AsyncTransport(args.concurrency, 5, 2, 0.05), unreachable)]:
+        (elapsed, peak, failed) = run(transport, ring, args.messages, args.size)
+        print("%-26s %10.2f %12.1f %14d %8d" % (
+            name, elapsed, args.messages * len(ring) / elapsed, peak - base, failed))
+    process.terminate()
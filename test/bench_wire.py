@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import pickle
+
+from argparse import ArgumentParser
+
+# Add the source files in our path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import wire
+from wallet import Wallet
+from block import Block
+from blockchain import Blockchain
+from transaction import Transaction
+
+def make_block(wallets, index, previous_hash, capacity):
+    """Builds a block of capacity signed transactions between the wallets."""
+    block = Block(index, previous_hash, wallets[0].address)
+    for i in range(capacity):
+        sender = wallets[i % len(wallets)]
+        receiver = wallets[(i + 1) % len(wallets)]
+        tr = Transaction(sender.address, receiver.address, 10, "message %d" % i, index * capacity + i, index)
+        tr.sign_transaction(sender.private_key)
+        block.add_transaction(tr)
+    block.set_hash()
+    return block
+
+def timing(func, value, rounds):
+    """Returns the time (per call) of func(value)."""
+    start = time.perf_counter()
+    for i in range(rounds):
+        func(value)
+    return (time.perf_counter() - start) / rounds
+
+def compare(name, value, rounds):
+    pickled = pickle.dumps(value)
+    encoded = wire.dumps(value)
+    print("%-22s %9d %9d %10.1f %10.1f %10.1f %10.1f" % (
+        name, len(pickled), len(encoded),
+        timing(pickle.dumps, value, rounds) * 1e6, timing(wire.dumps, value, rounds) * 1e6,
+        timing(pickle.loads, pickled, rounds) * 1e6, timing(wire.loads, encoded, rounds) * 1e6))
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Compares the wire format with pickle.')
+    parser.add_argument('-capacities', type=int, nargs='+', default=[5, 10, 100],
+                        help='block capacities to measure')
+    parser.add_argument('-blocks', type=int, default=20, help='blocks of the measured chain')
+    parser.add_argument('-rounds', type=int, default=200, help='repetitions of every measurement')
+    args = parser.parse_args()
+
+    wallets = [Wallet(None) for i in range(5)]
+
+    print("%-22s %9s %9s %10s %10s %10s %10s" % (
+        "", "pickle B", "wire B", "pickle enc", "wire enc", "pickle dec", "wire dec"))
+    print("%-22s %9s %9s %10s %10s %10s %10s" % ("", "", "", "(us)", "(us)", "(us)", "(us)"))
+    block = make_block(wallets, 1, Block(0, 1).get_hash(), 1)
+    compare("transaction", block.transactions[0], args.rounds)
+    for capacity in args.capacities:
+        block = make_block(wallets, 1, Block(0, 1).get_hash(), capacity)
+        compare("block (capacity %d)" % capacity, block, args.rounds)
+    chain = Blockchain()
+    previous_hash = Block(0, 1).get_hash()
+    for index in range(1, args.blocks + 1):
+        block = make_block(wallets, index, previous_hash, 5)
+        chain.add_block(block)
+        previous_hash = block.current_hash
+    compare("chain (%d x 5)" % args.blocks, chain, max(1, args.rounds // 10))
@@ -0,0 +1,77 @@
+import os
+import sys
+import heapq
+import random
+
+from argparse import ArgumentParser
+
+# Add the source files in our path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from fanout import GossipRouter
+
+def simulate(router, count, origin, send_time, latency, down):
+    """Spreads one message of the origin over count nodes.
+
+    A node sends its copies one after the other (send_time each, its upstream
+    bandwidth) and a copy arrives latency seconds after it is sent. The nodes
+    in down never answer.
+    Returns (the arrival time at every node that got the message, the messages
+    sent, the most messages sent by one node).
+    """
+    ring = [{'id': id} for id in range(count)]
+    arrived = {origin: 0.0}
+    events = [(0.0, origin)]
+    messages = 0
+    most_sent = 0
+    while events:
+        (now, id) = heapq.heappop(events)
+        if id in down:
+            continue
+        targets = router.targets(ring, id, origin)
+        messages += len(targets)
+        most_sent = max(most_sent, len(targets))
+        for (i, target) in enumerate(targets):
+            arrival = now + (i + 1) * send_time + latency
+            if target['id'] not in arrived or arrival < arrived[target['id']]:
+                if target['id'] not in arrived:
+                    heapq.heappush(events, (arrival, target['id']))
+                arrived[target['id']] = arrival
+    return (arrived, messages, most_sent)
+
+def run(mode, fanout, count, trials, send_time, latency, failed):
+    """Returns the mean (coverage, mean latency, last latency, redundancy, sends at a node)."""
+    router = GossipRouter(mode, fanout)
+    totals = [0.0] * 5
+    for trial in range(trials):
+        origin = random.randrange(count)
+        down = set(random.sample([id for id in range(count) if id != origin], failed))
+        (arrived, messages, most_sent) = simulate(router, count, origin, send_time, latency, down)
+        reached = [time for (id, time) in arrived.items() if id != origin and id not in down]
+        live = count - 1 - failed
+        totals[0] += len(reached) / live
+        totals[1] += sum(reached) / len(reached) if reached else 0.0
+        totals[2] += max(reached) if reached else 0.0
+        totals[3] += messages / live
+        totals[4] += most_sent
+    return [total / trials for total in totals]
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Simulates the spread of a broadcast message with and without gossip.')
+    parser.add_argument('-nodes', type=int, nargs='+', default=[10, 50, 100], help='network sizes')
+    parser.add_argument('-trials', type=int, default=200, help='messages simulated per case')
+    parser.add_argument('-send_time', type=float, default=0.002,
+                        help='seconds a node needs to send one copy (its upstream bandwidth)')
+    parser.add_argument('-latency', type=float, default=0.005, help='seconds a copy travels')
+    parser.add_argument('-failed', type=int, default=0, help='nodes that are down')
+    args = parser.parse_args()
+
+    print("%-5s %-14s %10s %12s %12s %12s %14s" % (
+        "N", "mode", "coverage", "mean (ms)", "last (ms)", "redundancy", "sends/node"))
+    for count in args.nodes:
+        for (mode, fanout) in [('off', 0), ('tree', 2), ('tree', 4),
+                               ('epidemic', 3), ('epidemic', 6)]:
+            (coverage, mean, last, redundancy, most_sent) = run(
+                mode, fanout, count, args.trials, args.send_time, args.latency, args.failed)
+            name = mode if mode == 'off' else "%s/%d" % (mode, fanout)
+            print("%-5d %-14s %9.1f%% %12.1f %12.1f %12.2f %14.1f" % (
+                count, name, 100 * coverage, 1000 * mean, 1000 * last, redundancy, most_sent))
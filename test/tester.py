@@ -1,16 +1,16 @@
 import os
 import requests
 import socket
-import pickle
 import sys
 import time
 
 from argparse import ArgumentParser
 from texttable import Texttable
 
-# Add config file in our path.
+# Add config file (and the wire format) in our path.
 sys.path.insert(0, '../src')
 import config
+import wire
 
 # Get the IP address of the device
 if config.LOCAL:
@@ -28,6 +28,9 @@ def start_transactions():
     global total_time
     global num_transactions
     address = 'http://' + IPAddr + ':' + str(port) + '/api/create_transaction'
+    # pipelined: the ids of the submitted transactions, the time of the first one
+    submitted = []
+    pipeline_start = time.time()
     with open(input_file, 'r') as f:
         for line in f:
             # Get the info of the transaction.
@@ -44,6 +47,8 @@ def start_transactions():
 
             message = line[1]
             transaction = {'receiver': receiver_id, 'amount': 0, 'message': message}
+            if pipeline:
+                transaction['async'] = 'true'
     
             print('\nSending message \'%s\' to the node with id %d ...' % (message, receiver_id))
     
@@ -53,7 +58,10 @@ def start_transactions():
                 response = requests.post(address, data=transaction)
                 end_time = time.time() - start_time
                 message = response.json()["message"]
-                if response.status_code == 200:
+                if response.status_code == 202:
+                    submitted.append(response.json()["transaction_id"])
+                    print("\n" + message + '\n')
+                elif response.status_code == 200:
                     total_time += end_time
                     num_transactions += 1
                     print("\n" + message + '\n')
@@ -62,12 +70,15 @@ def start_transactions():
             except:
                 exit("\nNode is not active. Try again later.\n")
 
+    if pipeline:
+        wait_for_transactions(submitted, pipeline_start)
+
     input("\nWhen all transactions in the network are over, press Enter to continue...\n")
 
     try:
         address = 'http://' + IPAddr + ':' + str(port) + '/api/get_my_transactions'
         response = requests.get(address)
-        data = pickle.loads(response._content)
+        data = wire.loads(response._content)
     except:
         exit("\nSomething went wrong while receiving your transactions.\n")
 
@@ -116,11 +127,59 @@ def start_transactions():
             throughput = transactions1/time1
             block_time = time1/blocks1
             print("Throughput (transactions/time): " + str(throughput))
-            print("Block Time: " + str(block_time) + "\n")
+            print("Block Time: " + str(block_time))
+            cache = response['signature_cache']
+            print("Signature cache hits/misses: " + str(cache['hits']) + "/" + str(cache['misses']))
+            print("Signature verifications saved per block: " + str(cache['hits'] / blocks1) + "\n")
 
     except:
         exit("\nSomething went wrong while receiving the blockchain metrics.\n")
 
+def wait_for_transactions(submitted, start_time):
+    """Polls the status of the submitted transactions until none of them is pending or pooled.
+
+    A block is minted only when the pool has capacity transactions, so the
+    last ones of a run may stay pooled: the polling stops when no status
+    has changed for settle seconds, and the ones still waiting are reported.
+    """
+
+    global total_time
+    global num_transactions
+    address = 'http://' + IPAddr + ':' + str(port) + '/api/transaction_status/'
+    print('\nWaiting for %d submitted transactions ...' % len(submitted))
+    statuses = {}
+    waiting = {transaction_id: None for transaction_id in submitted}
+    # the time of the last change (a transaction was confirmed, failed or pooled)
+    last_change = time.time()
+    while waiting and time.time() - last_change < settle:
+        for transaction_id in list(waiting):
+            try:
+                response = requests.get(address + transaction_id)
+            except:
+                exit("\nNode is not active. Try again later.\n")
+            status = response.json().get('status', 'failed') if response.status_code == 200 else 'failed'
+            if status != waiting[transaction_id]:
+                last_change = time.time()
+            if status in ('pending', 'pooled'):
+                waiting[transaction_id] = status
+            else:
+                statuses[transaction_id] = status
+                del waiting[transaction_id]
+        if waiting:
+            time.sleep(0.5)
+
+    # the time until the last transaction was confirmed (or failed)
+    total_time = last_change - start_time
+    num_transactions = list(statuses.values()).count('confirmed')
+    print("Confirmed: %d, failed: %d\n" % (num_transactions, len(statuses) - num_transactions))
+    if waiting:
+        still = list(waiting.values())
+        print("Still waiting after %d seconds without a change: %d pooled, %d pending" % (
+            settle, still.count('pooled'), still.count('pending')))
+        for transaction_id, status in waiting.items():
+            print("    " + transaction_id + " " + status)
+        print("")
+
 def get_id():
     address = 'http://' + IPAddr + ':' + str(port) + '/api/get_id'
     response = requests.get(address).json()
@@ -149,11 +208,21 @@ if __name__ == "__main__":
     required.add_argument(
         '-c', type=int, help='Number of clients (5 or 10)', required=True)
 
+    optional = parser.add_argument_group('optional arguments')
+
+    optional.add_argument(
+        '-pipeline', action='store_true', help='Submit the transactions without waiting for their broadcast, then wait until they are confirmed')
+
+    optional.add_argument(
+        '-settle', type=float, default=30, help='With -pipeline, stop waiting when no status has changed for this many seconds (the last transactions may not fill a block)')
+
     # Parse the given arguments.
     args = parser.parse_args()
     input_dir = args.input
     port = args.p
     num_clients = (args.c)-1
+    pipeline = args.pipeline
+    settle = args.settle
 
     input("\n Press Enter to start the transactions...\n")
 